@@ -15,8 +15,13 @@ CREATE TABLE  IF NOT EXISTS snp.companies (
     comp_state VARCHAR(3),
     website VARCHAR(100),
     country VARCHAR(30),
-    comp_employees INTEGER CHECK (comp_employees >= 0)-- counted only full time employees
+    comp_employees INTEGER CHECK (comp_employees >= 0),-- counted only full time employees
+    index_added DATE, -- first day in the S&P 500 seen by sync_constituents.py
+    index_removed DATE -- set when the company leaves the index, NULL while listed
 );
+-- upgrade databases created before constituent sync
+ALTER TABLE snp.companies ADD COLUMN IF NOT EXISTS index_added DATE;
+ALTER TABLE snp.companies ADD COLUMN IF NOT EXISTS index_removed DATE;
 
 -- create time table
 CREATE TABLE IF NOT EXISTS snp.times (
@@ -43,8 +48,13 @@ CREATE TABLE IF NOT EXISTS snp.times (
         END
     ) STORED,
     month SMALLINT GENERATED ALWAYS AS (EXTRACT(MONTH FROM time_id)) STORED,
-    day SMALLINT GENERATED ALWAYS AS (EXTRACT(DAY FROM time_id)) STORED -- day of the month
+    day SMALLINT GENERATED ALWAYS AS (EXTRACT(DAY FROM time_id)) STORED, -- day of the month
+    is_trading_day BOOLEAN NOT NULL DEFAULT TRUE, -- NYSE open, set by etl/trading_calendar.py
+    is_early_close BOOLEAN NOT NULL DEFAULT FALSE -- NYSE closes at 13:00
 );
+-- upgrade databases created before the trading calendar attributes
+ALTER TABLE snp.times ADD COLUMN IF NOT EXISTS is_trading_day BOOLEAN NOT NULL DEFAULT TRUE;
+ALTER TABLE snp.times ADD COLUMN IF NOT EXISTS is_early_close BOOLEAN NOT NULL DEFAULT FALSE;
 
 -- create currencies table
 CREATE TABLE IF NOT EXISTS snp.currencies (
@@ -84,6 +94,151 @@ CREATE TABLE IF NOT EXISTS snp.stocks (
         REFERENCES snp.times(time_id)
         ON UPDATE NO ACTION
         ON DELETE NO ACTION
+) PARTITION BY RANGE (time_id);
+-- partitions (snp.stocks_y2025, ...) are created ahead of each load by etl/partitions.py,
+-- an existing unpartitioned table is converted with `python -m etl migrate`
+-- pk_stocks already indexes (time_id, comp_ticker), idx_stocks_times_companies duplicated it
+DROP INDEX IF EXISTS snp.idx_stocks_times_companies;
+CREATE INDEX IF NOT EXISTS idx_stocks_time_brin ON snp.stocks USING brin (time_id);
+CREATE INDEX IF NOT EXISTS idx_stocks_ticker_time ON snp.stocks(comp_ticker, time_id);
+
+-- quarantine for rows rejected by the in-memory validation of etl/validation.py
+CREATE TABLE IF NOT EXISTS snp.load_rejects (
+    reject_id BIGSERIAL PRIMARY KEY,
+    rejected_at TIMESTAMP NOT NULL DEFAULT now(),
+    target_table VARCHAR(30) NOT NULL, -- e.g. snp.stocks
+    row_key TEXT NOT NULL, -- key columns of the row as JSON
+    reason VARCHAR(100) NOT NULL, -- first failed check, e.g. missing snp.companies reference
+    payload JSONB -- the whole rejected row
+);
+CREATE INDEX IF NOT EXISTS idx_load_rejects_table_time ON snp.load_rejects(target_table, rejected_at);
+
+-- keys fetched without a row stored (no data from the provider, every row rejected), so
+-- etl/watermarks.py plans them from the last day tried instead of from the history start
+CREATE TABLE IF NOT EXISTS snp.load_attempts (
+    source VARCHAR(10) NOT NULL, -- stocks or currencies
+    load_key VARCHAR(5) NOT NULL, -- ticker or currency ISO code
+    attempted_to DATE NOT NULL, -- last day of the range fetched
+    CONSTRAINT pk_load_attempts PRIMARY KEY (source, load_key)
+);
+
+-- splits and dividends seen by etl/actions.py, history before action_date is re-adjusted once
+CREATE TABLE IF NOT EXISTS snp.corporate_actions (
+    comp_ticker CHAR(5) NOT NULL, -- CHAR like snp.stocks, so joins compare the same padded type
+    action_date DATE NOT NULL, -- ex-date of the dividend or effective day of the split
+    action_type VARCHAR(8) NOT NULL CHECK (action_type IN ('split', 'dividend')),
+    value DECIMAL(14,6) NOT NULL, -- split ratio (new shares per old share) or cash dividend per share
+    price_factor DECIMAL(20,12) NOT NULL, -- multiplier applied to prices before action_date
+    volume_factor DECIMAL(20,12) NOT NULL, -- multiplier applied to volumes before action_date
+    rows_adjusted INTEGER NOT NULL DEFAULT 0, -- stored rows re-adjusted, 0 if already adjusted
+    applied_at TIMESTAMP NOT NULL DEFAULT now(),
+
+    CONSTRAINT pk_corporate_actions PRIMARY KEY (comp_ticker, action_date, action_type),
+    CONSTRAINT fk_corporate_actions_companies FOREIGN KEY (comp_ticker)
+        REFERENCES snp.companies(comp_ticker)
+        ON UPDATE CASCADE
+        ON DELETE RESTRICT
+);
+
+-- snp.stocks converted with the last known rate at or before each day, refreshed
+-- incrementally by the convert stage (etl/conversion.py) for hot currencies
+CREATE TABLE IF NOT EXISTS snp.stocks_fx (
+    currency_iso CHAR(3) NOT NULL,
+    time_id DATE NOT NULL,
+    comp_ticker CHAR(5) NOT NULL,
+    rate_day DATE NOT NULL, -- day of the rate used, time_id or the last FX day before it
+    exchange_rate DECIMAL(10,4) NOT NULL,
+    open_price DECIMAL(14,4) NOT NULL,
+    high_price DECIMAL(14,4) NOT NULL,
+    low_price DECIMAL(14,4) NOT NULL,
+    close_price DECIMAL(14,4) NOT NULL,
+    volume BIGINT,
+    converted_at TIMESTAMP NOT NULL DEFAULT now(),
+
+    CONSTRAINT pk_stocks_fx PRIMARY KEY (currency_iso, comp_ticker, time_id)
+);
+CREATE INDEX IF NOT EXISTS idx_stocks_fx_currency_time ON snp.stocks_fx(currency_iso, time_id);
+
+-- rollups maintained by etl/rollups.py, only partitions touched by a load are recomputed
+CREATE TABLE IF NOT EXISTS snp.daily_returns (
+    comp_ticker CHAR(5) NOT NULL,
+    time_id DATE NOT NULL,
+    close_price DECIMAL(10,4) NOT NULL,
+    prev_close DECIMAL(10,4), -- close of the previous stored day, NULL on the first one
+    daily_return DOUBLE PRECISION, -- close_price / prev_close - 1
+    refreshed_at TIMESTAMP NOT NULL DEFAULT now(),
+
+    CONSTRAINT pk_daily_returns PRIMARY KEY (comp_ticker, time_id)
+);
+
+CREATE TABLE IF NOT EXISTS snp.monthly_ohlcv (
+    comp_ticker CHAR(5) NOT NULL,
+    year SMALLINT NOT NULL,
+    month SMALLINT NOT NULL,
+    first_day DATE NOT NULL,
+    last_day DATE NOT NULL,
+    open_price DECIMAL(10,4) NOT NULL, -- open of first_day
+    high_price DECIMAL(10,4) NOT NULL,
+    low_price DECIMAL(10,4) NOT NULL,
+    close_price DECIMAL(10,4) NOT NULL, -- close of last_day
+    volume BIGINT,
+    trading_days SMALLINT NOT NULL,
+
+    CONSTRAINT pk_monthly_ohlcv PRIMARY KEY (comp_ticker, year, month)
+);
+
+CREATE TABLE IF NOT EXISTS snp.quarterly_ohlcv (
+    comp_ticker CHAR(5) NOT NULL,
+    year SMALLINT NOT NULL,
+    quarter SMALLINT NOT NULL,
+    first_day DATE NOT NULL,
+    last_day DATE NOT NULL,
+    open_price DECIMAL(10,4) NOT NULL,
+    high_price DECIMAL(10,4) NOT NULL,
+    low_price DECIMAL(10,4) NOT NULL,
+    close_price DECIMAL(10,4) NOT NULL,
+    volume BIGINT,
+    trading_days SMALLINT NOT NULL,
+
+    CONSTRAINT pk_quarterly_ohlcv PRIMARY KEY (comp_ticker, year, quarter)
+);
+
+CREATE TABLE IF NOT EXISTS snp.sector_daily (
+    sector VARCHAR(50) NOT NULL,
+    time_id DATE NOT NULL,
+    companies SMALLINT NOT NULL, -- companies with a bar on time_id
+    volume BIGINT,
+    turnover DECIMAL(24,4), -- sum of close_price * volume
+    avg_return DOUBLE PRECISION, -- equal-weighted mean of daily_return
+
+    CONSTRAINT pk_sector_daily PRIMARY KEY (sector, time_id)
 );
-CREATE INDEX IF NOT EXISTS idx_stocks_times_companies ON snp.stocks(time_id, comp_ticker);
 
+-- hourly and 1-minute bars loaded by the intraday mode (etl/intraday.py) in micro-batches;
+-- time_id is the exchange trading day of the bar, for the same snp.times and currency joins as snp.stocks
+CREATE TABLE IF NOT EXISTS snp.stocks_intraday (
+    bar_interval VARCHAR(3) NOT NULL CHECK (bar_interval IN ('1m', '1h')),
+    comp_ticker CHAR(5) NOT NULL,
+    bar_ts TIMESTAMP NOT NULL, -- bar start, UTC
+    time_id DATE NOT NULL,
+    currency_iso CHAR(3) DEFAULT 'USD',
+    open_price DECIMAL(10,4) NOT NULL CHECK (open_price >= 0),
+    high_price DECIMAL(10,4) NOT NULL CHECK (high_price >= 0),
+    low_price DECIMAL(10,4) NOT NULL CHECK (low_price >= 0),
+    close_price DECIMAL(10,4) NOT NULL CHECK (close_price >= 0),
+    volume BIGINT CHECK (volume >= 0),
+
+    CONSTRAINT pk_stocks_intraday PRIMARY KEY (bar_interval, comp_ticker, bar_ts),
+
+    CONSTRAINT fk_stocks_intraday_companies FOREIGN KEY (comp_ticker)
+        REFERENCES snp.companies(comp_ticker)
+        ON UPDATE CASCADE
+        ON DELETE RESTRICT,
+
+    CONSTRAINT fk_stocks_intraday_times FOREIGN KEY (time_id)
+        REFERENCES snp.times(time_id)
+        ON UPDATE NO ACTION
+        ON DELETE NO ACTION
+);
+-- bars arrive in time order: a BRIN stays small however many minutes are stored
+CREATE INDEX IF NOT EXISTS idx_stocks_intraday_ts_brin ON snp.stocks_intraday USING brin (bar_ts);
@@ -5,9 +5,12 @@ ALTER DEFAULT PRIVILEGES IN SCHEMA snp
 GRANT SELECT ON TABLES TO readonly_user;
 
 SET ROLE readonly_user;
+-- one row per stock row: the last PLN rate at or before each day, not every currency of that day
 SELECT COUNT(*) 
 FROM snp.stocks s
      INNER JOIN snp.companies c ON s.comp_ticker = c.comp_ticker
      INNER JOIN snp.times t ON s.time_id = t.time_id
-     INNER JOIN snp.currencies c2 ON t.time_id = c2.time_id;
+     LEFT JOIN snp.currencies c2 ON c2.currency_iso = 'PLN'
+        AND c2.time_id = (SELECT MAX(c3.time_id) FROM snp.currencies c3
+                          WHERE c3.currency_iso = 'PLN' AND c3.time_id <= t.time_id);
 RESET ROLE;
\ No newline at end of file
@@ -0,0 +1,128 @@
+# parallel backfill benchmark and resume check on a local PostgreSQL (etl_db_url)
+# a simulated provider with a fixed latency serves synthetic bars under one shared rate limit;
+# wall time is measured for growing numbers of fetch workers (it should drop until the rate
+# limit is reached) and of loaders, then a backfill with one failing unit is resumed.
+# usage: python etl-scripts/bench_backfill.py [--tickers 500] [--years 2] [--latency 3.0] [--rate 1]
+# exits with status 1 when a backfill loads a different number of rows than expected
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from etl.backfill import backfill, plan_units
+from etl.db import bulk_session, get_engine
+from etl.journal import RunJournal
+from etl.prices import SimulatedProvider
+from etl.synthetic import SYNTHETIC_START, clear_synthetic, seed_dimensions, synthetic_days, synthetic_tickers
+
+
+class FailingProvider(SimulatedProvider):
+    """Simulated provider whose requests for one unit always fail."""
+
+    def __init__(self, unit, **kwargs):
+        super().__init__(**kwargs)
+        self.unit = unit
+
+    def download(self, tickers, start, end, interval="1d", actions=False):
+        if (start, end, tuple(tickers)) == self.unit:
+            raise ConnectionError("simulated outage")
+        return super().download(tickers, start, end, interval, actions)
+
+
+def stored_rows(tickers):
+    with get_engine().connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM snp.stocks WHERE comp_ticker IN :tickers").bindparams(
+            bindparam("tickers", expanding=True)), {"tickers": tickers}).scalar()
+
+
+def delete_rows(tickers):
+    with bulk_session() as conn:
+        conn.execute(text("DELETE FROM snp.stocks WHERE comp_ticker IN :tickers").bindparams(
+            bindparam("tickers", expanding=True)), {"tickers": tickers})
+
+
+def timed_backfill(tickers, start, end, provider, journal_root, **kwargs):
+    delete_rows(tickers)
+    began = time.perf_counter()
+    stats = backfill(tickers, start, end, provider=provider, journal=RunJournal("bench", root=journal_root), **kwargs)
+    wall = time.perf_counter() - began
+    return {
+        "wall_s": round(wall, 2),
+        "requests": provider.calls,
+        "rows_per_s": round(stats["rows"] / wall),
+        **stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel backfill benchmark")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--chunk-size", type=int, default=50, help="tickers per unit")
+    parser.add_argument("--latency", type=float, default=3.0, help="simulated seconds per request")
+    parser.add_argument("--rate", type=float, default=1.0, help="provider limit, requests per second")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--loaders", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--processes", type=int, default=2)
+    args = parser.parse_args()
+
+    if not os.getenv("etl_db_url") or get_engine().dialect.name != "postgresql":
+        print("bench_backfill.py needs a PostgreSQL etl_db_url", file=sys.stderr)
+        return 2
+    tickers = synthetic_tickers(args.tickers)
+    start = SYNTHETIC_START
+    end = (pd.Timestamp(start) + pd.DateOffset(years=args.years)).strftime("%Y-%m-%d")
+    units = plan_units(tickers, start, end, args.chunk_size)
+    expected = len(tickers) * len(synthetic_days(start, end))
+    common = {"chunk_size": args.chunk_size, "processes": args.processes}
+    report = {"tickers": args.tickers, "years": args.years, "units": len(units), "expected_rows": expected,
+              "latency_s": args.latency, "rate": args.rate, "fetch_bound_floor_s": round(len(units) / args.rate, 1),
+              "workers": {}, "loaders": {}}
+    ok = True
+    with bulk_session() as conn:
+        seed_dimensions(conn, tickers, start, end)
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            # fetch bound: latency per request, loads keep up
+            for workers in args.workers:
+                result = timed_backfill(tickers, start, end, SimulatedProvider(latency=args.latency), root,
+                                        workers=workers, rate=args.rate, loaders=max(args.loaders), **common)
+                report["workers"][workers] = result
+                ok = ok and result["rows"] == expected
+                print(f"workers {workers}: {result['wall_s']}s")
+            # load bound: no latency nor rate limit, loaders write disjoint units concurrently
+            for loaders in args.loaders:
+                result = timed_backfill(tickers, start, end, SimulatedProvider(latency=0), root,
+                                        workers=max(args.workers), rate=1000, loaders=loaders, **common)
+                report["loaders"][loaders] = result
+                ok = ok and result["rows"] == expected
+                print(f"loaders {loaders}: {result['wall_s']}s")
+
+        # resume: one unit fails after its retries, a resumed run fetches only that unit
+        with tempfile.TemporaryDirectory() as root:
+            delete_rows(tickers)
+            kwargs = {"workers": max(args.workers), "rate": 1000, "loaders": max(args.loaders), **common}
+            first = backfill(tickers, start, end, provider=FailingProvider(units[-1], latency=0),
+                             journal=RunJournal("resume", root=root), **kwargs)
+            provider = SimulatedProvider(latency=0)
+            resumed = backfill(tickers, start, end, provider=provider,
+                               journal=RunJournal("resume", root=root), resume=True, **kwargs)
+            report["resume"] = {"first": first, "resumed": resumed, "resumed_requests": provider.calls,
+                                "stored_rows": stored_rows(tickers)}
+            ok = ok and first["failed"] == 1 and resumed["units"] == 1 and provider.calls == 1 \
+                and report["resume"]["stored_rows"] == expected
+    finally:
+        with bulk_session() as conn:
+            clear_synthetic(conn, tickers, start, end)
+    report["ok"] = bool(ok)
+    print(json.dumps(report, indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# memory benchmark of the columnar staging buffer against a list of per-row dicts
+# synthetic bars for 500 tickers are produced in yearly windows of 100-ticker chunks (etl.standin),
+# the way fetch_price_frames hands them over, and traced with tracemalloc.
+# usage: python etl-scripts/bench_buffer.py [--years 1 2 5] [--max-mb 16] [--load]
+# exits with status 1 when the buffered peak exceeds the ceiling
+import argparse
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from etl.buffer import ColumnBuffer
+from etl.db import bulk_session
+from etl.loader import bulk_upsert, STOCKS
+from etl.standin import synthetic_frames
+from etl.synthetic import SYNTHETIC_START, clear_synthetic, seed_dimensions, synthetic_tickers
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"rows": rows, "wall_s": round(elapsed, 2), "peak_mb": round(peak / 2**20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar buffer memory benchmark")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 2, 5])
+    parser.add_argument("--max-mb", type=int, default=16, help="buffer byte budget")
+    parser.add_argument("--ceiling-mb", type=float, help="allowed buffered peak, default 4x the budget")
+    parser.add_argument("--load", action="store_true", help="flush into the database in etl_db_url")
+    args = parser.parse_args()
+
+    tickers = synthetic_tickers(args.tickers)
+    ceiling = args.ceiling_mb or 4 * args.max_mb
+    end = (pd.Timestamp(SYNTHETIC_START) + pd.DateOffset(years=max(args.years))).strftime("%Y-%m-%d")
+    if args.load:
+        with bulk_session() as conn:
+            seed_dimensions(conn, tickers, SYNTHETIC_START, end)
+
+    def sink(frame):
+        if args.load:
+            with bulk_session() as conn:
+                bulk_upsert(conn, STOCKS, frame)
+
+    failed = False
+    try:
+        for years in args.years:
+            def as_dicts():
+                records = []
+                for frame in synthetic_frames(tickers, years):
+                    records.extend(frame.to_dict(orient="records"))
+                sink(pd.DataFrame(records))
+                return len(records)
+
+            def buffered():
+                with ColumnBuffer(sink=sink, max_bytes=args.max_mb * 2**20) as buffer:
+                    rows = 0
+                    for frame in synthetic_frames(tickers, years):
+                        rows += len(frame)
+                        buffer.append(frame)
+                return rows
+
+            dicts = measure(as_dicts)
+            columnar = measure(buffered)
+            ok = columnar["peak_mb"] <= ceiling
+            failed |= not ok
+            print(f"{years} year(s), {dicts['rows']} rows: dicts peak {dicts['peak_mb']} MB "
+                  f"in {dicts['wall_s']}s, buffer peak {columnar['peak_mb']} MB in {columnar['wall_s']}s "
+                  f"({'ok' if ok else 'over'} the {ceiling} MB ceiling)")
+    finally:
+        if args.load:
+            with bulk_session() as conn:
+                clear_synthetic(conn, tickers, SYNTHETIC_START, end)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# as-of currency conversion benchmark and check on synthetic data
+# synthetic bars and FX rates with missing FX days are loaded into etl_db_url (or an
+# in-memory SQLite stand-in), then converted on the read path (etl.reader) and into
+# snp.stocks_fx (full, then incrementally after one more day); both must agree.
+# usage: python etl-scripts/bench_conversion.py [--tickers 500] [--years 5] [--currency PLN]
+# exits with status 1 when the two conversions disagree
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from etl.conversion import refresh_converted
+from etl.currencies import closes_to_frame
+from etl.db import bulk_session, get_engine
+from etl.loader import bulk_upsert, CURRENCIES, STOCKS
+from etl.prices import chunked, wide_to_frame
+from etl.reader import PriceReader
+from etl.standin import sqlite_warehouse
+from etl.synthetic import (
+    SYNTHETIC_START, clear_synthetic, seed_dimensions, synthetic_fx, synthetic_tickers, synthetic_wide
+)
+
+# the sanity query of database-test/config.sql before the fix: fans out per currency, drops days without FX
+query_same_day = """
+    SELECT COUNT(*) FROM snp.stocks s JOIN snp.currencies c ON c.time_id = s.time_id
+    WHERE s.time_id >= :start AND s.time_id < :end
+"""
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, round(time.perf_counter() - start, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="As-of currency conversion benchmark")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--currency", default="PLN")
+    parser.add_argument("--fx-gaps", type=float, default=0.1, help="share of FX days left out")
+    args = parser.parse_args()
+
+    if not os.getenv("etl_db_url"):
+        sqlite_warehouse()
+    tickers = synthetic_tickers(args.tickers)
+    start = SYNTHETIC_START
+    end = (pd.Timestamp(start) + pd.DateOffset(years=args.years)).strftime("%Y-%m-%d")
+    next_day = (pd.Timestamp(end) + pd.offsets.BDay(1)).strftime("%Y-%m-%d")
+    clear_end = (pd.Timestamp(next_day) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    rng = np.random.default_rng(0)
+
+    with bulk_session() as conn:
+        seed_dimensions(conn, tickers, start, clear_end)
+        rates = closes_to_frame(synthetic_fx(start, clear_end, rng=rng))
+        # the first day always has a rate, later ones go missing like on FX holidays
+        keep = (rng.random(len(rates)) >= args.fx_gaps) | (rates["time_id"] == rates["time_id"].min())
+        bulk_upsert(conn, CURRENCIES, rates[keep & (rates["time_id"] < end)])
+    for chunk in chunked(tickers, 100):
+        with bulk_session() as conn:
+            bulk_upsert(conn, STOCKS, wide_to_frame(synthetic_wide(chunk, start, end, rng)))
+
+    report = {"database": get_engine().dialect.name, "tickers": args.tickers, "years": args.years,
+              "currency": args.currency}
+    ok = True
+    try:
+        with get_engine().connect() as conn:
+            stored = conn.execute(text("SELECT COUNT(*) FROM snp.stocks WHERE time_id >= :start AND time_id < :end"),
+                                  {"start": start, "end": end}).scalar()
+            same_day = conn.execute(text(query_same_day), {"start": start, "end": end}).scalar()
+        report["rows"] = {"stocks": stored, "same_day_join": same_day}
+
+        frame, report["read_path_s"] = timed(lambda: PriceReader().read(tickers, start, end, args.currency))
+        report["rows"]["read_path"] = int(frame["close_price"].notna().sum())
+
+        stamp = datetime.now().isoformat(timespec="seconds")
+        with bulk_session() as conn:
+            rows, report["table_full_s"] = timed(lambda: refresh_converted(conn, args.currency, next_day, stamp))
+        report["rows"]["table_full"] = rows
+
+        with get_engine().connect() as conn:
+            table = pd.read_sql(text(
+                "SELECT time_id, comp_ticker, CAST(close_price AS DOUBLE PRECISION) AS close_price "
+                "FROM snp.stocks_fx WHERE currency_iso = :currency AND time_id >= :start AND time_id < :end"
+            ), conn, params={"currency": args.currency, "start": start, "end": end})
+        table["time_id"] = pd.to_datetime(table["time_id"])
+        table["comp_ticker"] = table["comp_ticker"].str.strip()
+        read = frame.reset_index()[["time_id", "comp_ticker", "close_price"]]
+        read["comp_ticker"] = read["comp_ticker"].astype(str)
+        both = read.merge(table, on=["time_id", "comp_ticker"], suffixes=("_read", "_table"))
+        diff = (both["close_price_read"] - both["close_price_table"]).abs().max()
+        report["max_abs_diff"] = round(float(diff), 6)
+        ok = len(both) == len(table) == report["rows"]["read_path"] and diff < 1e-3
+
+        # one more day of bars and rates: only that day is converted again
+        with bulk_session() as conn:
+            new_day = wide_to_frame(synthetic_wide(tickers, next_day, clear_end, rng))
+            bulk_upsert(conn, STOCKS, new_day)
+            bulk_upsert(conn, CURRENCIES, rates[rates["time_id"] == next_day])
+        stamp = datetime.now().isoformat(timespec="seconds")
+        with bulk_session() as conn:
+            rows, report["table_incremental_s"] = timed(
+                lambda: refresh_converted(conn, args.currency, clear_end, stamp))
+        report["rows"]["table_incremental"] = rows
+        ok = ok and rows == len(new_day)
+    finally:
+        with bulk_session() as conn:
+            conn.execute(text("DELETE FROM snp.stocks_fx WHERE time_id >= :start AND time_id < :end"),
+                         {"start": start, "end": clear_end})
+            clear_synthetic(conn, tickers, start, clear_end)
+    report["ok"] = bool(ok)
+    print(json.dumps(report, indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
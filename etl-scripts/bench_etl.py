@@ -0,0 +1,162 @@
+# end-to-end ETL benchmark: fetch -> transform -> load on synthetic S&P 500 data
+# fetch runs against a fake provider with configurable latency, load against the
+# database in etl_db_url (a local Postgres with database-test/SnP500-DWH.sql applied),
+# or an in-memory SQLite stand-in when etl_db_url is not set.
+# usage: python etl-scripts/bench_etl.py [--case daily|backfill|all] [--latency 0.2] [--output DIR]
+import argparse
+import json
+import os
+import resource
+import subprocess
+import time
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import event
+
+from etl.config import BASE_DIR
+from etl.currencies import closes_to_frame
+from etl.db import bulk_session, get_engine
+from etl.loader import CURRENCIES, STOCKS
+from etl.prices import SimulatedProvider, chunked, wide_to_frame
+from etl.standin import sqlite_warehouse
+from etl.synthetic import (
+    SYNTHETIC_START, clear_synthetic, seed_dimensions, synthetic_fx, synthetic_tickers
+)
+from etl.throttle import ConcurrentFetcher
+from etl.validation import validated_upsert, Validator
+
+CASES = {
+    "daily": {"tickers": 500, "days": 1},
+    "backfill": {"tickers": 500, "days": 5 * 365},
+}
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+class RoundTrips:
+    """Counts statements sent through the engine (a COPY counts once)."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+
+def run_stage(results, name, fn, round_trips):
+    before = round_trips.count
+    start = time.perf_counter()
+    value, rows = fn()
+    elapsed = time.perf_counter() - start
+    results[name] = {
+        "wall_s": round(elapsed, 4),
+        "rows": rows,
+        "rows_per_s": round(rows / elapsed, 1) if elapsed and rows else None,
+        "db_round_trips": round_trips.count - before,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    print(f"  {name:>9}: {rows} rows in {elapsed:.2f}s, "
+          f"{results[name]['db_round_trips']} round-trips, peak RSS {results[name]['peak_rss_mb']} MB")
+    return value
+
+
+def run_case(name, n_tickers, n_days, latency, chunk_size, round_trips):
+    tickers = synthetic_tickers(n_tickers)
+    start = SYNTHETIC_START
+    end = (pd.Timestamp(start) + pd.Timedelta(days=n_days)).strftime("%Y-%m-%d")
+    provider = SimulatedProvider(latency=latency)
+    fetcher = ConcurrentFetcher(rate=50, burst=10, max_in_flight=8)
+    stages = {}
+    print(f"{name}: {n_tickers} tickers x {n_days} days")
+
+    def fetch():
+        wides = [w for _, w, _ in fetcher.map(
+            lambda chunk: provider.download(list(chunk), start, end),
+            [tuple(c) for c in chunked(tickers, chunk_size)]
+        ) if w is not None]
+        fx = synthetic_fx(start, end)
+        return (wides, fx), sum(w.shape[0] * (w.shape[1] // 5) for w in wides) + fx.size
+
+    def transform():
+        stocks = []
+        for wide in wides:
+            stocks.extend(wide_to_frame(wide).to_dict(orient="records"))
+        currencies = closes_to_frame(fx).to_dict(orient="records")
+        return (stocks, currencies), len(stocks) + len(currencies)
+
+    def load():
+        with bulk_session() as conn:
+            validator = Validator.load(conn)
+            _, rejected_fx = validated_upsert(conn, CURRENCIES, currencies, validator)
+            loaded, rejected = validated_upsert(conn, STOCKS, stocks, validator)
+        return None, loaded + len(currencies) - len(rejected_fx)
+
+    with bulk_session() as conn:
+        seed_dimensions(conn, tickers, start, end)
+    try:
+        wides, fx = run_stage(stages, "fetch", fetch, round_trips)
+        stocks, currencies = run_stage(stages, "transform", transform, round_trips)
+        run_stage(stages, "load", load, round_trips)
+    finally:
+        with bulk_session() as conn:
+            clear_synthetic(conn, tickers, start, end)
+    return {
+        "tickers": n_tickers,
+        "days": n_days,
+        "provider_latency_s": latency,
+        "provider_calls": provider.calls,
+        "wall_s": round(sum(s["wall_s"] for s in stages.values()), 4),
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end ETL benchmark")
+    parser.add_argument("--case", choices=list(CASES) + ["all"], default="all")
+    parser.add_argument("--tickers", type=int, help="override the number of tickers")
+    parser.add_argument("--days", type=int, help="override the number of calendar days")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake provider latency in seconds")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "bench_results"))
+    args = parser.parse_args()
+
+    if not os.getenv("etl_db_url"):
+        sqlite_warehouse()
+    engine = get_engine()
+    round_trips = RoundTrips(engine)
+
+    report = {
+        "commit": git_commit(),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "database": engine.dialect.name,
+        "cases": {},
+    }
+    for name, case in CASES.items():
+        if args.case not in ("all", name):
+            continue
+        report["cases"][name] = run_case(
+            name, args.tickers or case["tickers"], args.days or case["days"],
+            args.latency, args.chunk_size, round_trips
+        )
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"etl-{report['commit'] or 'nocommit'}-{datetime.now():%Y%m%d%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
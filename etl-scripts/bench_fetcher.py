@@ -0,0 +1,25 @@
+# benchmark: achieved request rate of the concurrent fetcher against a fake
+# provider with simulated latency, compared with the configured token rate
+# usage: python etl-scripts/bench_fetcher.py [rate] [latency] [error_rate]
+import sys
+import time
+from etl.prices import SimulatedProvider, fetch_prices
+from etl.throttle import ConcurrentFetcher
+
+rate = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+
+tickers = [f"T{i:03d}" for i in range(500)]
+provider = SimulatedProvider(latency=latency, error_rate=error_rate)
+# enough workers to keep `rate` requests in flight despite the latency
+fetcher = ConcurrentFetcher(rate=rate, burst=1, max_in_flight=max(1, int(rate * latency * 2)),
+                            base_delay=0.1, max_jitter=0.05)
+
+start = time.perf_counter()
+records, missing = fetch_prices(tickers, "2025-05-12", "2025-05-17", provider,
+                                chunk_size=5, fetcher=fetcher)
+elapsed = time.perf_counter() - start
+print(f"{fetcher.calls} requests ({fetcher.retries} retries) in {elapsed:.2f}s: "
+      f"{fetcher.calls / elapsed:.2f} req/s for a configured rate of {rate:.2f} req/s")
+print(f"{len(records)} records, {len(missing)} tickers without data")
@@ -0,0 +1,119 @@
+# intraday micro-batch benchmark: sustained bars/s of load_intraday() at several batch sizes
+# a simulated provider serves random walk session bars for synthetic tickers, which are
+# streamed into snp.stocks_intraday; then one more session is loaded incrementally from the
+# stored bars. Runs on etl_db_url (PostgreSQL, COPY) or an in-memory SQLite stand-in.
+# usage: python etl-scripts/bench_intraday.py [--tickers 500] [--days 5] [--interval 1m] [--batch-rows 10000 50000 200000]
+# exits with status 1 when a run loads a different number of bars than expected
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import bindparam, text
+
+from bench_etl import git_commit, peak_rss_mb
+from etl.config import BASE_DIR
+from etl.db import bulk_session, get_engine
+from etl.intraday import load_intraday
+from etl.prices import SimulatedProvider
+from etl.standin import sqlite_warehouse
+from etl.synthetic import SYNTHETIC_START, clear_synthetic, seed_dimensions, synthetic_tickers
+from etl.throttle import ConcurrentFetcher
+from etl.trading_calendar import session_bars, trading_days
+
+
+def stored_bars(tickers, interval):
+    with get_engine().connect() as conn:
+        return conn.execute(text(
+            "SELECT COUNT(*) FROM snp.stocks_intraday WHERE bar_interval = :interval AND comp_ticker IN :tickers"
+        ).bindparams(bindparam("tickers", expanding=True)), {"interval": interval, "tickers": tickers}).scalar()
+
+
+def delete_bars(tickers):
+    with bulk_session() as conn:
+        conn.execute(text("DELETE FROM snp.stocks_intraday WHERE comp_ticker IN :tickers").bindparams(
+            bindparam("tickers", expanding=True)), {"tickers": tickers})
+
+
+def timed_load(tickers, interval, end, args, batch_rows, since=None):
+    provider = SimulatedProvider(latency=args.latency)
+    fetcher = ConcurrentFetcher(rate=1000, burst=args.workers, max_in_flight=args.workers, stage="intraday")
+    began = time.perf_counter()
+    stats = load_intraday(tickers, interval, end=end, since=since, provider=provider, fetcher=fetcher,
+                          chunk_size=args.chunk_size, batch_rows=batch_rows)
+    wall = time.perf_counter() - began
+    return {
+        "wall_s": round(wall, 2),
+        "bars_per_s": round(stats["bars"] / wall),
+        "peak_buffer_mb": round(stats.pop("peak_buffer_bytes") / 2**20, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        **stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intraday micro-batch loading benchmark")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=5, help="trading sessions of the first load")
+    parser.add_argument("--interval", choices=["1m", "1h"], default="1m")
+    parser.add_argument("--batch-rows", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--chunk-size", type=int, default=100, help="tickers per request")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent provider requests")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per request")
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "bench_results"))
+    args = parser.parse_args()
+
+    if not os.getenv("etl_db_url"):
+        sqlite_warehouse()
+    tickers = synthetic_tickers(args.tickers)
+    # the first `days` sessions load in the sweep, the one after them incrementally
+    sessions = trading_days(SYNTHETIC_START, date.fromisoformat(SYNTHETIC_START) + timedelta(days=2 * args.days + 14))
+    start, first_end, next_end = sessions[0], sessions[args.days], sessions[args.days] + timedelta(days=1)
+    expected = len(tickers) * len(session_bars(start, first_end, args.interval))
+    expected_next = len(tickers) * len(session_bars(first_end, next_end, args.interval))
+
+    report = {
+        "commit": git_commit(),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "database": get_engine().dialect.name,
+        "tickers": args.tickers, "sessions": args.days, "interval": args.interval,
+        "expected_bars": expected, "batch_rows": {},
+    }
+    ok = True
+    with bulk_session() as conn:
+        seed_dimensions(conn, tickers, start.isoformat(), (next_end + timedelta(days=1)).isoformat())
+    try:
+        for batch_rows in args.batch_rows:
+            delete_bars(tickers)
+            result = timed_load(tickers, args.interval, first_end, args, batch_rows, since=start)
+            report["batch_rows"][batch_rows] = result
+            ok = ok and result["bars"] == expected
+            print(f"batch {batch_rows}: {result['bars']} bars in {result['wall_s']}s, {result['bars_per_s']} bars/s, "
+                  f"{result['batches']} batches, buffer peak {result['peak_buffer_mb']} MB")
+
+        # from the stored bars: the last one of each ticker again, then the new session
+        result = timed_load(tickers, args.interval, next_end, args, max(args.batch_rows))
+        result["stored_bars"] = stored_bars(tickers, args.interval)
+        report["incremental"] = result
+        ok = ok and result["bars"] == expected_next + len(tickers) \
+            and result["stored_bars"] == expected + expected_next
+        print(f"incremental: {result['bars']} bars in {result['wall_s']}s")
+    finally:
+        delete_bars(tickers)
+        with bulk_session() as conn:
+            clear_synthetic(conn, tickers, start.isoformat(), (next_end + timedelta(days=1)).isoformat())
+    report["ok"] = bool(ok)
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"intraday-{report['commit'] or 'nocommit'}-{datetime.now():%Y%m%d%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Results saved to {path}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# benchmark: per-row upsert transactions vs. staged bulk upsert into snp.stocks,
+# with reference checks in SQL or validated in memory
+# needs a local Postgres with the schema from database-test/SnP500-DWH.sql,
+# pointed to by etl_db_url (e.g. postgresql+psycopg2://postgres@localhost:5432/snp500)
+# usage: python etl-scripts/bench_loader.py [tickers] [days]
+import sys
+import time
+from datetime import date, timedelta
+from sqlalchemy import text
+from etl.db import get_engine
+from etl.loader import bulk_upsert, COMPANIES, STOCKS
+from etl.validation import validated_upsert, Validator
+
+db = get_engine()
+n_tickers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+n_days = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+# synthetic keys far away from real data so cleanup cannot touch it
+tickers = [f"Z{i:04d}" for i in range(n_tickers)]
+days = [(date(1900, 1, 1) + timedelta(days=d)).isoformat() for d in range(n_days)]
+records = [
+    {
+        "time_id": day, "comp_ticker": ticker, "currency_iso": "USD",
+        "open_price": 100.0, "high_price": 101.5, "low_price": 99.25,
+        "close_price": 100.75, "volume": 1000000
+    }
+    for day in days for ticker in tickers
+]
+
+query_row = """
+    INSERT INTO snp.stocks (
+        time_id, comp_ticker, currency_iso, open_price, high_price, low_price, close_price, volume
+    ) VALUES (
+        :time_id, :comp_ticker, :currency_iso, :open_price, :high_price, :low_price, :close_price, :volume
+    )
+    ON CONFLICT (time_id, comp_ticker) DO UPDATE
+    SET
+        currency_iso = EXCLUDED.currency_iso,
+        open_price = EXCLUDED.open_price,
+        high_price = EXCLUDED.high_price,
+        low_price = EXCLUDED.low_price,
+        close_price = EXCLUDED.close_price,
+        volume = EXCLUDED.volume;
+"""
+
+
+def setup():
+    companies = [
+        {"comp_ticker": t, "comp_name": f"Bench {t}", "sector": "Bench", "industry": "Bench"}
+        for t in tickers
+    ]
+    with db.begin() as conn:
+        bulk_upsert(conn, COMPANIES, companies)
+        conn.execute(
+            text("INSERT INTO snp.times (time_id) VALUES (:time_id) ON CONFLICT DO NOTHING"),
+            [{"time_id": d} for d in days]
+        )
+
+
+def clear_stocks():
+    with db.begin() as conn:
+        conn.execute(text("DELETE FROM snp.stocks WHERE comp_ticker = ANY(:t)"), {"t": tickers})
+
+
+def teardown():
+    clear_stocks()
+    with db.begin() as conn:
+        conn.execute(text("DELETE FROM snp.companies WHERE comp_ticker = ANY(:t)"), {"t": tickers})
+        conn.execute(text("DELETE FROM snp.times WHERE time_id = ANY(CAST(:d AS DATE[]))"), {"d": days})
+
+
+def per_row():
+    # the path main_etl.py used: one transaction per record
+    for record in records:
+        with db.begin() as conn:
+            conn.execute(text(query_row), record)
+
+
+def bulk():
+    with db.begin() as conn:
+        bulk_upsert(conn, STOCKS, records)
+
+
+def validated():
+    # key sets loaded once, references checked in memory, rejects quarantined
+    with db.begin() as conn:
+        validated_upsert(conn, STOCKS, records, Validator.load(conn))
+
+
+setup()
+try:
+    for name, load in (("per-row", per_row), ("bulk", bulk), ("validated", validated)):
+        clear_stocks()
+        start = time.perf_counter()
+        load()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>9}: {len(records)} rows in {elapsed:.2f}s ({len(records) / elapsed:,.0f} rows/s)")
+finally:
+    teardown()
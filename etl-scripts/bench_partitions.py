@@ -0,0 +1,163 @@
+# snp.stocks heap vs time_id range partitions on a local PostgreSQL (etl_db_url)
+# synthetic bars are loaded, typical loads and queries are timed on the current heap,
+# the table is converted with etl.partitions.migrate_stocks and the same workload timed again.
+# the migration is kept: run it against a scratch database, not production.
+# usage: python etl-scripts/bench_partitions.py [--tickers 500] [--years 5] [--grain year] [--repeat 5]
+# exits with status 1 when a query returns different results after the migration
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from etl.db import bulk_session, get_engine
+from etl.loader import bulk_upsert, STOCKS
+from etl.partitions import drop_empty_partitions, ensure_partitions, is_partitioned, migrate_stocks
+from etl.prices import chunked, wide_to_frame
+from etl.reader import read_prices
+from etl.synthetic import SYNTHETIC_START, clear_synthetic, seed_dimensions, synthetic_tickers, synthetic_wide
+
+QUERIES = {
+    "one_day": """
+        SELECT comp_ticker, close_price FROM snp.stocks WHERE time_id = :day ORDER BY comp_ticker
+    """,
+    "one_ticker_history": """
+        SELECT time_id, close_price FROM snp.stocks
+        WHERE comp_ticker = :ticker AND time_id >= :start AND time_id < :end ORDER BY time_id
+    """,
+    "one_year_aggregate": """
+        SELECT comp_ticker, MAX(high_price), MIN(low_price), SUM(volume) FROM snp.stocks
+        WHERE time_id >= :year_start AND time_id < :year_end GROUP BY comp_ticker ORDER BY comp_ticker
+    """,
+    "month_range_scan": """
+        SELECT COUNT(*), SUM(volume) FROM snp.stocks WHERE time_id >= :month_start AND time_id < :month_end
+    """,
+}
+
+# a plain table has no partition tree, a partitioned parent itself is empty
+query_sizes = """
+    SELECT SUM(pg_table_size(relid)) AS table_bytes, SUM(pg_indexes_size(relid)) AS index_bytes
+    FROM (
+        SELECT relid FROM pg_partition_tree('snp.stocks')
+        UNION SELECT CAST('snp.stocks' AS regclass)
+    ) tree
+"""
+
+query_indexes = """
+    SELECT indexname FROM pg_indexes WHERE schemaname = 'snp' AND tablename = 'stocks' ORDER BY indexname
+"""
+
+
+def timed(fn, repeat=1):
+    """(last result, median seconds) over `repeat` runs."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+    return result, round(statistics.median(seconds), 4)
+
+
+def load(frame):
+    def run():
+        with bulk_session() as conn:
+            ensure_partitions(conn, frame["time_id"].min(), frame["time_id"].max())
+            bulk_upsert(conn, STOCKS, frame)
+    return timed(run)[1]
+
+
+def workload(tickers, params, backfill, daily, repeat):
+    """Loads and queries on the current layout; loaded rows are deleted again afterwards."""
+    report = {"loads_s": {}, "queries_s": {}}
+    report["loads_s"]["backfill_month"] = load(backfill)
+    report["loads_s"]["daily_upsert"] = load(daily)
+    # the same day again: every row conflicts and is updated
+    report["loads_s"]["daily_upsert_again"] = load(daily)
+    with get_engine().connect() as conn:
+        conn.execute(text("ANALYZE snp.stocks"))
+        results = {}
+        for name, query in QUERIES.items():
+            rows, report["queries_s"][name] = timed(
+                lambda: [tuple(r) for r in conn.execute(text(query), params)], repeat)
+            results[name] = rows
+        sizes = conn.execute(text(query_sizes)).one()
+        report["table_mb"] = round(int(sizes.table_bytes) / 2**20, 1)
+        report["index_mb"] = round(int(sizes.index_bytes) / 2**20, 1)
+        report["indexes"] = list(conn.execute(text(query_indexes)).scalars())
+    frame, report["queries_s"]["read_prices_50_tickers_year"] = timed(
+        lambda: read_prices(tickers[:50], params["year_start"], params["year_end"]), repeat)
+    results["read_prices"] = len(frame)
+    with bulk_session() as conn:
+        conn.execute(text("DELETE FROM snp.stocks WHERE time_id >= :day AND comp_ticker IN :tickers").bindparams(
+            bindparam("tickers", expanding=True)), {"day": params["end"], "tickers": tickers})
+    return report, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="snp.stocks partitioning benchmark")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--grain", choices=["year", "month"], default="year")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query, the median is reported")
+    args = parser.parse_args()
+
+    if not os.getenv("etl_db_url") or get_engine().dialect.name != "postgresql":
+        print("bench_partitions.py needs a PostgreSQL etl_db_url", file=sys.stderr)
+        return 2
+    tickers = synthetic_tickers(args.tickers)
+    start = pd.Timestamp(SYNTHETIC_START)
+    end = start + pd.DateOffset(years=args.years)
+    backfill_end = end + pd.DateOffset(months=1)
+    clear_end = backfill_end + pd.DateOffset(days=7)
+    last_year = end - pd.DateOffset(years=1)
+    rng = np.random.default_rng(0)
+
+    day = lambda ts: ts.strftime("%Y-%m-%d")
+    params = {
+        "day": day(last_year + pd.offsets.BDay(1)), "ticker": tickers[0],
+        "start": day(start), "end": day(end),
+        "year_start": day(last_year), "year_end": day(end),
+        "month_start": day(last_year + pd.DateOffset(months=6)),
+        "month_end": day(last_year + pd.DateOffset(months=7)),
+    }
+    backfill = wide_to_frame(synthetic_wide(tickers, day(end), day(backfill_end), rng))
+    daily = wide_to_frame(synthetic_wide(tickers, day(backfill_end), day(backfill_end + pd.offsets.BDay(1)), rng))
+
+    with bulk_session() as conn:
+        seed_dimensions(conn, tickers, day(start), day(clear_end))
+    for chunk in chunked(tickers, 100):
+        with bulk_session() as conn:
+            bulk_upsert(conn, STOCKS, wide_to_frame(synthetic_wide(chunk, day(start), day(end), rng)))
+
+    report = {"tickers": args.tickers, "years": args.years, "grain": args.grain}
+    ok = True
+    try:
+        with get_engine().connect() as conn:
+            report["rows"] = conn.execute(text("SELECT COUNT(*) FROM snp.stocks")).scalar()
+            partitioned = is_partitioned(conn)
+        if not partitioned:
+            report["heap"], before = workload(tickers, params, backfill, daily, args.repeat)
+            with bulk_session() as conn:
+                (created, rows), report["migrate_s"] = timed(lambda: migrate_stocks(conn, args.grain))
+            report["migrated"] = {"partitions": len(created), "rows": rows}
+        report["partitioned"], after = workload(tickers, params, backfill, daily, args.repeat)
+        if not partitioned:
+            report["same_results"] = {name: before[name] == after[name] for name in before}
+            ok = all(report["same_results"].values())
+    finally:
+        with bulk_session() as conn:
+            clear_synthetic(conn, tickers, day(start), day(clear_end))
+            # partitions created ahead of the loads
+            drop_empty_partitions(conn, day(start), day(clear_end + pd.DateOffset(years=2)))
+    report["ok"] = ok
+    print(json.dumps(report, indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
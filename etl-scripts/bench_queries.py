@@ -0,0 +1,252 @@
+# warehouse query benchmark: analyst queries over the star schema at growing history sizes
+# synthetic bars, FX rates with gaps and companies in a few sectors are loaded into a local
+# PostgreSQL (etl_db_url) scale by scale; at each scale every query of QUERIES is timed
+# warm (latency percentiles) and its EXPLAIN (ANALYZE, BUFFERS) plan saved as JSON, so schema,
+# index or partitioning changes can be compared on numbers.
+# usage: python etl-scripts/bench_queries.py [--scales 1 3 5] [--tickers 500] [--repeat 20] [--output DIR]
+# artefacts: DIR/queries-<commit>-<time>/summary.json and plans/<years>y-<query>.json
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from bench_etl import git_commit
+from etl.config import BASE_DIR
+from etl.conversion import usd_quoted
+from etl.currencies import closes_to_frame
+from etl.db import bulk_session, get_engine
+from etl.loader import bulk_upsert, CURRENCIES, STOCKS
+from etl.prices import chunked, wide_to_frame
+from etl.synthetic import (
+    SYNTHETIC_START, clear_synthetic, seed_dimensions, synthetic_fx, synthetic_tickers, synthetic_wide
+)
+
+SECTORS = ["Synthetic Energy", "Synthetic Health", "Synthetic Tech", "Synthetic Utilities", "Synthetic Financials"]
+
+# the last rate at or before each stock day, as in database-test/config.sql;
+# {convert} multiplies or divides depending on how the pair is quoted
+QUERIES = {
+    "single_ticker_range": """
+        SELECT s.time_id, s.open_price, s.high_price, s.low_price, s.close_price, s.volume
+        FROM snp.stocks s
+        WHERE s.comp_ticker = :ticker AND s.time_id >= :year_start AND s.time_id < :end
+        ORDER BY s.time_id
+    """,
+    "single_ticker_history": """
+        SELECT s.time_id, s.close_price, s.volume
+        FROM snp.stocks s
+        WHERE s.comp_ticker = :ticker AND s.time_id >= :start AND s.time_id < :end
+        ORDER BY s.time_id
+    """,
+    "sector_by_month": """
+        SELECT c.sector, t.year, t.month,
+            AVG(s.close_price) AS avg_close, SUM(s.volume) AS volume,
+            COUNT(DISTINCT s.comp_ticker) AS companies
+        FROM snp.stocks s
+        JOIN snp.companies c ON c.comp_ticker = s.comp_ticker
+        JOIN snp.times t ON t.time_id = s.time_id
+        WHERE s.time_id >= :start AND s.time_id < :end
+        GROUP BY c.sector, t.year, t.month
+        ORDER BY c.sector, t.year, t.month
+    """,
+    "cross_sectional_day": """
+        SELECT c.comp_ticker, c.sector, s.close_price,
+            s.close_price / NULLIF(p.close_price, 0) - 1 AS daily_return
+        FROM snp.stocks s
+        JOIN snp.companies c ON c.comp_ticker = s.comp_ticker
+        JOIN snp.stocks p ON p.comp_ticker = s.comp_ticker AND p.time_id = :prev_day
+        WHERE s.time_id = :day
+        ORDER BY daily_return DESC
+        LIMIT 20
+    """,
+    "currency_converted_range": """
+        SELECT s.time_id, s.comp_ticker, s.close_price {convert} r.exchange_rate AS close_converted
+        FROM snp.stocks s
+        JOIN LATERAL (
+            SELECT x.exchange_rate FROM snp.currencies x
+            WHERE x.currency_iso = :currency AND x.time_id <= s.time_id
+            ORDER BY x.time_id DESC
+            LIMIT 1
+        ) r ON TRUE
+        WHERE s.comp_ticker = ANY(:tickers) AND s.time_id >= :quarter_start AND s.time_id < :end
+        ORDER BY s.time_id, s.comp_ticker
+    """,
+    "currency_sector_month": """
+        SELECT c.sector, t.year, t.month, SUM(s.close_price * s.volume {convert} r.exchange_rate) AS turnover
+        FROM snp.stocks s
+        JOIN snp.companies c ON c.comp_ticker = s.comp_ticker
+        JOIN snp.times t ON t.time_id = s.time_id
+        JOIN LATERAL (
+            SELECT x.exchange_rate FROM snp.currencies x
+            WHERE x.currency_iso = :currency AND x.time_id <= s.time_id
+            ORDER BY x.time_id DESC
+            LIMIT 1
+        ) r ON TRUE
+        WHERE s.time_id >= :year_start AND s.time_id < :end
+        GROUP BY c.sector, t.year, t.month
+        ORDER BY c.sector, t.year, t.month
+    """,
+    "star_count": """
+        SELECT COUNT(*)
+        FROM snp.stocks s
+        JOIN snp.companies c ON s.comp_ticker = c.comp_ticker
+        JOIN snp.times t ON s.time_id = t.time_id
+        LEFT JOIN snp.currencies c2 ON c2.currency_iso = :currency
+            AND c2.time_id = (SELECT MAX(c3.time_id) FROM snp.currencies c3
+                              WHERE c3.currency_iso = :currency AND c3.time_id <= t.time_id)
+    """,
+}
+
+
+def day(ts):
+    return ts.strftime("%Y-%m-%d")
+
+
+def scale_params(tickers, start, end, currency):
+    """Bind parameters of QUERIES for history in [start, end): recent windows end at the last day."""
+    last = end - pd.offsets.BDay(1)
+    return {
+        "ticker": tickers[0], "tickers": tickers[:50], "currency": currency,
+        "start": day(start), "end": day(end),
+        "year_start": day(end - pd.DateOffset(years=1)),
+        "quarter_start": day(end - pd.DateOffset(months=3)),
+        "day": day(last), "prev_day": day(last - pd.offsets.BDay(1)),
+    }
+
+
+def percentiles(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def plan_summary(plan):
+    """Totals of an EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) plan and the scans it chose."""
+    root = plan[0]
+    scans = set()
+    stack = [root["Plan"]]
+    while stack:
+        node = stack.pop()
+        if "Relation Name" in node or "Index Name" in node:
+            scans.add(node["Node Type"]
+                      + (f" on {node['Relation Name']}" if "Relation Name" in node else "")
+                      + (f" using {node['Index Name']}" if "Index Name" in node else ""))
+        stack.extend(node.get("Plans", []))
+    return {
+        "planning_ms": root.get("Planning Time"),
+        "execution_ms": root.get("Execution Time"),
+        "shared_hit_blocks": root["Plan"].get("Shared Hit Blocks"),
+        "shared_read_blocks": root["Plan"].get("Shared Read Blocks"),
+        "scans": sorted(scans),
+    }
+
+
+def run_query(conn, sql, params, warmup, repeat):
+    """(rows, latencies in seconds, EXPLAIN plan); warm-up runs fill the buffer cache first."""
+    seconds = []
+    for i in range(warmup + repeat):
+        started = time.perf_counter()
+        rows = conn.execute(text(sql), params).all()
+        if i >= warmup:
+            seconds.append(time.perf_counter() - started)
+    plan = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), params).scalar()
+    return rows, seconds, plan
+
+
+def load_history(tickers, start, end, currency, fx_gaps, rng):
+    """Bars of tickers and FX rates with missing days in [start, end)."""
+    rates = closes_to_frame(synthetic_fx(start, end, currencies=tuple(dict.fromkeys(("EUR", currency))), rng=rng))
+    keep = (rng.random(len(rates)) >= fx_gaps) | (rates["time_id"] == rates["time_id"].min())
+    with bulk_session() as conn:
+        bulk_upsert(conn, CURRENCIES, rates[keep])
+    for chunk in chunked(tickers, 100):
+        with bulk_session() as conn:
+            bulk_upsert(conn, STOCKS, wide_to_frame(synthetic_wide(chunk, start, end, rng)))
+
+
+def vacuum_analyze():
+    # as autovacuum would have after a load: statistics and the visibility map for index-only scans
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in ("snp.stocks", "snp.currencies", "snp.companies", "snp.times"):
+            conn.execute(text(f"VACUUM ANALYZE {table}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warehouse query benchmark")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 3, 5], help="years of history")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--currency", default="PLN")
+    parser.add_argument("--fx-gaps", type=float, default=0.1, help="share of FX days left out")
+    parser.add_argument("--queries", nargs="+", choices=list(QUERIES), default=list(QUERIES))
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "bench_results"))
+    args = parser.parse_args()
+
+    if not os.getenv("etl_db_url") or get_engine().dialect.name != "postgresql":
+        print("bench_queries.py needs a PostgreSQL etl_db_url", file=sys.stderr)
+        return 2
+    convert = "/" if usd_quoted(args.currency) else "*"
+    queries = {name: QUERIES[name].format(convert=convert) for name in args.queries}
+    scales = sorted(set(args.scales))
+    tickers = synthetic_tickers(args.tickers)
+    start = pd.Timestamp(SYNTHETIC_START)
+    clear_end = start + pd.DateOffset(years=scales[-1])
+    rng = np.random.default_rng(0)
+
+    commit = git_commit()
+    output = os.path.join(args.output, f"queries-{commit or 'nocommit'}-{datetime.now():%Y%m%d%H%M%S}")
+    os.makedirs(os.path.join(output, "plans"), exist_ok=True)
+    report = {
+        "commit": commit,
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "tickers": args.tickers, "repeat": args.repeat, "currency": args.currency,
+        "scales": {},
+    }
+    with bulk_session() as conn:
+        seed_dimensions(conn, tickers, day(start), day(clear_end), SECTORS)
+    loaded_to = start
+    try:
+        for years in scales:
+            # history grows forward, each scale only loads the years it adds
+            end = start + pd.DateOffset(years=years)
+            load_history(tickers, day(loaded_to), day(end), args.currency, args.fx_gaps, rng)
+            loaded_to = end
+            vacuum_analyze()
+            params = scale_params(tickers, start, end, args.currency)
+            scale = {"queries": {}}
+            with get_engine().connect() as conn:
+                scale["stocks_rows"] = conn.execute(text("SELECT COUNT(*) FROM snp.stocks")).scalar()
+                for name, sql in queries.items():
+                    rows, seconds, plan = run_query(conn, sql, params, args.warmup, args.repeat)
+                    path = os.path.join("plans", f"{years}y-{name}.json")
+                    with open(os.path.join(output, path), "w") as f:
+                        json.dump(plan, f, indent=2)
+                    scale["queries"][name] = {
+                        "rows": len(rows), **percentiles(seconds), **plan_summary(plan), "plan": path,
+                    }
+                    print(f"{years}y {name}: p50 {scale['queries'][name]['p50_ms']} ms, {len(rows)} rows")
+            report["scales"][f"{years}y"] = scale
+    finally:
+        with bulk_session() as conn:
+            clear_synthetic(conn, tickers, day(start), day(clear_end))
+
+    with open(os.path.join(output, "summary.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
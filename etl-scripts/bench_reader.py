@@ -0,0 +1,106 @@
+# read benchmark: pd.read_sql of snp.stocks against etl.reader.read_prices
+# synthetic bars are loaded into etl_db_url (or an in-memory SQLite stand-in), then read
+# whole, from the LRU cache, after a load moved a watermark, and as a chunked scan.
+# usage: python etl-scripts/bench_reader.py [--tickers 500] [--years 5] [--chunk-rows 50000]
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from etl.db import bulk_session, get_engine
+from etl.loader import bulk_upsert, STOCKS
+from etl.prices import chunked, wide_to_frame
+from etl.reader import PriceReader, iter_prices
+from etl.standin import sqlite_warehouse
+from etl.synthetic import SYNTHETIC_START, clear_synthetic, seed_dimensions, synthetic_tickers, synthetic_wide
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"wall_s": round(elapsed, 3), "peak_mb": round(peak / 2**20, 1)}
+
+
+def frame_mb(frame):
+    return round(frame.memory_usage(deep=True).sum() / 2**20, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read API benchmark")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--chunk-rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    if not os.getenv("etl_db_url"):
+        sqlite_warehouse()
+    tickers = synthetic_tickers(args.tickers)
+    start = SYNTHETIC_START
+    end = (pd.Timestamp(start) + pd.DateOffset(years=args.years)).strftime("%Y-%m-%d")
+    rng = np.random.default_rng(0)
+    with bulk_session() as conn:
+        seed_dimensions(conn, tickers, start, end)
+    for chunk in chunked(tickers, 100):
+        with bulk_session() as conn:
+            bulk_upsert(conn, STOCKS, wide_to_frame(synthetic_wide(chunk, start, end, rng)))
+
+    report = {"database": get_engine().dialect.name, "tickers": args.tickers, "years": args.years}
+    try:
+        def read_sql():
+            stmt = text(
+                "SELECT * FROM snp.stocks WHERE comp_ticker IN :tickers "
+                "AND time_id >= :start AND time_id < :end ORDER BY time_id, comp_ticker"
+            ).bindparams(bindparam("tickers", expanding=True))
+            with get_engine().connect() as conn:
+                return pd.read_sql(stmt, conn, params={"tickers": tickers, "start": start, "end": end})
+
+        frame, stats = measure(read_sql)
+        report["read_sql"] = dict(stats, rows=len(frame), frame_mb=frame_mb(frame))
+        del frame
+
+        reader = PriceReader(chunk_rows=args.chunk_rows)
+        frame, stats = measure(lambda: reader.read(tickers, start, end))
+        report["read_prices_cold"] = dict(stats, rows=len(frame), frame_mb=frame_mb(frame))
+        frame, stats = measure(lambda: reader.read(tickers, start, end))
+        report["read_prices_cached"] = dict(stats, rows=len(frame))
+
+        # a new bar for one ticker moves its watermark, the cached entry is read again
+        last = frame[frame["comp_ticker"] == tickers[0]].iloc[-1]
+        with bulk_session() as conn:
+            conn.execute(text("INSERT INTO snp.times (time_id) VALUES (:end) ON CONFLICT DO NOTHING"), {"end": end})
+            bulk_upsert(conn, STOCKS, [{
+                "time_id": end, "comp_ticker": tickers[0], "currency_iso": "USD",
+                "open_price": last["open_price"], "high_price": last["high_price"],
+                "low_price": last["low_price"], "close_price": last["close_price"], "volume": 1,
+            }])
+        del frame
+        frame, stats = measure(lambda: reader.read(tickers, start, end))
+        report["read_prices_invalidated"] = dict(stats, rows=len(frame))
+        report["cache"] = reader.stats()
+        del frame
+
+        def scan():
+            rows = 0
+            for chunk in iter_prices(tickers, start, end, chunk_rows=args.chunk_rows):
+                rows += len(chunk)
+            return rows
+
+        rows, stats = measure(scan)
+        report["read_prices_chunked"] = dict(stats, rows=rows)
+    finally:
+        with bulk_session() as conn:
+            clear_synthetic(conn, tickers, start, (pd.Timestamp(end) + pd.Timedelta(days=1)).strftime("%Y-%m-%d"))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# rollup benchmark and check: incremental refresh against a full recompute
+# synthetic bars are loaded into etl_db_url (or an in-memory SQLite stand-in) and rolled up,
+# then one more day is loaded and refreshed incrementally; the rollups must equal a full
+# recompute of the same data.
+# usage: python etl-scripts/bench_rollups.py [--tickers 500] [--years 5]
+# exits with status 1 when the incremental rollups differ from the full recompute
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from etl.db import bulk_session, get_engine
+from etl.loader import bulk_upsert, STOCKS
+from etl.prices import chunked, wide_to_frame
+from etl.rollups import refresh_rollups, ROLLUPS
+from etl.standin import rollup_snapshot, same_rows, sqlite_warehouse
+from etl.synthetic import SYNTHETIC_START, clear_synthetic, seed_dimensions, synthetic_tickers, synthetic_wide
+
+SECTORS = ["Synthetic Energy", "Synthetic Health", "Synthetic Tech", "Synthetic Utilities"]
+def refresh(since=None):
+    stamp = datetime.now().isoformat(timespec="seconds")
+    start = time.perf_counter()
+    with bulk_session() as conn:
+        rows, tickers = refresh_rollups(conn, stamp, since)
+    return {"wall_s": round(time.perf_counter() - start, 3), "tickers": tickers, "rows": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollup refresh benchmark")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.getenv("etl_db_url"):
+        sqlite_warehouse()
+    tickers = synthetic_tickers(args.tickers)
+    start = SYNTHETIC_START
+    # the extra day lands mid-month, so its month and quarter are recomputed, not appended
+    end = (pd.Timestamp(start) + pd.DateOffset(years=args.years, days=10)).strftime("%Y-%m-%d")
+    next_day = (pd.Timestamp(end) + pd.offsets.BDay(1)).strftime("%Y-%m-%d")
+    clear_end = (pd.Timestamp(next_day) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    rng = np.random.default_rng(0)
+    with bulk_session() as conn:
+        seed_dimensions(conn, tickers, start, clear_end, SECTORS)
+    for chunk in chunked(tickers, 100):
+        with bulk_session() as conn:
+            bulk_upsert(conn, STOCKS, wide_to_frame(synthetic_wide(chunk, start, end, rng)))
+
+    report = {"database": get_engine().dialect.name, "tickers": args.tickers, "years": args.years}
+    ok = False
+    try:
+        report["initial"] = refresh()
+        with bulk_session() as conn:
+            bulk_upsert(conn, STOCKS, wide_to_frame(synthetic_wide(tickers, next_day, clear_end, rng)))
+        report["incremental"] = refresh()
+        incremental = rollup_snapshot(start, clear_end)
+        report["full_recompute"] = refresh(since=start)
+        full = rollup_snapshot(start, clear_end)
+        report["equal"] = {table: same_rows(incremental[table], full[table]) for table in ROLLUPS}
+        ok = all(report["equal"].values())
+    finally:
+        with bulk_session() as conn:
+            for table in ("daily_returns", "monthly_ohlcv", "quarterly_ohlcv"):
+                conn.execute(text(f"DELETE FROM snp.{table} WHERE comp_ticker IN :tickers").bindparams(
+                    bindparam("tickers", expanding=True)), {"tickers": tickers})
+            conn.execute(text("DELETE FROM snp.sector_daily WHERE sector IN :sectors").bindparams(
+                bindparam("sectors", expanding=True)), {"sectors": SECTORS})
+            clear_synthetic(conn, tickers, start, clear_end)
+    report["ok"] = ok
+    print(json.dumps(report, indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# shared building blocks for the S&P 500 ETL scripts
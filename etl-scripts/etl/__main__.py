@@ -0,0 +1,7 @@
+import sys
+
+from etl.cli import main
+
+# guarded: process pools (etl/backfill.py) import the main module in their workers
+if __name__ == "__main__":
+    sys.exit(main())
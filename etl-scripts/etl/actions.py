@@ -0,0 +1,222 @@
+# corporate actions: re-adjust stored history of a ticker after a new split or dividend
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from etl.loader import _copy_rows, bulk_upsert, stage_rows, Target
+from etl.metrics import get_metrics
+from etl.prices import ACTION_FIELDS, chunked, CHUNK_SIZE, default_provider, wide_to_frame
+from etl.throttle import ConcurrentFetcher
+
+LOOKBACK_DAYS = int(os.getenv("etl_actions_lookback_days", "30"))
+
+ACTIONS = Target(
+    "snp.corporate_actions",
+    ["comp_ticker", "action_date", "action_type", "value", "price_factor", "volume_factor",
+     "rows_adjusted", "applied_at"],
+    key=["comp_ticker", "action_date", "action_type"],
+)
+
+# one row per ticker and range of days sharing a cumulative adjustment
+ADJUSTMENTS = Target(
+    "stage_adjustments",
+    ["comp_ticker", "seg_start", "seg_end", "price_factor", "volume_factor"],
+    key=[],
+)
+ADJUSTMENTS_DDL = """
+    CREATE TEMPORARY TABLE stage_adjustments (
+        comp_ticker CHAR(5), seg_start DATE, seg_end DATE,
+        price_factor NUMERIC(24, 12), volume_factor NUMERIC(24, 12)
+    )
+"""
+
+query_known = """
+    SELECT comp_ticker, action_date, action_type
+    FROM snp.corporate_actions
+    WHERE comp_ticker IN :tickers
+"""
+
+# close stored on the last day before each action and the rows it touches, in one query
+query_ref_closes = """
+    SELECT
+        a.comp_ticker, a.action_date, a.action_type,
+        s.time_id AS ref_day, s.close_price AS ref_close,
+        (SELECT COUNT(*) FROM snp.stocks s3
+         WHERE s3.comp_ticker = a.comp_ticker AND s3.time_id < a.action_date) AS rows_before
+    FROM stage_corporate_actions a
+    JOIN snp.stocks s
+        ON s.comp_ticker = a.comp_ticker
+        AND s.time_id = (
+            SELECT MAX(s2.time_id) FROM snp.stocks s2
+            WHERE s2.comp_ticker = a.comp_ticker AND s2.time_id < a.action_date
+        )
+"""
+
+query_adjust = """
+    UPDATE snp.stocks AS s
+    SET
+        open_price = ROUND(s.open_price * g.price_factor, 4),
+        high_price = ROUND(s.high_price * g.price_factor, 4),
+        low_price = ROUND(s.low_price * g.price_factor, 4),
+        close_price = ROUND(s.close_price * g.price_factor, 4),
+        volume = CAST(ROUND(s.volume * g.volume_factor) AS BIGINT)
+    FROM stage_adjustments g
+    WHERE s.comp_ticker = g.comp_ticker
+        AND (g.seg_start IS NULL OR s.time_id >= g.seg_start)
+        AND s.time_id < g.seg_end
+"""
+
+
+def wide_to_actions(wide):
+    """Non-zero splits and dividends of a wide frame downloaded with actions=True."""
+    columns = ["comp_ticker", "action_date", "action_type", "value"]
+    if wide.empty:
+        return pd.DataFrame(columns=columns)
+    fields = [f for f in ACTION_FIELDS if f in wide.columns.get_level_values(1)]
+    if not fields:
+        return pd.DataFrame(columns=columns)
+    wide = wide.sort_index(axis=1)
+    # all-NaN rows are dropped explicitly, pandas 3 keeps them when stacking
+    long = wide.loc[:, (slice(None), fields)].stack(level=0).dropna(how="all")
+    long.index.names = ["action_date", "comp_ticker"]
+    long = long.rename(columns=ACTION_FIELDS).reset_index()
+    long = long.melt(["action_date", "comp_ticker"], var_name="action_type", value_name="value")
+    long = long[long["value"].fillna(0) != 0]
+    long["action_date"] = pd.to_datetime(long["action_date"]).dt.strftime("%Y-%m-%d")
+    return long[columns].reset_index(drop=True)
+
+
+def fetch_actions(tickers, start, end, provider=None, chunk_size=CHUNK_SIZE, fetcher=None):
+    """
+    Splits and dividends in [start, end) plus the provider's (adjusted) closes
+    of the same window, one multi-symbol request per chunk.
+    Returns (actions frame, closes frame with comp_ticker, time_id, close_price).
+    """
+    provider = provider or default_provider()
+    fetcher = fetcher or ConcurrentFetcher(stage="actions")
+    actions, closes = [], []
+    chunks = [tuple(chunk) for chunk in chunked(list(tickers), chunk_size)]
+
+    def download(chunk):
+        return provider.download(list(chunk), start, end, actions=True)
+
+    for chunk, wide, error in fetcher.map(download, chunks):
+        if error is not None:
+            logging.error(f"Error for actions of {chunk[0]}..{chunk[-1]}: {error}")
+            continue
+        actions.append(wide_to_actions(wide))
+        closes.append(wide_to_frame(wide)[["comp_ticker", "time_id", "close_price"]])
+    if not actions:
+        return wide_to_actions(pd.DataFrame()), pd.DataFrame(columns=["comp_ticker", "time_id", "close_price"])
+    return pd.concat(actions, ignore_index=True), pd.concat(closes, ignore_index=True)
+
+
+def _known(conn, actions):
+    stmt = text(query_known).bindparams(bindparam("tickers", expanding=True))
+    rows = conn.execute(stmt, {"tickers": sorted(actions["comp_ticker"].unique())})
+    return {(t.strip(), str(d)[:10], kind) for t, d, kind in rows}
+
+
+def _factors(actions):
+    """Price and volume multipliers for rows before each action, like auto_adjust."""
+    split = actions["action_type"] == "split"
+    price = pd.Series(1.0, index=actions.index)
+    price[split] = 1 / actions.loc[split, "value"]
+    dividend = ~split & actions["ref_close"].notna()
+    price[dividend] = 1 - actions.loc[dividend, "value"] / actions.loc[dividend, "ref_close"]
+    volume = pd.Series(1.0, index=actions.index)
+    volume[split] = actions.loc[split, "value"]
+    return price, volume
+
+
+def segments(actions):
+    """
+    Cumulative factors per ticker: rows before the earliest action get the
+    product of all factors, rows between two actions the later ones only.
+    """
+    rows = []
+    for ticker, group in actions.sort_values("action_date").groupby("comp_ticker", sort=False):
+        price = group["price_factor"].iloc[::-1].cumprod().iloc[::-1].tolist()
+        volume = group["volume_factor"].iloc[::-1].cumprod().iloc[::-1].tolist()
+        bounds = [None] + group["action_date"].tolist()
+        for i in range(len(group)):
+            rows.append({
+                "comp_ticker": ticker, "seg_start": bounds[i], "seg_end": bounds[i + 1],
+                "price_factor": round(price[i], 12), "volume_factor": round(volume[i], 12),
+            })
+    return pd.DataFrame(rows, columns=ADJUSTMENTS.columns)
+
+
+def apply_actions(conn, actions, closes):
+    """
+    Record new actions and re-adjust the stored history of their tickers with
+    one set-based UPDATE. Tickers whose stored closes already match the
+    provider (e.g. loaded after the action) are recorded but not touched.
+    Returns (new actions frame, rows adjusted).
+    """
+    if actions.empty:
+        return actions, 0
+    known = _known(conn, actions)
+    keys = zip(actions["comp_ticker"], actions["action_date"], actions["action_type"])
+    actions = actions[[key not in known for key in keys]].copy()
+    if actions.empty:
+        return actions, 0
+
+    # stored close before each action, needed for dividend factors and the check below
+    staged = actions.assign(price_factor=1.0, volume_factor=1.0, rows_adjusted=0, applied_at=None)
+    stage_rows(conn, ACTIONS, staged[ACTIONS.columns])
+    refs = pd.DataFrame(conn.execute(text(query_ref_closes)).mappings().all(),
+                        columns=["comp_ticker", "action_date", "action_type", "ref_day", "ref_close", "rows_before"])
+    refs["comp_ticker"] = refs["comp_ticker"].str.strip()
+    refs["action_date"] = refs["action_date"].astype(str).str[:10]
+    refs["ref_day"] = refs["ref_day"].astype(str).str[:10]
+    refs["ref_close"] = refs["ref_close"].astype(float)
+    conn.execute(text(f"DROP TABLE {ACTIONS.stage}"))
+    actions = actions.merge(refs, on=["comp_ticker", "action_date", "action_type"], how="left")
+    actions["price_factor"], actions["volume_factor"] = _factors(actions)
+
+    # a stored close equal to the provider's adjusted close means the history
+    # was loaded after the action, closer to the expected factor means it was not
+    provider_close = closes.assign(time_id=closes["time_id"].astype(str)).set_index(["comp_ticker", "time_id"])["close_price"]
+    pending = []
+    for ticker, group in actions.sort_values("action_date").groupby("comp_ticker"):
+        first = group.iloc[0]
+        if pd.isna(first["ref_day"]):
+            continue  # no stored history before the action
+        expected = group["price_factor"].prod()
+        observed = provider_close.get((ticker, first["ref_day"]))
+        if observed is not None and abs(observed / first["ref_close"] - 1) < abs(observed / first["ref_close"] - expected):
+            continue
+        pending.append(group)
+
+    rows = 0
+    if pending:
+        adjust = segments(pd.concat(pending))
+        conn.execute(text("DROP TABLE IF EXISTS stage_adjustments"))
+        conn.execute(text(ADJUSTMENTS_DDL))
+        _copy_rows(conn, ADJUSTMENTS, adjust, table=ADJUSTMENTS.table)
+        with get_metrics().timer("adjust_seconds", stage="actions"):
+            rows = conn.execute(text(query_adjust)).rowcount
+        conn.execute(text("DROP TABLE stage_adjustments"))
+    adjusted = set(pd.concat(pending)["comp_ticker"]) if pending else set()
+
+    actions["rows_adjusted"] = actions["rows_before"].fillna(0).astype("int64").where(
+        actions["comp_ticker"].isin(adjusted), 0)
+    actions["applied_at"] = datetime.now().isoformat(timespec="seconds")
+    bulk_upsert(conn, ACTIONS, actions[ACTIONS.columns])
+    metrics = get_metrics()
+    metrics.count("actions_recorded", len(actions), stage="actions")
+    metrics.count("rows_adjusted", rows, stage="actions")
+    for ticker in adjusted:
+        metrics.count_ticker(ticker, "actions_applied")
+    return actions, rows
+
+
+def refresh_actions(conn, tickers, end, lookback_days=LOOKBACK_DAYS, provider=None):
+    """Detect actions of the last lookback_days before end and apply the new ones."""
+    start = (date.fromisoformat(str(end)) - timedelta(days=lookback_days)).isoformat()
+    actions, closes = fetch_actions(tickers, start, end, provider)
+    return apply_actions(conn, actions, closes)
@@ -0,0 +1,143 @@
+# parallel history backfill: (ticker chunk x date window) units fetched under one shared rate
+# limit, transformed in a process pool and loaded over pooled connections, one commit per unit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import as_completed, ProcessPoolExecutor, ThreadPoolExecutor
+
+from etl.db import bulk_session, get_engine, MAX_OVERFLOW, POOL_SIZE
+from etl.journal import FAILED, LOADED, PENDING, RunJournal
+from etl.loader import STOCKS
+from etl.metrics import get_metrics
+from etl.partitions import ensure_partitions, GRAIN, partition_bounds
+from etl.prices import CHUNK_SIZE, chunked, default_provider, wide_to_frame
+from etl.throttle import BURST, ConcurrentFetcher, MAX_IN_FLIGHT, RATE
+from etl.trading_calendar import populate_times, trading_days
+from etl.validation import validated_upsert, Validator
+from etl.watermarks import _to_date
+
+PROCESSES = int(os.getenv("etl_backfill_processes", str(min(4, os.cpu_count() or 1))))  # 0: transform inline
+LOADERS = int(os.getenv("etl_backfill_loaders", str(min(4, POOL_SIZE))))  # concurrent load transactions
+STAGE = "backfill"  # journal stage and metrics label
+
+
+def plan_units(tickers, start, end, chunk_size=CHUNK_SIZE, window=GRAIN):
+    """
+    [(start, end, (tickers, ...))] covering tickers x [start, end). Date windows
+    follow the snp.stocks partitions, so concurrent loads write disjoint keys,
+    mostly into different partitions. Windows without a trading day are left out.
+    """
+    start, end = _to_date(start), _to_date(end)
+    units = []
+    for _, lower, upper in partition_bounds(start, end, window):
+        lower, upper = max(lower, start), min(upper, end)
+        if not trading_days(lower, upper):
+            continue
+        for group in chunked(list(tickers), chunk_size):
+            units.append((lower.isoformat(), upper.isoformat(), tuple(group)))
+    return units
+
+
+def unit_name(unit):
+    start, end, tickers = unit
+    return f"{start}..{end}:{tickers[0]}..{tickers[-1]}"
+
+
+def backfill_journal(start, end):
+    """One journal per backfilled range, so a rerun of the same range resumes it."""
+    return RunJournal(f"backfill_{start}_{end}")
+
+
+def backfill(tickers, start, end, provider=None, workers=MAX_IN_FLIGHT, rate=RATE,
+             processes=PROCESSES, loaders=LOADERS, chunk_size=CHUNK_SIZE, window=GRAIN,
+             journal=None, resume=False):
+    """
+    Load daily bars of tickers for [start, end) unit by unit:
+      - `workers` threads fetch units, all gated by one token bucket of `rate` requests/s,
+      - `processes` worker processes turn the wide downloads into snp.stocks rows,
+      - `loaders` threads merge units over pooled connections, each unit in its own
+        transaction, journaled as loaded once committed.
+    A failed unit is journaled and the others go on; with resume=True units the
+    journal of this range already has as loaded are skipped.
+    Returns {"units", "loaded", "failed", "rows", "rejected"}.
+    """
+    journal = journal or backfill_journal(start, end)
+    units = plan_units(tickers, start, end, chunk_size, window)
+    if resume:
+        pending = set(journal.pending(STAGE, [unit_name(unit) for unit in units]))
+        units = [unit for unit in units if unit_name(unit) in pending]
+    stats = {"units": len(units), "loaded": 0, "failed": 0, "rows": 0, "rejected": 0}
+    if not units:
+        return stats
+
+    # days, partitions and the reference keys once up front, not per concurrent unit
+    with bulk_session() as conn:
+        populate_times(conn, start, end)
+        ensure_partitions(conn, start, end)
+        validator = Validator.load(conn)
+    journal.record_many(STAGE, [unit_name(unit) for unit in units], PENDING)
+
+    if get_engine().dialect.name == "sqlite":
+        loaders = 1  # one writer at a time
+    loaders = max(1, min(loaders, POOL_SIZE + MAX_OVERFLOW))
+    provider = provider or default_provider()
+    fetcher = ConcurrentFetcher(rate=rate, burst=max(BURST, workers), max_in_flight=workers, stage=STAGE)
+    metrics = get_metrics()
+    # units fetched but not committed yet: fetching waits when transforms or loads fall behind
+    slots = threading.Semaphore(workers + max(processes, 1) + 2 * loaders)
+    lock = threading.Lock()
+
+    def download(unit):
+        slots.acquire()
+        try:
+            return provider.download(list(unit[2]), unit[0], unit[1])
+        except BaseException:
+            slots.release()
+            raise
+
+    def load(unit, transformed):
+        name = unit_name(unit)
+        try:
+            frame = transformed.result()
+            with metrics.timer("load_seconds", stage=STAGE):
+                with bulk_session() as conn:
+                    rows, rejected = validated_upsert(conn, STOCKS, frame, validator)
+        except Exception as e:
+            logging.error(f"Error loading backfill unit {name}: {e}")
+            journal.record(STAGE, name, FAILED, e)
+            with lock:
+                stats["failed"] += 1
+            return
+        finally:
+            slots.release()
+        journal.record(STAGE, name, LOADED)
+        metrics.count("rows_backfilled", rows, stage=STAGE)
+        with lock:
+            stats["loaded"] += 1
+            stats["rows"] += rows
+            stats["rejected"] += len(rejected)
+
+    if processes > 0:
+        # spawned, not forked: the parent runs fetch and load threads
+        transforms = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        transforms = ThreadPoolExecutor(1)
+    loads = []
+    with ThreadPoolExecutor(loaders) as load_pool:
+        with transforms:
+            for unit, wide, error in fetcher.map(download, units):
+                if error is not None:
+                    logging.error(f"Error fetching backfill unit {unit_name(unit)}: {error}")
+                    journal.record(STAGE, unit_name(unit), FAILED, error)
+                    with lock:
+                        stats["failed"] += 1
+                    continue
+                # the load is queued once the transform is done, in whichever order units finish
+                transforms.submit(wide_to_frame, wide).add_done_callback(
+                    lambda transformed, unit=unit: loads.append(load_pool.submit(load, unit, transformed)))
+        for future in as_completed(list(loads)):
+            future.result()
+    metrics.count("units_backfilled", stats["loaded"], stage=STAGE)
+    metrics.count("units_failed", stats["failed"], stage=STAGE)
+    return stats
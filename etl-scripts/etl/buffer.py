@@ -0,0 +1,113 @@
+# columnar accumulation buffer with a row and byte budget for large backfills
+import os
+import tempfile
+
+import pandas as pd
+
+from etl.metrics import get_metrics
+
+MAX_ROWS = int(os.getenv("etl_buffer_max_rows", "200000"))
+MAX_BYTES = int(os.getenv("etl_buffer_max_mb", "64")) * 1024 * 1024
+
+# repeated labels are kept as categories, prices and volumes as typed arrays
+STOCK_DTYPES = {
+    "time_id": "category",
+    "comp_ticker": "category",
+    "currency_iso": "category",
+    "open_price": "float64",
+    "high_price": "float64",
+    "low_price": "float64",
+    "close_price": "float64",
+    "volume": "int64",
+}
+
+
+def compact(frame, dtypes=STOCK_DTYPES):
+    """Cast a frame to the buffer's column types."""
+    return frame.astype({c: t for c, t in dtypes.items() if c in frame.columns})
+
+
+class ColumnBuffer:
+    """
+    Collects frames column by column instead of as per-row dicts and hands
+    them to `sink` whenever max_rows or max_bytes is reached, so memory stays
+    bounded by the budget however long the backfill is. Without a sink the
+    flushed frames are spilled to disk and read back with drain().
+    """
+
+    def __init__(self, sink=None, dtypes=STOCK_DTYPES, max_rows=MAX_ROWS,
+                 max_bytes=MAX_BYTES, spill_dir=None, stage="stocks"):
+        self.sink = sink
+        self.dtypes = dtypes
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.stage = stage
+        self.frames = []
+        self.rows = 0
+        self.nbytes = 0
+        self.flushes = 0
+        self.spills = []
+        self.own_spill_dir = spill_dir is None
+        self.peak_bytes = 0  # largest buffered size, for benchmarks
+
+    def append(self, frame):
+        if frame is None or frame.empty:
+            return
+        frame = compact(frame, self.dtypes)
+        self.frames.append(frame)
+        self.rows += len(frame)
+        self.nbytes += int(frame.memory_usage(index=False, deep=True).sum())
+        self.peak_bytes = max(self.peak_bytes, self.nbytes)
+        if self.rows >= self.max_rows or self.nbytes >= self.max_bytes:
+            self.flush()
+
+    def flush(self):
+        """Pass the buffered rows to the sink (or spill them), then start empty."""
+        if not self.frames:
+            return
+        # union the categories so the concatenated columns stay categorical
+        frame = pd.concat(self.frames, ignore_index=True)
+        for column, dtype in self.dtypes.items():
+            if dtype == "category" and column in frame.columns:
+                frame[column] = frame[column].astype("category")
+        self.frames, self.rows, self.nbytes = [], 0, 0
+        metrics = get_metrics()
+        metrics.count("buffer_flushes", stage=self.stage)
+        metrics.count("buffer_rows_flushed", len(frame), stage=self.stage)
+        self.flushes += 1
+        if self.sink is not None:
+            self.sink(frame)
+        else:
+            self._spill(frame)
+
+    def _spill(self, frame):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix=f"etl-{self.stage}-")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"{len(self.spills):05d}.pkl")
+        frame.to_pickle(path)
+        self.spills.append(path)
+        get_metrics().count("buffer_spills", stage=self.stage)
+
+    def drain(self):
+        """Yield spilled frames in order and remove their files."""
+        self.flush()
+        for path in self.spills:
+            frame = pd.read_pickle(path)
+            os.remove(path)
+            yield frame
+        self.spills = []
+        if self.own_spill_dir and self.spill_dir is not None:
+            os.rmdir(self.spill_dir)
+            self.spill_dir = None
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
@@ -0,0 +1,130 @@
+# persistent cache for provider responses, stored in a local SQLite file
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from etl.config import BASE_DIR
+
+CACHE_DIR = os.getenv("etl_cache_dir", os.path.join(BASE_DIR, "cache"))
+MAX_BYTES = 512 * 1024 * 1024
+
+# seconds a response stays valid, per endpoint; "history:1d" falls back to "history"
+TTLS = {
+    "info": 7 * 24 * 3600,  # company profiles change rarely
+    "history": 24 * 3600,
+    "fx": 24 * 3600,
+}
+DEFAULT_TTL = 3600
+
+_cache = None
+
+
+class ResponseCache:
+    """
+    Responses keyed by (provider, symbol, endpoint, start, end), expired by
+    per-endpoint TTLs and evicted least-recently-used beyond max_bytes.
+    """
+
+    def __init__(self, path=None, max_bytes=MAX_BYTES, ttls=None):
+        path = path or os.path.join(CACHE_DIR, "responses.sqlite")
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttls = dict(TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+        self.conn.commit()
+
+    @staticmethod
+    def key(provider, symbol, endpoint, start=None, end=None):
+        return "|".join([provider, symbol, endpoint, str(start or ""), str(end or "")])
+
+    def ttl(self, endpoint):
+        """TTL of the endpoint, or of its family before the ":" (history:1d -> history)."""
+        if endpoint in self.ttls:
+            return self.ttls[endpoint]
+        return self.ttls.get(endpoint.split(":")[0], DEFAULT_TTL)
+
+    def get(self, provider, symbol, endpoint, start=None, end=None):
+        key = self.key(provider, symbol, endpoint, start, end)
+        ttl = self.ttl(endpoint)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + ttl < now:
+                if row is not None:
+                    self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def put(self, provider, symbol, endpoint, value, start=None, end=None):
+        key = self.key(provider, symbol, endpoint, start, end)
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, blob, len(blob), now, now)
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def cached(self, provider, symbol, endpoint, fetch, start=None, end=None):
+        """Return the cached response or call fetch() and store its result."""
+        value = self.get(provider, symbol, endpoint, start, end)
+        if value is None:
+            value = fetch()
+            # empty answers are usually transient failures, do not pin them
+            if value is not None and len(value):
+                self.put(provider, symbol, endpoint, value, start, end)
+        return value
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+def get_cache():
+    """Process-wide cache, None when disabled with etl_cache=0."""
+    global _cache
+    if os.getenv("etl_cache", "1") == "0":
+        return None
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
@@ -0,0 +1,226 @@
+# command line entry point: python -m etl run [--date D | --from D --to D] [--stages ...] [--dry-run]
+#                           python -m etl migrate [--grain year|month] [--keep-old]
+#                           python -m etl backfill [--from D] [--to D] [--workers N] [--resume] [--dry-run]
+#                           python -m etl intraday [--interval 1m|1h] [--until T] [--since T] [--dry-run]
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+
+from etl.backfill import backfill as run_backfill, LOADERS, plan_units, PROCESSES, unit_name
+from etl.cache import get_cache
+from etl.config import LOG_DIR, read_tickers, TICKERS_FILE
+from etl.db import bulk_session
+from etl.intraday import BATCH_ROWS, current_bar, load_bar_watermarks, load_intraday, plan_bar_units
+from etl.journal import RunJournal
+from etl.metrics import get_metrics, write_run_summary
+from etl.partitions import GRAIN, is_partitioned, migrate_stocks
+from etl.pipeline import SUCCEEDED
+from etl.prices import CHUNK_SIZE, FixtureProvider
+from etl.rollups import refresh_rollups
+from etl.synthetic import utc
+from etl.stages import build_pipeline, DEFAULT_STAGES, RunContext
+from etl.throttle import ConcurrentFetcher, MAX_IN_FLIGHT, RATE
+from etl.trading_calendar import BAR_FREQ
+from etl.watermarks import HISTORY_START
+
+
+def _day(value):
+    return date.fromisoformat(value)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="etl", description="S&P 500 data warehouse ETL")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run pipeline stages")
+    run.add_argument("--date", type=_day,
+                     help="run date, days before it are loaded (default: today)")
+    run.add_argument("--from", dest="start", type=_day,
+                     help="reload from this day regardless of the watermarks")
+    run.add_argument("--to", dest="to", type=_day,
+                     help="last day to load, inclusive (default: the day before --date)")
+    run.add_argument("--stages", nargs="+", default=DEFAULT_STAGES, metavar="STAGE",
+                     help=f"stages to run, dependencies outside the list are assumed done "
+                          f"(default: {' '.join(DEFAULT_STAGES)}; also: companies constituents convert)")
+    run.add_argument("--dry-run", action="store_true", help="print the plan without loading")
+    run.add_argument("--resume", action="store_true",
+                     help="redo only units the journal of this run date has not loaded")
+    run.add_argument("--html", help="saved Wikipedia page for the constituents stage")
+    run.add_argument("--actions-fixture",
+                     help="offline bars and actions (JSON) for the actions stage instead of yfinance")
+    migrate = commands.add_parser("migrate", help="convert snp.stocks into time_id range partitions")
+    migrate.add_argument("--grain", choices=["year", "month"], default=GRAIN,
+                         help=f"partition size (default: {GRAIN}, etl_stocks_partition)")
+    migrate.add_argument("--keep-old", action="store_true",
+                         help="keep the unpartitioned table as snp.stocks_unpartitioned")
+    backfill = commands.add_parser("backfill", help="load price history in parallel, unit by unit")
+    backfill.add_argument("--from", dest="start", type=_day, default=_day(HISTORY_START),
+                          help=f"first day to load (default: {HISTORY_START})")
+    backfill.add_argument("--to", dest="to", type=_day,
+                          help="last day to load, inclusive (default: yesterday)")
+    backfill.add_argument("--tickers-file", default=TICKERS_FILE)
+    backfill.add_argument("--workers", type=int, default=MAX_IN_FLIGHT, help="concurrent provider requests")
+    backfill.add_argument("--rate", type=float, default=RATE, help="provider requests per second, all workers")
+    backfill.add_argument("--processes", type=int, default=PROCESSES,
+                          help="transform processes, 0 transforms in the parent")
+    backfill.add_argument("--loaders", type=int, default=LOADERS, help="concurrent load transactions")
+    backfill.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="tickers per unit")
+    backfill.add_argument("--window", choices=["year", "month"], default=GRAIN, help="days per unit")
+    backfill.add_argument("--resume", action="store_true",
+                          help="skip units the journal of this range has loaded")
+    backfill.add_argument("--fixture", help="offline bars (JSON or JSON Lines) instead of yfinance")
+    backfill.add_argument("--dry-run", action="store_true", help="print the units without loading")
+    intraday = commands.add_parser("intraday", help="load hourly or 1-minute bars from the last stored bar")
+    intraday.add_argument("--interval", choices=list(BAR_FREQ), default="1m")
+    intraday.add_argument("--until", type=utc,
+                          help="load bars starting before this time, UTC (default: the current bar)")
+    intraday.add_argument("--since", type=utc,
+                          help="reload from this time (UTC) regardless of the stored bars")
+    intraday.add_argument("--tickers-file", default=TICKERS_FILE)
+    intraday.add_argument("--workers", type=int, default=MAX_IN_FLIGHT, help="concurrent provider requests")
+    intraday.add_argument("--rate", type=float, default=RATE, help="provider requests per second, all workers")
+    intraday.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="tickers per request")
+    intraday.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="rows per micro-batch transaction")
+    intraday.add_argument("--fixture", help="offline bars (JSON or JSON Lines with bar_ts) instead of yfinance")
+    intraday.add_argument("--dry-run", action="store_true", help="print the requests without loading")
+    return parser
+
+
+def print_plan(pipeline, ctx, stages):
+    print(f"Run {ctx.end}: loading days before {ctx.end}"
+          + (f" from {ctx.start}" if ctx.start else " from the watermarks"))
+    for i, wave in enumerate(pipeline.waves(stages)):
+        print(f"  wave {i + 1}: {', '.join(wave)}")
+    for source, stage in (("stocks", "prices"), ("currencies", "fx")):
+        if stage in stages:
+            for start, end, keys in ctx.ranges(source):
+                print(f"  {source}: {len(keys)} keys from {start} to {end}")
+
+
+def run(args):
+    run_date = args.date or date.today()
+    end = args.to + timedelta(days=1) if args.to else run_date
+    if args.start and args.start >= end:
+        raise SystemExit(f"--from {args.start} must be before the end of the range {end}")
+    stages = list(dict.fromkeys(
+        name for value in args.stages for name in value.split(",") if name
+    ))
+    html = None
+    if args.html:
+        with open(args.html, encoding="utf-8") as f:
+            html = f.read()
+
+    journal = RunJournal(run_date.isoformat())
+    ctx = RunContext(
+        end.isoformat(), journal,
+        start=args.start.isoformat() if args.start else None,
+        resume=args.resume, html=html, actions_fixture=args.actions_fixture,
+    )
+    pipeline = build_pipeline()
+    print_plan(pipeline, ctx, stages)
+    if args.dry_run:
+        return 0
+
+    results = pipeline.run(ctx, stages)
+    print(f"run journal {journal.path}: {journal.summary()}")
+    print(json.dumps({name: result.as_dict() for name, result in results.items()}, indent=2))
+    cache = get_cache()
+    if cache:
+        stats = cache.stats()
+        get_metrics().count("cache_hits", stats["hits"])
+        get_metrics().count("cache_misses", stats["misses"])
+    print(f"run metrics {write_run_summary()}")
+    return 0 if all(r.status == SUCCEEDED for r in results.values()) else 1
+
+
+def migrate(args):
+    start = time.perf_counter()
+    with bulk_session() as conn:
+        if is_partitioned(conn):
+            print("snp.stocks is already partitioned")
+            return 0
+        created, rows = migrate_stocks(conn, args.grain, args.keep_old)
+    print(f"snp.stocks partitioned by {args.grain}: {rows} rows copied into {len(created)} partitions "
+          f"in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+def backfill(args):
+    end = (args.to or date.today() - timedelta(days=1)) + timedelta(days=1)
+    if args.start >= end:
+        raise SystemExit(f"--from {args.start} must be before the end of the range {end}")
+    tickers = read_tickers(args.tickers_file)
+    units = plan_units(tickers, args.start, end, args.chunk_size, args.window)
+    print(f"Backfill {len(tickers)} tickers from {args.start} to {end}: {len(units)} units")
+    if args.dry_run:
+        for unit in units:
+            print(f"  {unit_name(unit)}")
+        return 0
+
+    start = time.perf_counter()
+    provider = FixtureProvider(path=args.fixture) if args.fixture else None
+    stats = run_backfill(
+        tickers, args.start.isoformat(), end.isoformat(), provider=provider,
+        workers=args.workers, rate=args.rate, processes=args.processes, loaders=args.loaders,
+        chunk_size=args.chunk_size, window=args.window, resume=args.resume,
+    )
+    print(f"backfilled {stats['rows']} rows in {stats['loaded']}/{stats['units']} units "
+          f"({stats['failed']} failed, {stats['rejected']} rows rejected) in {time.perf_counter() - start:.1f}s")
+    # reloaded days keep the rollup watermarks where they were, refresh from the start of the range
+    with bulk_session() as conn:
+        rows, touched = refresh_rollups(conn, datetime.now().isoformat(timespec="seconds"), since=args.start)
+    print(f"rollups refreshed for {touched} tickers: {rows}")
+    print(f"run metrics {write_run_summary()}")
+    return 0 if not stats["failed"] else 1
+
+
+def intraday(args):
+    tickers = read_tickers(args.tickers_file)
+    if args.dry_run:
+        end = args.until or current_bar(args.interval)
+        with bulk_session() as conn:
+            watermarks = load_bar_watermarks(conn, args.interval)
+        units = plan_bar_units(tickers, watermarks, end, args.interval, args.since, args.chunk_size)
+        print(f"Intraday {args.interval} bars of {len(tickers)} tickers until {end}: {len(units)} requests")
+        for start, upper, chunk in units:
+            print(f"  {start}..{upper}: {chunk[0]}..{chunk[-1]}")
+        return 0
+
+    start = time.perf_counter()
+    provider = FixtureProvider(path=args.fixture) if args.fixture else None
+    fetcher = ConcurrentFetcher(rate=args.rate, max_in_flight=args.workers, stage="intraday")
+    stats = load_intraday(
+        tickers, args.interval, end=args.until, since=args.since, provider=provider, fetcher=fetcher,
+        chunk_size=args.chunk_size, batch_rows=args.batch_rows,
+    )
+    elapsed = time.perf_counter() - start
+    print(f"loaded {stats['bars']} {args.interval} bars in {stats['batches']} batches from {stats['requests']} requests "
+          f"({stats['failed']} failed, {stats['rejected']} bars rejected) in {elapsed:.1f}s")
+    print(f"run metrics {write_run_summary()}")
+    return 0 if not stats["failed"] else 1
+
+
+def main(argv=None):
+    load_dotenv()
+    # log any errors
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(filename=os.path.join(LOG_DIR, "etl_errors.log"), level=logging.ERROR)
+    args = build_parser().parse_args(argv)
+    if args.command == "run":
+        return run(args)
+    if args.command == "migrate":
+        return migrate(args)
+    if args.command == "backfill":
+        return backfill(args)
+    if args.command == "intraday":
+        return intraday(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# company dimension: profile fetch and change-detecting refresh
+import hashlib
+import json
+
+import yfinance as yf
+from sqlalchemy import text
+
+from etl.loader import bulk_upsert, COMPANIES
+from etl.metrics import get_metrics
+from etl.throttle import ConcurrentFetcher
+
+query_companies = f"SELECT {', '.join(COMPANIES.columns)} FROM snp.companies"
+
+
+def empty_profile(ticker):
+    return {
+        'symbol': ticker,
+        'name': 'N/A',
+        'sector': 'N/A',
+        'industry': 'N/A',
+        'exchange': 'N/A',
+        'city': 'N/A',
+        'state': 'N/A',
+        'full_time_employees': -1,
+        'website': 'N/A',
+        'country': 'N/A'
+    }
+
+
+def fetch_profile(ticker, cache=None):
+    """
+    Profile of one company from yfinance. Errors propagate so a fetcher can
+    retry them; profiles are served from the response cache while fresh.
+    """
+    def download_info():
+        return yf.Ticker(ticker).info
+
+    info = cache.cached("yfinance", ticker, "info", download_info) if cache else download_info()
+    return {
+        'symbol': ticker,
+        'name': info.get('shortName', info.get('longName', 'N/A')),
+        'sector': info.get('sector', 'N/A'),
+        'industry': info.get('industry', 'N/A'),
+        'exchange': info.get('exchange', 'N/A'),
+        'city': info.get('city', 'N/A'),
+        'state': info.get('state', 'N/A'),
+        'full_time_employees': info.get('fullTimeEmployees', -1),
+        'website': info.get('website', 'N/A'),
+        'country': info.get('country', 'N/A')
+    }
+
+
+def fetch_profiles(tickers, cache=None, fetcher=None):
+    """
+    Profiles of many companies under a token-bucket rate limit.
+    Returns (profiles, {ticker: error}), tickers without a name count as failed.
+    """
+    fetcher = fetcher or ConcurrentFetcher(rate=4, burst=8, max_in_flight=8, stage="companies")
+    profiles, failed = [], {}
+    for ticker, profile, error in fetcher.map(lambda t: fetch_profile(t, cache), tickers):
+        if error is not None or profile["name"] == "N/A":
+            failed[ticker] = error or "no profile"
+        else:
+            profiles.append(profile)
+    return profiles, failed
+
+
+def _clean(value):
+    if isinstance(value, str):
+        value = value.strip()
+    return value
+
+
+def profile_to_row(company):
+    """Map a staged profile onto the snp.companies columns."""
+    employees = company.get("full_time_employees", 0)
+    return {
+        "comp_ticker": _clean(company["symbol"]),
+        "comp_name": _clean(company["name"]),
+        "sector": _clean(company["sector"]),
+        "industry": _clean(company["industry"]),
+        "exchange_code": _clean(company["exchange"]),
+        "comp_city": _clean(company["city"]),
+        "comp_state": _clean(company["state"]),
+        "comp_employees": None if employees in (-1, None) else int(employees),
+        "website": _clean(company["website"]),
+        "country": _clean(company["country"]),
+    }
+
+
+def row_hash(row):
+    """Stable digest of a normalized row, equal rows hash equal on both sides."""
+    values = [_clean(row.get(column)) for column in COMPANIES.columns]
+    return hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()
+
+
+def load_companies(conn):
+    """Current warehouse rows {ticker: row} in one query."""
+    rows = {}
+    for row in conn.execute(text(query_companies)).mappings():
+        row = {column: _clean(row[column]) for column in COMPANIES.columns}
+        rows[row["comp_ticker"]] = row
+    return rows
+
+
+def diff_companies(rows, current):
+    """
+    Split profile rows into new and changed ones. Returns (new, changed) where
+    changed maps ticker -> [(field, old, new), ...]; unchanged rows are dropped.
+    """
+    new, changed = [], {}
+    for row in rows:
+        old = current.get(row["comp_ticker"])
+        if old is None:
+            new.append(row)
+        elif row_hash(row) != row_hash(old):
+            changed[row["comp_ticker"]] = [
+                (column, old[column], row[column])
+                for column in COMPANIES.columns
+                if _clean(old[column]) != _clean(row[column])
+            ]
+    return new, changed
+
+
+def refresh_companies(conn, profiles):
+    """
+    Upsert only new or changed companies in one staged merge.
+    Returns (new, changed, loaded, rejected); a no-change refresh writes nothing.
+    """
+    rows = {}
+    for profile in profiles:
+        row = profile_to_row(profile)
+        rows[row["comp_ticker"]] = row  # last profile of a ticker wins
+    new, changed = diff_companies(rows.values(), load_companies(conn))
+    metrics = get_metrics()
+    metrics.count("companies_new", len(new))
+    metrics.count("companies_changed", len(changed))
+    metrics.count("companies_unchanged", len(rows) - len(new) - len(changed))
+    upserts = new + [rows[ticker] for ticker in changed]
+    if not upserts:
+        return new, changed, 0, []
+    loaded, rejected = bulk_upsert(conn, COMPANIES, upserts)
+    return new, changed, loaded, rejected
@@ -0,0 +1,15 @@
+# paths and small helpers shared by the ETL scripts
+import os
+
+# provide unrelative paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.path.join(BASE_DIR, "data_integration")
+LOG_DIR = os.path.join(BASE_DIR, "log")
+TICKERS_FILE = os.path.join(DATA_DIR, "sp500_tickers.txt")
+
+
+# Function to read tickers from a file
+def read_tickers(file_path=TICKERS_FILE):
+    with open(file_path, 'r') as file:
+        tickers = [line.strip() for line in file if line.strip()]
+    return tickers
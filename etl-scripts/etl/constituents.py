@@ -0,0 +1,144 @@
+# S&P 500 constituent sync: diff the scraped index against the tickers file and the warehouse
+import os
+import re
+
+from sqlalchemy import bindparam, text
+
+from etl.companies import fetch_profiles, refresh_companies
+from etl.config import read_tickers, TICKERS_FILE
+from etl.db import bulk_session, get_engine
+from etl.staging import StagingStore
+
+# "Alphabet Inc. (Class C)" -> "Alphabet Inc.", one share class per company is loaded
+SHARE_CLASS = re.compile(r"\s*\(Class [A-Z]\)$")
+
+query_listed = "SELECT comp_ticker, index_removed FROM snp.companies"
+
+query_end_date = """
+    UPDATE snp.companies SET index_removed = :day
+    WHERE comp_ticker IN :tickers AND index_removed IS NULL
+"""
+
+query_list = """
+    UPDATE snp.companies SET index_added = COALESCE(index_added, :day), index_removed = NULL
+    WHERE comp_ticker IN :tickers
+"""
+
+
+def index_tickers(frame):
+    """
+    Tickers of the scraped table (Symbol, Company columns) in page order,
+    keeping only the first listed share class of each company.
+    """
+    tickers, companies = [], set()
+    for symbol, company in zip(frame["Symbol"], frame["Company"]):
+        company = SHARE_CLASS.sub("", company)
+        if company in companies:
+            continue
+        companies.add(company)
+        tickers.append(symbol)
+    return tickers
+
+
+def load_listed(conn):
+    """{ticker: index_removed} of every company in the warehouse, in one query."""
+    return {
+        ticker.strip(): removed
+        for ticker, removed in conn.execute(text(query_listed))
+    }
+
+
+def diff_constituents(index, tickers, listed):
+    """
+    Compare the index with the tickers file and the warehouse. Returns
+    (added, removed): tickers to profile and backfill, tickers to end-date.
+    A ticker missing from the warehouse or end-dated there counts as added.
+    """
+    index_set = set(index)
+    active = set(tickers) | {t for t, removed in listed.items() if removed is None}
+    known = set(tickers)
+    added = [t for t in index if t not in known or t not in listed or listed[t] is not None]
+    removed = sorted(active - index_set)
+    return added, removed
+
+
+def mark_listed(conn, tickers, day):
+    """Set index_added (kept if already known) and clear index_removed."""
+    if tickers:
+        stmt = text(query_list).bindparams(bindparam("tickers", expanding=True))
+        conn.execute(stmt, {"day": day, "tickers": list(tickers)})
+
+
+def end_date(conn, tickers, day):
+    """Close the membership of removed tickers, their history stays in place."""
+    if tickers:
+        stmt = text(query_end_date).bindparams(bindparam("tickers", expanding=True))
+        conn.execute(stmt, {"day": day, "tickers": list(tickers)})
+
+
+def write_tickers(tickers, path=TICKERS_FILE):
+    """Rewrite the tickers file atomically, one ticker per line."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(tickers) + "\n")
+    os.replace(tmp, path)
+
+
+def read_index(html=None):
+    """Tickers of the S&P 500, from a saved Wikipedia page or scraped live."""
+    # the scraper lives next to the ETL scripts
+    from snp500acr import fetch_sp500_html, parse_sp500_table
+    return index_tickers(parse_sp500_table(html if html is not None else fetch_sp500_html()))
+
+
+def sync_constituents(day, html=None, dry_run=False, cache=None, tickers_file=TICKERS_FILE, check=None):
+    """
+    Bring snp.companies and the tickers file in line with the index: fetch
+    profiles of added tickers only, list them, end-date removed ones.
+    History is not loaded here, added tickers have no watermark so the next
+    price load backfills them. `check()` is called before anything is
+    written and may raise to abort. Returns (listed, removed), or the
+    planned (added, removed) on a dry run.
+    """
+    check = check or (lambda: None)
+    index = read_index(html)
+    tickers = read_tickers(tickers_file)
+    with get_engine().connect() as conn:
+        listed = load_listed(conn)
+    added, removed = diff_constituents(index, tickers, listed)
+    print(f"Index: {len(index)} tickers, tickers file: {len(tickers)}, warehouse: {len(listed)}")
+    print(f"Added: {len(added)} {added}")
+    print(f"Removed: {len(removed)} {removed}")
+    if dry_run:
+        return added, removed
+    if not (added or removed):
+        return [], []
+
+    profiles, failed = fetch_profiles(added, cache)
+    check()
+    for ticker, error in failed.items():
+        print(f"No profile for {ticker}, it stays out until the next sync: {error}")
+    if profiles:
+        store = StagingStore()
+        snapshot = {company["symbol"]: company for company in store.read_latest("companies")}
+        snapshot.update({profile["symbol"]: profile for profile in profiles})
+        store.append("companies", list(snapshot.values()), partition=str(day), replace=True)
+
+    # merge the new companies and end-date the removed ones in one transaction
+    with bulk_session() as conn:
+        _, _, _, rejected = refresh_companies(conn, profiles)
+        skipped = {key["comp_ticker"] for key, _ in rejected}
+        listed_now = [p["symbol"] for p in profiles if p["symbol"] not in skipped]
+        mark_listed(conn, listed_now, day)
+        end_date(conn, removed, day)
+        check()
+    for key, reason in rejected:
+        print(f"- skipped {key['comp_ticker']} due to {reason}")
+    print(f"Companies listed: {len(listed_now)}, end-dated: {len(removed)}")
+
+    # the daily ETL picks up the index as of this sync
+    write_tickers(
+        [t for t in tickers if t not in removed] + [t for t in listed_now if t not in tickers],
+        tickers_file
+    )
+    return listed_now, removed
@@ -0,0 +1,182 @@
+# as-of currency conversion of USD prices: last known rate at or before each day
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from etl.currencies import currency_pairs
+from etl.metrics import get_metrics
+from etl.watermarks import _to_date, load_watermarks, plan_ranges
+
+BASE_CURRENCY = "USD"  # currency_iso of the stored prices
+PRICE_COLUMNS = ["open_price", "high_price", "low_price", "close_price"]
+
+
+def hot_currencies():
+    """Currencies kept in snp.stocks_fx, etl_fx_hot="PLN" or all configured ones."""
+    hot = os.getenv("etl_fx_hot")
+    return [iso.strip() for iso in hot.split(",") if iso.strip()] if hot else list(currency_pairs())
+
+
+def usd_quoted(currency):
+    """
+    Whether exchange_rate of currency is USD per unit (EURUSD=X) rather than
+    units per USD (PLN=X); Yahoo names the pair after the quote currency.
+    """
+    symbol = currency_pairs().get(currency)
+    if symbol is None:
+        raise ValueError(f"unknown currency {currency}, configured: {sorted(currency_pairs())}")
+    return symbol.upper().endswith("USD=X")
+
+
+query_rates = """
+    SELECT time_id, CAST(exchange_rate AS DOUBLE PRECISION) AS exchange_rate
+    FROM snp.currencies
+    WHERE currency_iso = :currency
+        AND time_id >= COALESCE((
+            SELECT MAX(time_id) FROM snp.currencies
+            WHERE currency_iso = :currency AND time_id <= :start
+        ), :start)
+        AND time_id < :end
+    ORDER BY time_id
+"""
+
+
+def load_rates(conn, currency, start, end):
+    """
+    USD -> currency multipliers indexed by day, from the last rate at or
+    before start (so the first days of the range have one) up to end.
+    """
+    rows = conn.execute(text(query_rates), {"currency": currency, "start": str(start), "end": str(end)}).all()
+    days = pd.DatetimeIndex(pd.to_datetime([day for day, _ in rows]), name="time_id")
+    rates = np.asarray([rate for _, rate in rows], dtype="float64")
+    return pd.Series(1 / rates if usd_quoted(currency) else rates, index=days, name="factor")
+
+
+def asof(days, factors):
+    """Factor of the last rate day at or before each of days (NaN before the first), one vectorized pass."""
+    positions = np.searchsorted(factors.index.to_numpy(), pd.DatetimeIndex(days).to_numpy(), side="right") - 1
+    values = np.append(factors.to_numpy(), np.nan)
+    return values[np.where(positions >= 0, positions, len(factors))]
+
+
+def convert_frame(frame, factors):
+    """Prices of a time_id-indexed frame (etl.reader) multiplied by the as-of factors."""
+    factor = asof(frame.index, factors)
+    frame = frame.copy()
+    for column in PRICE_COLUMNS:
+        frame[column] = frame[column].to_numpy() * factor
+    return frame
+
+
+# precomputed conversions of hot currencies: each day resolves its rate day once,
+# then stocks are hash joined on time_id instead of looking a rate up per row
+query_convert = """
+    INSERT INTO snp.stocks_fx (
+        currency_iso, time_id, comp_ticker, rate_day, exchange_rate,
+        open_price, high_price, low_price, close_price, volume, converted_at
+    )
+    SELECT
+        :currency, s.time_id, s.comp_ticker, d.rate_day, r.exchange_rate,
+        ROUND(s.open_price * {factor}, 4), ROUND(s.high_price * {factor}, 4),
+        ROUND(s.low_price * {factor}, 4), ROUND(s.close_price * {factor}, 4),
+        s.volume, :converted_at
+    FROM snp.stocks s
+    JOIN (
+        SELECT t.time_id, (
+            SELECT MAX(c.time_id) FROM snp.currencies c
+            WHERE c.currency_iso = :currency AND c.time_id <= t.time_id
+        ) AS rate_day
+        FROM snp.times t
+        WHERE t.time_id >= :start AND t.time_id < :end
+    ) d ON d.time_id = s.time_id
+    JOIN snp.currencies r ON r.currency_iso = :currency AND r.time_id = d.rate_day
+    WHERE s.comp_ticker IN :tickers
+    ON CONFLICT (currency_iso, comp_ticker, time_id) DO UPDATE
+    SET
+        rate_day = EXCLUDED.rate_day,
+        exchange_rate = EXCLUDED.exchange_rate,
+        open_price = EXCLUDED.open_price,
+        high_price = EXCLUDED.high_price,
+        low_price = EXCLUDED.low_price,
+        close_price = EXCLUDED.close_price,
+        volume = EXCLUDED.volume,
+        converted_at = EXCLUDED.converted_at
+"""
+
+query_converted_marks = """
+    SELECT comp_ticker, MAX(time_id) AS loaded_to
+    FROM snp.stocks_fx
+    WHERE currency_iso = :currency
+    GROUP BY comp_ticker
+"""
+
+# rates newer than the last one used, and history re-adjusted since the last refresh
+query_refresh_state = """
+    SELECT
+        (SELECT MIN(c.time_id) FROM snp.currencies c
+         WHERE c.currency_iso = :currency
+            AND c.time_id > (SELECT MAX(f.rate_day) FROM snp.stocks_fx f WHERE f.currency_iso = :currency)
+        ) AS new_rate_day,
+        (SELECT MAX(f.converted_at) FROM snp.stocks_fx f WHERE f.currency_iso = :currency) AS converted_at
+"""
+
+query_readjusted = """
+    SELECT DISTINCT comp_ticker
+    FROM snp.corporate_actions
+    WHERE rows_adjusted > 0 AND applied_at >= :converted_at
+"""
+
+
+def convert_range(conn, currency, start, end, tickers, converted_at):
+    """Upsert converted rows of tickers for days in [start, end), returns rows written."""
+    factor = "(1.0 / r.exchange_rate)" if usd_quoted(currency) else "r.exchange_rate"
+    stmt = text(query_convert.format(factor=factor)).bindparams(bindparam("tickers", expanding=True))
+    return conn.execute(stmt, {
+        "currency": currency, "start": str(start), "end": str(end),
+        "tickers": list(tickers), "converted_at": converted_at,
+    }).rowcount
+
+
+def refresh_converted(conn, currency, end, converted_at, since=None):
+    """
+    Bring snp.stocks_fx up to date for one currency, touching only:
+    days after each ticker's converted watermark, every day from the first
+    rate newer than the last one used (the as-of rate of those days
+    changed), and the whole history of tickers re-adjusted since the last
+    refresh. since reconverts every ticker from that day, e.g. after a
+    forced reload. Returns rows written.
+    """
+    watermarks = load_watermarks(conn)["stocks"]
+    tickers = sorted(watermarks)
+    if not tickers:
+        return 0
+    history_start = _to_date(conn.execute(text("SELECT MIN(time_id) FROM snp.stocks")).scalar())
+    history_end = (max(watermarks.values()) + timedelta(days=1)).isoformat()
+    end = min(str(end), history_end)
+    converted = {
+        key.strip(): _to_date(loaded_to)
+        for key, loaded_to in conn.execute(text(query_converted_marks), {"currency": currency})
+    }
+    ranges = plan_ranges(tickers, converted, end, history_start)
+    new_rate_day, last_converted = conn.execute(text(query_refresh_state), {"currency": currency}).one()
+    if last_converted is not None:
+        readjusted = [t.strip() for t, in conn.execute(text(query_readjusted), {"converted_at": last_converted})]
+        if readjusted:
+            ranges += plan_ranges(readjusted, {}, end, history_start)
+    # every ticker from the earliest of these days, other ranges are cut off where it starts
+    starts = [_to_date(day).isoformat() for day in (new_rate_day, since) if day is not None]
+    if starts:
+        all_from = min(starts)
+        ranges = [(start, min(range_end, all_from), group) for start, range_end, group in ranges if start < all_from]
+        ranges.append((all_from, end, tickers))
+
+    rows = 0
+    metrics = get_metrics()
+    with metrics.timer("convert_seconds", stage="convert"):
+        for start, range_end, group in ranges:
+            rows += convert_range(conn, currency, start, range_end, group, converted_at)
+    metrics.count("rows_converted", rows, stage="convert")
+    return rows
@@ -0,0 +1,72 @@
+# exchange rates for snp.currencies, fetched in one request and reshaped without Python loops
+import os
+
+import pandas as pd
+import yfinance as yf
+
+from etl.cache import get_cache
+from etl.metrics import get_metrics
+
+# currency_iso -> Yahoo symbol, exchange_rate is the Close of that symbol
+# extend with etl_currencies="GBP:GBPUSD=X,CHF:CHF=X" without touching the code
+CURRENCY_PAIRS = {
+    "EUR": "EURUSD=X",
+    "PLN": "PLN=X",
+}
+
+
+def currency_pairs():
+    pairs = dict(CURRENCY_PAIRS)
+    extra = os.getenv("etl_currencies")
+    if extra:
+        for item in extra.split(","):
+            iso, symbol = item.strip().split(":")
+            pairs[iso.strip()] = symbol.strip()
+    return pairs
+
+
+def download_closes(start, end, pairs=None):
+    """Close prices of all pairs in a single download, columns are currency codes."""
+    pairs = pairs or currency_pairs()
+    symbols = list(pairs.values())
+
+    def download():
+        return yf.download(symbols, start=start, end=end, progress=False)
+
+    cache = get_cache()
+    if cache is not None:
+        data = cache.cached("yfinance", ",".join(symbols), "fx", download, start, end)
+    else:
+        data = download()
+    closes = data["Close"]
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(symbols[0])
+    return closes.rename(columns={symbol: iso for iso, symbol in pairs.items()})
+
+
+def closes_to_frame(closes, pairs=None):
+    """Melt a date x currency frame into currency_iso/exchange_rate/time_id rows."""
+    pairs = pairs or currency_pairs()
+    # keep only days on which every currency traded, as the loader always did
+    closes = closes[[iso for iso in pairs if iso in closes.columns]].dropna()
+    closes = closes.round(4)
+    closes.index = pd.to_datetime(closes.index).strftime("%Y-%m-%d")
+    closes.index.name = "time_id"
+    rates = closes.reset_index().melt(
+        id_vars="time_id", var_name="currency_iso", value_name="exchange_rate"
+    )
+    # one block of currencies per day, in configured order
+    rates["order"] = rates["currency_iso"].map({iso: i for i, iso in enumerate(pairs)})
+    rates = rates.sort_values(["time_id", "order"], kind="stable")
+    return rates[["currency_iso", "exchange_rate", "time_id"]].reset_index(drop=True)
+
+
+def fetch_currency_records(start, end, pairs=None):
+    metrics = get_metrics()
+    with metrics.timer("provider_latency_seconds", stage="currencies"):
+        closes = download_closes(start, end, pairs)
+    metrics.count("provider_requests", stage="currencies")
+    with metrics.timer("transform_seconds", stage="currencies"):
+        records = closes_to_frame(closes, pairs).to_dict(orient="records")
+    metrics.count("rows_transformed", len(records), stage="currencies")
+    return records
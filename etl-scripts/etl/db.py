@@ -0,0 +1,104 @@
+# single pooled engine shared by all ETL scripts
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+from etl.metrics import get_metrics
+
+POOL_SIZE = int(os.getenv("etl_db_pool_size", "5"))
+MAX_OVERFLOW = int(os.getenv("etl_db_max_overflow", "5"))
+STATEMENT_TIMEOUT_MS = int(os.getenv("etl_db_statement_timeout_ms", "300000"))
+
+_engine = None
+
+
+def db_url():
+    """
+    Connection string for the warehouse. `etl_db_url` overrides everything,
+    e.g. a local Postgres or "sqlite://" for tests; otherwise the AWS RDS
+    settings used by the GitHub Actions workflow are combined.
+    """
+    url = os.getenv("etl_db_url")
+    if url:
+        return url
+    db_user = os.getenv("db_user_aws")
+    db_password = os.getenv("db_password_aws")
+    db_host = os.getenv("db_host_aws")
+    db_port = os.getenv("db_port")
+    db_name = os.getenv("db_name_aws")
+    db_engine = os.getenv("db_engine_aws")
+    return f"{db_engine}://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+
+def _attach_snp_schema(engine, url):
+    # SQLite has no schemas, attach a second database named "snp" instead
+    snp_db = ":memory:" if url.database in (None, "", ":memory:") else f"{url.database}.snp"
+
+    @event.listens_for(engine, "connect")
+    def attach(dbapi_conn, _):
+        dbapi_conn.execute(f"ATTACH DATABASE '{snp_db}' AS snp")
+
+
+def _count_round_trips(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(*args):
+        get_metrics().count("db_round_trips")
+
+
+def build_engine(url=None):
+    url = make_url(url or db_url())
+    if url.get_backend_name() == "sqlite":
+        engine = create_engine(url)
+        _attach_snp_schema(engine, url)
+        _count_round_trips(engine)
+        return engine
+
+    kwargs = {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_pre_ping": True,  # survive RDS idle disconnects
+        "pool_recycle": 1800,
+    }
+    if url.get_backend_name() == "postgresql":
+        kwargs["connect_args"] = {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"}
+        if url.get_driver_name() in ("psycopg2", ""):
+            kwargs["executemany_mode"] = "values_plus_batch"
+    engine = create_engine(url, **kwargs)
+    _count_round_trips(engine)
+    return engine
+
+
+def get_engine():
+    """Engine created on first use and reused for the whole process."""
+    global _engine
+    if _engine is None:
+        _engine = build_engine()
+    return _engine
+
+
+def reset_engine(url=None):
+    """Dispose the shared engine, optionally re-pointing it at another database."""
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+    _engine = build_engine(url) if url else None
+    return _engine
+
+
+@contextmanager
+def bulk_session():
+    """
+    Connection with an open transaction for bulk loads, committed on exit
+    and rolled back on error.
+    """
+    with get_engine().connect() as conn:
+        trans = conn.begin()
+        try:
+            yield conn
+        except BaseException:
+            trans.rollback()
+            raise
+        with get_metrics().timer("commit_seconds"):
+            trans.commit()
@@ -0,0 +1,205 @@
+# intraday mode: hourly and 1-minute bars fetched from each ticker's last stored bar and
+# streamed into snp.stocks_intraday as bounded micro-batches, one COPY and merge per batch
+import logging
+import os
+import threading
+
+import pandas as pd
+from sqlalchemy import text
+
+from etl.buffer import ColumnBuffer
+from etl.db import bulk_session
+from etl.loader import Target
+from etl.metrics import get_metrics
+from etl.prices import CHUNK_SIZE, chunked, default_provider, FIELD_COLUMNS, PRICE_COLUMNS
+from etl.synthetic import utc
+from etl.throttle import ConcurrentFetcher
+from etl.trading_calendar import BAR_FREQ, EXCHANGE_TZ, populate_times, session_bars
+from etl.validation import validated_upsert, Validator
+
+INTRADAY = Target(
+    "snp.stocks_intraday",
+    ["bar_interval", "comp_ticker", "bar_ts", "time_id", "currency_iso",
+     "open_price", "high_price", "low_price", "close_price", "volume"],
+    key=["bar_interval", "comp_ticker", "bar_ts"],
+    required=["open_price", "high_price", "low_price", "close_price"],
+    references={"comp_ticker": "snp.companies", "time_id": "snp.times"},
+)
+
+# a bar start repeats once per ticker of a request, a day once per bar of the session
+INTRADAY_DTYPES = {
+    "bar_interval": "category",
+    "comp_ticker": "category",
+    "bar_ts": "category",
+    "time_id": "category",
+    "currency_iso": "category",
+    "open_price": "float64",
+    "high_price": "float64",
+    "low_price": "float64",
+    "close_price": "float64",
+    "volume": "int64",
+}
+
+BATCH_ROWS = int(os.getenv("etl_intraday_batch_rows", "50000"))  # rows per micro-batch transaction
+LOOKBACK_DAYS = int(os.getenv("etl_intraday_lookback_days", "7"))  # history of tickers without bars
+MAX_SPAN_DAYS = {"1m": 7, "1h": 60}  # longest range per request, yfinance serves 1m bars a week at a time
+STAGE = "intraday"  # metrics and buffer label
+
+query_bar_watermarks = """
+    SELECT comp_ticker, MAX(bar_ts) AS loaded_to
+    FROM snp.stocks_intraday
+    WHERE bar_interval = :interval
+    GROUP BY comp_ticker
+"""
+
+
+def load_bar_watermarks(conn, interval):
+    """{ticker: start of its last stored bar (UTC)} at interval."""
+    return {
+        ticker.strip(): utc(loaded_to)
+        for ticker, loaded_to in conn.execute(text(query_bar_watermarks), {"interval": interval})
+    }
+
+
+def current_bar(interval):
+    """Start (UTC) of the bar in progress, the default exclusive end of a load."""
+    return pd.Timestamp.now(tz="UTC").floor(BAR_FREQ[interval])
+
+
+def _has_bars(start, end, interval):
+    bars = session_bars(start.date(), end.date() + pd.Timedelta(days=1), interval)
+    return bool(((bars >= start) & (bars < end)).any())
+
+
+def plan_bar_units(tickers, watermarks, end, interval, since=None, chunk_size=CHUNK_SIZE):
+    """
+    [(start, end, (tickers, ...))] requests covering each ticker from its last
+    stored bar, fetched again as it may have been partial, up to `end`
+    (exclusive, UTC). Tickers without bars start LOOKBACK_DAYS before end;
+    `since` overrides the watermarks. Ranges are split into MAX_SPAN_DAYS
+    requests and those without a session bar are left out.
+    """
+    end = utc(end)
+    lookback = end - pd.Timedelta(days=LOOKBACK_DAYS)
+    groups = {}
+    for ticker in tickers:
+        start = utc(since) if since is not None else watermarks.get(ticker, lookback)
+        groups.setdefault(start, []).append(ticker)
+    span = pd.Timedelta(days=MAX_SPAN_DAYS[interval])
+    units = []
+    for start, group in sorted(groups.items()):
+        lower = start
+        while lower < end:
+            upper = min(lower + span, end)
+            if _has_bars(lower, upper, interval):
+                units.extend((lower, upper, tuple(chunk)) for chunk in chunked(group, chunk_size))
+            lower = upper
+    return units
+
+
+def wide_to_bars(wide, interval, currency_iso="USD"):
+    """Split a wide intraday download into rows of the snp.stocks_intraday shape."""
+    if wide.empty:
+        return pd.DataFrame(columns=INTRADAY.columns)
+    stamps = pd.DatetimeIndex(wide.index)
+    if stamps.tz is None:
+        stamps = stamps.tz_localize("UTC")
+    # format each bar start once, not once per ticker
+    bar_ts = stamps.tz_convert("UTC").strftime("%Y-%m-%d %H:%M:%S")
+    days = dict(zip(bar_ts, stamps.tz_convert(EXCHANGE_TZ).strftime("%Y-%m-%d")))
+    # all-NaN rows are dropped explicitly, pandas 3 keeps them when stacking
+    long = wide.set_axis(bar_ts, axis=0).stack(level=0).dropna(how="all")
+    long.index.names = ["bar_ts", "comp_ticker"]
+    long = long.rename(columns=FIELD_COLUMNS).reset_index()
+    # tickers without a bar at a time come back as NaN rows
+    long = long.dropna(subset=["close_price"])
+    long["bar_interval"] = interval
+    long["time_id"] = long["bar_ts"].map(days)
+    long["currency_iso"] = currency_iso
+    long[PRICE_COLUMNS] = long[PRICE_COLUMNS].round(4)
+    long["volume"] = long["volume"].fillna(0).astype("int64")
+    return long[INTRADAY.columns]
+
+
+def load_intraday(tickers, interval="1m", end=None, since=None, provider=None, fetcher=None,
+                  chunk_size=CHUNK_SIZE, batch_rows=BATCH_ROWS):
+    """
+    Fetch bars of tickers at `interval` up to `end` (exclusive, default: the
+    start of the current bar) and stream them into snp.stocks_intraday:
+    downloads are turned into rows as they complete and buffered by column;
+    every `batch_rows` rows the buffer is merged in its own transaction,
+    so memory holds one micro-batch plus the requests in flight however
+    many bars are fetched. A failed batch stops the run, the batches before
+    it stay committed and the next run starts from their watermarks.
+    Returns {"requests", "failed", "bars", "batches", "rejected", "peak_buffer_bytes"}.
+    """
+    if interval not in BAR_FREQ:
+        raise ValueError(f"unknown bar interval {interval!r}, expected one of {', '.join(BAR_FREQ)}")
+    end = utc(end) if end is not None else current_bar(interval)
+    with bulk_session() as conn:
+        watermarks = load_bar_watermarks(conn, interval)
+    units = plan_bar_units(tickers, watermarks, end, interval, since, chunk_size)
+    stats = {"requests": len(units), "failed": 0, "bars": 0, "batches": 0, "rejected": 0, "peak_buffer_bytes": 0}
+    if not units:
+        return stats
+
+    # exchange days the bars fall on, and the reference keys once for all batches
+    with bulk_session() as conn:
+        populate_times(conn, min(unit[0] for unit in units).date(), end.date() + pd.Timedelta(days=1))
+        validator = Validator.load(conn)
+
+    provider = provider or default_provider()
+    fetcher = fetcher or ConcurrentFetcher(stage=STAGE)
+    metrics = get_metrics()
+    # downloads completed but not buffered yet: fetching waits while a batch is merged
+    slots = threading.Semaphore(2 * fetcher.max_in_flight)
+    stopped = threading.Event()
+
+    def download(unit):
+        slots.acquire()
+        if stopped.is_set():
+            slots.release()  # pass the slot on to the next waiting worker
+            raise RuntimeError("intraday load stopped")
+        try:
+            return provider.download(list(unit[2]), unit[0], unit[1], interval=interval)
+        except BaseException:
+            slots.release()
+            raise
+
+    def load(frame):
+        with metrics.timer("load_seconds", stage=STAGE):
+            with bulk_session() as conn:
+                rows, rejected = validated_upsert(conn, INTRADAY, frame, validator)
+        metrics.count("bars_loaded", rows, stage=STAGE)
+        stats["bars"] += rows
+        stats["rejected"] += len(rejected)
+        stats["batches"] += 1
+
+    buffer = ColumnBuffer(sink=load, dtypes=INTRADAY_DTYPES, max_rows=batch_rows, stage=STAGE)
+    results = fetcher.map(download, units)
+    try:
+        for unit, wide, error in results:
+            if error is not None:
+                logging.error(f"Error fetching {interval} bars of {unit[2][0]}..{unit[2][-1]} from {unit[0]}: {error}")
+                stats["failed"] += 1
+                continue
+            try:
+                with metrics.timer("transform_seconds", stage=STAGE):
+                    frame = wide_to_bars(wide, interval)
+                # a request can hold more bars than a batch: append it in slices
+                for lower in range(0, len(frame), batch_rows):
+                    buffer.append(frame.iloc[lower:lower + batch_rows])
+            finally:
+                slots.release()
+        buffer.close()
+    except BaseException:
+        # a failed batch stops the run: workers waiting for a slot give up, queued requests are dropped
+        stopped.set()
+        for _ in range(fetcher.max_in_flight):
+            slots.release()
+        raise
+    finally:
+        results.close()  # cancels the requests not started and waits for those in flight
+    stats["peak_buffer_bytes"] = buffer.peak_bytes
+    metrics.count("requests_failed", stats["failed"], stage=STAGE)
+    return stats
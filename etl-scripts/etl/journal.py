@@ -0,0 +1,72 @@
+# durable run journal: one JSON Lines file per run date with the outcome of every unit
+import json
+import os
+import threading
+from datetime import datetime
+
+from etl.config import LOG_DIR
+
+JOURNAL_DIR = os.path.join(LOG_DIR, "journal")
+
+FETCHED = "fetched"
+LOADED = "loaded"
+FAILED = "failed"
+PENDING = "pending"
+
+
+class RunJournal:
+    """
+    Append-only log of (stage, unit, status) events, e.g. ("stocks", "AAPL",
+    "loaded"). The last event of a unit is its state, so a resumed run can
+    redo only units that are not loaded yet.
+    """
+
+    def __init__(self, run_date, root=JOURNAL_DIR):
+        os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, f"{run_date}.jsonl")
+        self.lock = threading.Lock()  # stages of one run may write concurrently
+
+    def record_many(self, stage, units, status, reason=None):
+        units = list(units)
+        if not units:
+            return
+        ts = datetime.now().isoformat(timespec="seconds")
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            for unit in units:
+                event = {"ts": ts, "stage": stage, "unit": unit, "status": status}
+                if reason:
+                    event["reason"] = str(reason)
+                f.write(json.dumps(event) + "\n")
+            f.flush()
+            os.fsync(f.fileno())  # survive the process dying right after
+
+    def record(self, stage, unit, status, reason=None):
+        self.record_many(stage, [unit], status, reason)
+
+    def events(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def state(self, stage):
+        """{unit: last status} for one stage."""
+        return {e["unit"]: e["status"] for e in self.events() if e["stage"] == stage}
+
+    def pending(self, stage, units):
+        """Units of a stage that are not loaded yet, in the given order."""
+        state = self.state(stage)
+        return [unit for unit in units if state.get(unit) != LOADED]
+
+    def summary(self):
+        """{stage: {status: count}} over the latest state of every unit."""
+        latest = {}
+        for e in self.events():
+            latest[(e["stage"], e["unit"])] = e["status"]
+        counts = {}
+        for (stage, _), status in latest.items():
+            counts.setdefault(stage, {}).setdefault(status, 0)
+            counts[stage][status] += 1
+        return counts
@@ -0,0 +1,199 @@
+# bulk upsert of records through a temporary staging table
+import csv
+import io
+import time
+from collections import Counter
+
+import pandas as pd
+from sqlalchemy import text
+
+from etl.metrics import get_metrics
+
+
+class Target:
+    """
+    Warehouse table loaded by bulk_upsert().
+    required   - columns that must not be NULL (NOT NULL in the DDL)
+    references - column -> referenced table, checked before the merge
+    """
+
+    def __init__(self, table, columns, key, required=(), references=None):
+        self.table = table
+        self.columns = list(columns)
+        self.key = list(key)
+        self.required = list(required)
+        self.references = references or {}
+
+    @property
+    def stage(self):
+        return "stage_" + self.table.split(".")[-1]
+
+
+STOCKS = Target(
+    "snp.stocks",
+    ["time_id", "comp_ticker", "currency_iso", "open_price", "high_price",
+     "low_price", "close_price", "volume"],
+    key=["time_id", "comp_ticker"],
+    required=["open_price", "high_price", "low_price", "close_price"],
+    references={"comp_ticker": "snp.companies", "time_id": "snp.times"},
+)
+
+CURRENCIES = Target(
+    "snp.currencies",
+    ["currency_iso", "exchange_rate", "time_id"],
+    key=["currency_iso", "time_id"],
+    required=["exchange_rate"],
+    references={"time_id": "snp.times"},
+)
+
+COMPANIES = Target(
+    "snp.companies",
+    ["comp_ticker", "comp_name", "sector", "industry", "exchange_code",
+     "comp_city", "comp_state", "comp_employees", "website", "country"],
+    key=["comp_ticker"],
+    required=["comp_name", "sector", "industry"],
+)
+
+
+def _checks(target):
+    """(sql condition a valid staged row must meet, reject reason) pairs."""
+    checks = [(f"s.{col} IS NOT NULL", f"missing {col}") for col in target.required]
+    for col, ref_table in target.references.items():
+        checks.append((
+            f"EXISTS (SELECT 1 FROM {ref_table} r WHERE r.{col} = s.{col})",
+            f"missing {ref_table} reference"
+        ))
+    return checks
+
+
+def merge_sql(target, checked=False):
+    cols = ", ".join(target.columns)
+    staged = ", ".join(f"s.{c}" for c in target.columns)
+    where = "TRUE" if checked else " AND ".join(cond for cond, _ in _checks(target)) or "TRUE"
+    updates = ",\n        ".join(
+        f"{c} = EXCLUDED.{c}" for c in target.columns if c not in target.key
+    )
+    return f"""
+    INSERT INTO {target.table} ({cols})
+    SELECT {staged}
+    FROM {target.stage} s
+    WHERE {where}
+    ON CONFLICT ({", ".join(target.key)}) DO UPDATE
+    SET
+        {updates}
+"""
+
+
+def rejects_sql(target):
+    checks = _checks(target)
+    if not checks:
+        return None
+    keys = ", ".join(f"s.{k}" for k in target.key)
+    reason = " ".join(f"WHEN NOT {cond} THEN '{why}'" for cond, why in checks)
+    where = " OR ".join(f"NOT {cond}" for cond, _ in checks)
+    return f"""
+    SELECT {keys}, CASE {reason} END AS reason
+    FROM {target.stage} s
+    WHERE {where}
+"""
+
+
+def _dedupe(target, records):
+    # ON CONFLICT cannot touch the same row twice in one statement, last one wins
+    if isinstance(records, pd.DataFrame):
+        return records.drop_duplicates(target.key, keep="last")[target.columns]
+    rows = {}
+    for record in records:
+        rows[tuple(record[k] for k in target.key)] = record
+    return list(rows.values())
+
+
+def _copy_rows(conn, target, rows, table=None):
+    """Stream rows into the staging table, COPY on psycopg2, executemany elsewhere."""
+    table = table or target.stage
+    frame = isinstance(rows, pd.DataFrame)
+    if conn.dialect.driver == "psycopg2":
+        buf = io.StringIO()
+        if frame:
+            rows.to_csv(buf, header=False, index=False)
+        else:
+            writer = csv.writer(buf)
+            for row in rows:
+                writer.writerow(["" if row.get(c) is None else row[c] for c in target.columns])
+        buf.seek(0)
+        cursor = conn.connection.cursor()
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(target.columns)}) FROM STDIN WITH (FORMAT csv)",
+            buf
+        )
+        cursor.close()
+        get_metrics().count("db_round_trips")
+    else:
+        if frame:
+            rows = rows.astype(object).where(rows.notna(), None).to_dict(orient="records")
+        cols = ", ".join(target.columns)
+        params = ", ".join(f":{c}" for c in target.columns)
+        conn.execute(
+            text(f"INSERT INTO {table} ({cols}) VALUES ({params})"),
+            [{c: row.get(c) for c in target.columns} for row in rows]
+        )
+
+
+def stage_rows(conn, target, rows):
+    """(Re)create the temporary staging table of target and copy rows into it."""
+    cols = ", ".join(target.columns)
+    conn.execute(text(f"DROP TABLE IF EXISTS {target.stage}"))
+    conn.execute(text(
+        f"CREATE TEMPORARY TABLE {target.stage} AS "
+        f"SELECT {cols} FROM {target.table} WHERE 1 = 0"
+    ))
+    _copy_rows(conn, target, rows)
+
+
+def bulk_insert(conn, target, records):
+    """Append records straight into target, for tables without a merge key."""
+    rows = _dedupe(target, records) if target.key else records
+    if not len(rows):
+        return 0
+    if isinstance(rows, pd.DataFrame):
+        rows = rows[target.columns]
+    _copy_rows(conn, target, rows, table=target.table)
+    return len(rows)
+
+
+def bulk_upsert(conn, target, records, checked=False):
+    """
+    Upsert records (dicts or a DataFrame) into target with one staged,
+    set-based merge. Must run inside a transaction (e.g. `with db.begin() as conn`).
+    checked=True skips the NOT NULL and reference checks for records already
+    validated in memory (see etl.validation).
+    Returns (number of rows merged, [(key dict, reason), ...] of rejected rows).
+    """
+    rows = _dedupe(target, records)
+    if not len(rows):
+        return 0, []
+    metrics = get_metrics()
+    stage = target.table.split(".")[-1]
+    start = time.perf_counter()
+    stage_rows(conn, target, rows)
+
+    rejected = []
+    query_rejects = None if checked else rejects_sql(target)
+    if query_rejects:
+        for row in conn.execute(text(query_rejects)).mappings():
+            key = {k: row[k].strip() if isinstance(row[k], str) else row[k] for k in target.key}
+            rejected.append((key, row["reason"]))
+
+    conn.execute(text(merge_sql(target, checked)))
+    conn.execute(text(f"DROP TABLE {target.stage}"))
+
+    metrics.observe("upsert_seconds", time.perf_counter() - start, stage=stage)
+    metrics.count("rows_upserted", len(rows) - len(rejected), stage=stage)
+    metrics.count("rows_rejected", len(rejected), stage=stage)
+    if "comp_ticker" in target.key and target is not COMPANIES:
+        tickers = rows["comp_ticker"] if isinstance(rows, pd.DataFrame) else (row["comp_ticker"] for row in rows)
+        for ticker, n in Counter(tickers).items():
+            metrics.count_ticker(ticker, "rows_staged", n)
+        for key, _ in rejected:
+            metrics.count_ticker(key["comp_ticker"], "rows_rejected")
+    return len(rows) - len(rejected), rejected
@@ -0,0 +1,156 @@
+# run metrics: counters, timers and latency histograms per stage and ticker
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from etl.config import LOG_DIR
+
+METRICS_DIR = os.path.join(LOG_DIR, "metrics")
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf")]
+
+_metrics = None
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def as_dict(self):
+        cumulative, total = {}, 0
+        for bound, n in zip(self.buckets, self.counts):
+            total += n
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = total
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "max": round(self.max, 4),
+            "buckets": cumulative,
+        }
+
+
+class Metrics:
+    """
+    Thread-safe registry. Counters and histograms carry labels such as
+    stage="stocks"; per-ticker row counts are kept apart so the summary
+    stays readable.
+    """
+
+    def __init__(self):
+        self.started = datetime.now()
+        self.counters = {}
+        self.histograms = {}
+        self.tickers = {}
+        self.lock = threading.Lock()
+
+    def count(self, name, n=1, **labels):
+        with self.lock:
+            key = _key(name, labels)
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            key = _key(name, labels)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def count_ticker(self, ticker, name, n=1):
+        with self.lock:
+            stats = self.tickers.setdefault(ticker, {})
+            stats[name] = stats.get(name, 0) + n
+
+    def summary(self):
+        def label(key):
+            name, labels = key
+            if not labels:
+                return name
+            return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+        with self.lock:
+            return {
+                "started": self.started.isoformat(timespec="seconds"),
+                "wall_s": round((datetime.now() - self.started).total_seconds(), 3),
+                "counters": {label(k): v for k, v in sorted(self.counters.items())},
+                "histograms": {label(k): h.as_dict() for k, h in sorted(self.histograms.items())},
+                "tickers": dict(sorted(self.tickers.items())),
+            }
+
+    def write_json(self, path=None):
+        path = path or os.path.join(METRICS_DIR, f"{self.started:%Y-%m-%d_%H%M%S}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+    def write_prometheus(self, path):
+        """Node exporter textfile format, ticker level data is left out."""
+        def labels(pairs, extra=()):
+            pairs = list(pairs) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self.lock:
+            for (name, pairs), value in sorted(self.counters.items()):
+                lines.append(f"etl_{name}_total{labels(pairs)} {value}")
+            for (name, pairs), h in sorted(self.histograms.items()):
+                total = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    total += n
+                    le = "+Inf" if bound == float("inf") else bound
+                    lines.append(f"etl_{name}_bucket{labels(pairs, [('le', le)])} {total}")
+                lines.append(f"etl_{name}_sum{labels(pairs)} {h.sum}")
+                lines.append(f"etl_{name}_count{labels(pairs)} {h.count}")
+        lines.append(f"etl_last_run_timestamp_seconds {time.time():.0f}")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)  # the exporter must never read a half written file
+
+
+def get_metrics():
+    """Process-wide registry."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+def write_run_summary():
+    """Write the JSON summary and, if etl_prometheus_textfile is set, the textfile."""
+    metrics = get_metrics()
+    path = metrics.write_json()
+    textfile = os.getenv("etl_prometheus_textfile")
+    if textfile:
+        metrics.write_prometheus(textfile)
+    return path
@@ -0,0 +1,195 @@
+# range partitions of snp.stocks by time_id: in-place migration and partitions created ahead of loads
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+from etl.watermarks import _to_date
+
+GRAIN = os.getenv("etl_stocks_partition", "year")  # "year" or "month"
+AHEAD = 1  # partitions created past the end of each load
+
+STOCKS_DDL = """
+    CREATE TABLE snp.stocks (
+        time_id DATE,
+        comp_ticker CHAR(5) NOT NULL,
+        currency_iso CHAR(3) DEFAULT 'USD',
+        open_price DECIMAL(10,4) NOT NULL CHECK (open_price >= 0),
+        high_price DECIMAL(10,4) NOT NULL CHECK (high_price >= 0),
+        low_price DECIMAL(10,4) NOT NULL CHECK (low_price >= 0),
+        close_price DECIMAL(10,4) NOT NULL CHECK (close_price >= 0),
+        volume BIGINT CHECK (volume >= 0),
+
+        CONSTRAINT pk_stocks PRIMARY KEY (time_id, comp_ticker),
+
+        CONSTRAINT fk_stocks_companies FOREIGN KEY (comp_ticker)
+            REFERENCES snp.companies(comp_ticker)
+            ON UPDATE CASCADE
+            ON DELETE RESTRICT,
+
+        CONSTRAINT fk_stocks_times FOREIGN KEY (time_id)
+            REFERENCES snp.times(time_id)
+            ON UPDATE NO ACTION
+            ON DELETE NO ACTION
+    ) PARTITION BY RANGE (time_id)
+"""
+
+# the primary key already covers (time_id, comp_ticker), time ranges get a BRIN,
+# per-ticker reads (read_prices, watermarks, actions) a ticker-leading B-tree
+STOCKS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_stocks_time_brin ON snp.stocks USING brin (time_id)",
+    "CREATE INDEX IF NOT EXISTS idx_stocks_ticker_time ON snp.stocks (comp_ticker, time_id)",
+]
+
+query_is_partitioned = """
+    SELECT c.relkind = 'p'
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'snp' AND c.relname = 'stocks'
+"""
+
+query_partitions = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    JOIN pg_namespace n ON n.oid = p.relnamespace
+    WHERE n.nspname = 'snp' AND p.relname = 'stocks'
+"""
+
+query_periods = """
+    SELECT DISTINCT CAST(date_trunc('{grain}', time_id) AS DATE)
+    FROM snp.stocks_unpartitioned
+    ORDER BY 1
+"""
+
+
+def partition_start(day, grain=GRAIN):
+    day = _to_date(day)
+    return date(day.year, 1, 1) if grain == "year" else date(day.year, day.month, 1)
+
+
+def next_start(start, grain=GRAIN):
+    if grain == "year":
+        return date(start.year + 1, 1, 1)
+    return date(start.year + (start.month == 12), start.month % 12 + 1, 1)
+
+
+def partition_name(start, grain=GRAIN):
+    return f"stocks_y{start:%Y}" if grain == "year" else f"stocks_m{start:%Y_%m}"
+
+
+def partition_bounds(start, end, grain=GRAIN):
+    """[(name, from, to)] of the partitions covering days in [start, end)."""
+    bounds = []
+    lower, end = partition_start(start, grain), _to_date(end)
+    while lower < end:
+        upper = next_start(lower, grain)
+        bounds.append((partition_name(lower, grain), lower, upper))
+        lower = upper
+    return bounds
+
+
+def is_partitioned(conn):
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(text(query_is_partitioned)).scalar())
+
+
+def existing_partitions(conn):
+    """{name: (from, to)} of the partitions attached to snp.stocks."""
+    partitions = {}
+    for name, bound in conn.execute(text(query_partitions)):
+        days = re.findall(r"'(\d{4}-\d{2}-\d{2})'", bound or "")
+        if len(days) == 2:
+            partitions[name] = (_to_date(days[0]), _to_date(days[1]))
+    return partitions
+
+
+def missing_partitions(start, end, existing, grain=GRAIN, ahead=AHEAD):
+    """
+    [(name, from, to)] of the partitions to create for days from start up to
+    the partition holding `end` and `ahead` more after it, leaving out the
+    ones overlapping an existing {name: (from, to)} partition.
+    """
+    end = partition_start(end, grain)
+    for _ in range(ahead + 1):
+        end = next_start(end, grain)
+    # a partition of another grain may already hold part of the range
+    existing = existing.values()
+    return [
+        (name, lower, upper)
+        for name, lower, upper in partition_bounds(start, end, grain)
+        if not any(lower < to and upper > since for since, to in existing)
+    ]
+
+
+def ensure_partitions(conn, start, end, grain=GRAIN, ahead=AHEAD):
+    """
+    Create the missing partitions (see missing_partitions), so a load never
+    hits a day without a partition. No-op while snp.stocks is a plain table.
+    Returns names of the created partitions.
+    """
+    if not is_partitioned(conn):
+        return []
+    created = []
+    for name, lower, upper in missing_partitions(start, end, existing_partitions(conn), grain, ahead):
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS snp.{name} PARTITION OF snp.stocks "
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        ))
+        created.append(name)
+    return created
+
+
+def drop_empty_partitions(conn, start, end):
+    """Drop the empty partitions starting within [start, end), e.g. after clearing synthetic rows."""
+    if not is_partitioned(conn):
+        return []
+    start, end = _to_date(start), _to_date(end)
+    dropped = []
+    for name, (lower, _) in sorted(existing_partitions(conn).items()):
+        if not start <= lower < end:
+            continue
+        if conn.execute(text(f"SELECT NOT EXISTS (SELECT 1 FROM snp.{name})")).scalar():
+            conn.execute(text(f"DROP TABLE snp.{name}"))
+            dropped.append(name)
+    return dropped
+
+
+def migrate_stocks(conn, grain=GRAIN, keep_old=False):
+    """
+    Convert snp.stocks into range partitions on time_id inside the caller's
+    transaction: the heap is renamed, the partitioned table created with the
+    same columns and constraints, rows copied over in one INSERT ... SELECT,
+    the duplicate idx_stocks_times_companies dropped with the old table and
+    the BRIN and ticker-leading indexes built once after the copy.
+    Returns (partitions created, rows copied).
+    """
+    if conn.dialect.name != "postgresql":
+        raise RuntimeError("partitioning needs PostgreSQL")
+    if is_partitioned(conn):
+        return [], 0
+    conn.execute(text("ALTER TABLE snp.stocks RENAME TO stocks_unpartitioned"))
+    conn.execute(text("ALTER TABLE snp.stocks_unpartitioned RENAME CONSTRAINT pk_stocks TO pk_stocks_unpartitioned"))
+    conn.execute(text("DROP INDEX IF EXISTS snp.idx_stocks_times_companies"))
+    conn.execute(text("DROP INDEX IF EXISTS snp.idx_stocks_time_brin"))
+    conn.execute(text("DROP INDEX IF EXISTS snp.idx_stocks_ticker_time"))
+    conn.execute(text(STOCKS_DDL))
+
+    # only periods holding rows get a partition, gaps in the history stay without one
+    created = []
+    for day in conn.execute(text(query_periods.format(grain=grain))).scalars():
+        created += ensure_partitions(conn, day, day, grain, ahead=0)
+    created += ensure_partitions(conn, date.today(), date.today(), grain)
+    # backfills arrive ticker by ticker: copying in time order is what makes the BRIN selective
+    rows = conn.execute(text(
+        "INSERT INTO snp.stocks SELECT * FROM snp.stocks_unpartitioned ORDER BY time_id, comp_ticker"
+    )).rowcount
+    for ddl in STOCKS_INDEXES:
+        conn.execute(text(ddl))
+    if not keep_old:
+        conn.execute(text("DROP TABLE snp.stocks_unpartitioned"))
+    conn.execute(text("ANALYZE snp.stocks"))
+    return created, rows
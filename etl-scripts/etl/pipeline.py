@@ -0,0 +1,185 @@
+# stage DAG runner: independent stages run concurrently, each with its own retries and timeout
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from etl.metrics import get_metrics
+
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Stage:
+    """
+    A unit of the pipeline. fn(ctx, cancel) does the work; cancel is a
+    threading.Event set when the attempt times out, stages check it between
+    batches and before committing because Python threads cannot be killed.
+    A retry only starts once the timed out attempt has returned, so two
+    attempts of a stage never write at the same time; one still running
+    `cancel_grace` seconds after its timeout fails the stage without retry.
+    """
+
+    def __init__(self, name, fn, deps=(), retries=0, timeout=None, retry_delay=5, cancel_grace=60):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.retries = retries
+        self.timeout = timeout  # seconds per attempt, None waits forever
+        self.retry_delay = retry_delay
+        self.cancel_grace = cancel_grace
+
+
+class StageResult:
+    def __init__(self, status, attempts=0, seconds=0.0, error=None, value=None):
+        self.status = status
+        self.attempts = attempts
+        self.seconds = seconds
+        self.error = error
+        self.value = value
+
+    def as_dict(self):
+        return {
+            "status": self.status,
+            "attempts": self.attempts,
+            "seconds": round(self.seconds, 3),
+            "error": None if self.error is None else str(self.error),
+        }
+
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            unknown = [d for d in stage.deps if d not in self.stages]
+            if unknown:
+                raise ValueError(f"stage {stage.name} depends on unknown stages {unknown}")
+
+    def select(self, names=None):
+        """Selected stages; dependencies outside the selection are treated as done."""
+        if names is None:
+            return list(self.stages.values())
+        unknown = [n for n in names if n not in self.stages]
+        if unknown:
+            raise ValueError(f"unknown stages {unknown}, choose from {list(self.stages)}")
+        return [stage for name, stage in self.stages.items() if name in names]
+
+    def waves(self, names=None):
+        """Selected stages grouped by dependency depth, the order they can start in."""
+        selected = {stage.name: stage for stage in self.select(names)}
+        depth = {}
+
+        def visit(name, path=()):
+            if name in path:
+                raise ValueError(f"dependency cycle through {name}")
+            if name not in depth:
+                deps = [d for d in selected[name].deps if d in selected]
+                depth[name] = 1 + max((visit(d, path + (name,)) for d in deps), default=-1)
+            return depth[name]
+
+        for name in selected:
+            visit(name)
+        waves = {}
+        for name in selected:
+            waves.setdefault(depth[name], []).append(name)
+        return [waves[d] for d in sorted(waves)]
+
+    def _attempt(self, stage, ctx, cancel, delay=0):
+        if delay:
+            time.sleep(delay)  # in the worker, so the scheduler keeps watching other stages
+        metrics = get_metrics()
+        with metrics.timer("stage_seconds", stage=stage.name):
+            return stage.fn(ctx, cancel)
+
+    def run(self, ctx, names=None, max_workers=None):
+        """
+        Run the selected stages, each as soon as its dependencies succeeded.
+        A stage whose dependency failed is skipped. Returns {name: StageResult}.
+        """
+        selected = {stage.name: stage for stage in self.select(names)}
+        self.waves(names)  # fail early on cycles
+        metrics = get_metrics()
+        results = {}
+        running = {}  # future -> (stage, attempt, first started, deadline, cancel)
+        abandoned = {}  # timed out future -> (stage, attempt, first started, grace deadline, error)
+        waiting = dict(selected)
+
+        def deps_of(stage):
+            return [d for d in stage.deps if d in selected]
+
+        def submit(pool, stage, attempt, started=None, delay=0):
+            cancel = threading.Event()
+            future = pool.submit(self._attempt, stage, ctx, cancel, delay)
+            now = time.monotonic()
+            deadline = now + delay + stage.timeout if stage.timeout else None
+            running[future] = (stage, attempt, started or now, deadline, cancel)
+
+        def finish(stage, attempt, started, error=None, value=None):
+            status = FAILED if error is not None else SUCCEEDED
+            results[stage.name] = StageResult(status, attempt, time.monotonic() - started, error, value)
+            metrics.count("stage_runs", stage=stage.name, status=status)
+            print(f"stage {stage.name} {status} in {results[stage.name].seconds:.1f}s")
+
+        def retry_or_finish(stage, attempt, started, error):
+            logging.error(f"Stage {stage.name} attempt {attempt} failed: {error}")
+            if attempt <= stage.retries:
+                metrics.count("stage_retries", stage=stage.name)
+                print(f"stage {stage.name} failed ({error}), retry {attempt}/{stage.retries}")
+                submit(pool, stage, attempt + 1, started, stage.retry_delay)
+            else:
+                finish(stage, attempt, started, error)
+
+        # room for retries next to attempts that timed out but still hold a thread
+        workers = max_workers or sum(1 + stage.retries for stage in selected.values()) or 1
+        pool = ThreadPoolExecutor(max_workers=workers,
+                                  thread_name_prefix="stage")
+        try:
+            while waiting or running or abandoned:
+                for name, stage in list(waiting.items()):
+                    deps = deps_of(stage)
+                    if any(results.get(d) and results[d].status != SUCCEEDED for d in deps):
+                        del waiting[name]
+                        results[name] = StageResult(SKIPPED, error=f"dependency failed: {deps}")
+                        metrics.count("stage_runs", stage=name, status=SKIPPED)
+                    elif all(d in results for d in deps):
+                        del waiting[name]
+                        submit(pool, stage, 1)
+                if not running and not abandoned:
+                    continue
+                deadlines = [d for _, _, _, d, _ in running.values() if d is not None]
+                deadlines += [d for _, _, _, d, _ in abandoned.values()]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(list(running) + list(abandoned), timeout=timeout, return_when=FIRST_COMPLETED)
+                now = time.monotonic()
+                for future, (stage, attempt, started, grace, error) in list(abandoned.items()):
+                    if future in done:
+                        # the timed out attempt returned: done after all, or stopped and retried now
+                        del abandoned[future]
+                        if future.exception() is None:
+                            finish(stage, attempt, started, value=future.result())
+                        else:
+                            retry_or_finish(stage, attempt, started, error)
+                    elif now >= grace:
+                        # still running: a retry would write next to it, give up on the stage
+                        del abandoned[future]
+                        finish(stage, attempt, started, TimeoutError(
+                            f"{error}, the attempt did not stop within {stage.cancel_grace}s"))
+                for future, (stage, attempt, started, deadline, cancel) in list(running.items()):
+                    if future in done:
+                        del running[future]
+                        error = future.exception()
+                        if error is None:
+                            finish(stage, attempt, started, value=future.result())
+                        else:
+                            retry_or_finish(stage, attempt, started, error)
+                    elif deadline is not None and now >= deadline:
+                        # the attempt keeps its thread until it notices the cancel event
+                        del running[future]
+                        cancel.set()
+                        error = TimeoutError(f"stage {stage.name} timed out after {stage.timeout}s")
+                        abandoned[future] = (stage, attempt, started, now + stage.cancel_grace, error)
+        finally:
+            # do not wait for attempts that ignored the cancel event past their grace
+            pool.shutdown(wait=False, cancel_futures=True)
+        return results
@@ -0,0 +1,275 @@
+# batched download of daily price bars
+import abc
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from etl.cache import get_cache
+from etl.metrics import get_metrics
+from etl.synthetic import synthetic_intraday, synthetic_wide, utc
+from etl.throttle import ConcurrentFetcher
+
+STOCK_COLUMNS = [
+    "time_id", "comp_ticker", "currency_iso",
+    "open_price", "high_price", "low_price", "close_price", "volume"
+]
+PRICE_COLUMNS = ["open_price", "high_price", "low_price", "close_price"]
+FIELD_COLUMNS = {
+    "Open": "open_price",
+    "High": "high_price",
+    "Low": "low_price",
+    "Close": "close_price",
+    "Volume": "volume",
+}
+CHUNK_SIZE = 100  # tickers per multi-symbol request
+ACTION_FIELDS = {"Dividends": "dividend", "Stock Splits": "split"}
+
+
+class PriceProvider(abc.ABC):
+    """
+    Source of daily bars. download() returns a wide DataFrame indexed by date
+    with (ticker, field) columns, the layout of yf.download(group_by="ticker").
+    actions=True adds the "Dividends" and "Stock Splits" fields.
+    """
+    name = "base"
+
+    def __init__(self):
+        self.calls = 0  # number of requests sent to the source
+
+    @abc.abstractmethod
+    def download(self, tickers, start, end, interval="1d", actions=False):
+        """Wide frame of the bars of tickers in [start, end)."""
+
+
+class YFinanceProvider(PriceProvider):
+    name = "yfinance"
+
+    def download(self, tickers, start, end, interval="1d", actions=False):
+        self.calls += 1
+        wide = yf.download(
+            tickers, start=start, end=end, interval=interval,
+            group_by="ticker", auto_adjust=True, actions=actions,
+            threads=True, progress=False
+        )
+        if not isinstance(wide.columns, pd.MultiIndex):
+            # single symbol requests come back with flat columns
+            wide.columns = pd.MultiIndex.from_product([tickers, wide.columns])
+        return wide
+
+
+class FixtureProvider(PriceProvider):
+    """
+    Offline provider serving bars from records in the snp.stocks shape
+    (a JSON list or a JSON Lines staging partition), so the fetch layer runs
+    without network. Records with a bar_ts (UTC bar start) instead of a
+    time_id are an intraday feed, served whatever interval is asked for.
+    `actions` are dicts with comp_ticker, action_date, action_type ("split"
+    or "dividend") and value; a JSON object file holds both as
+    {"bars": [...], "actions": [...]}.
+    """
+    name = "fixture"
+
+    def __init__(self, records=None, path=None, latency=0.0, actions=None):
+        super().__init__()
+        if path is not None:
+            with open(path, "r") as f:
+                if path.endswith(".jsonl"):
+                    records = [json.loads(line) for line in f if line.strip()]
+                else:
+                    records = json.load(f)
+            if isinstance(records, dict):
+                actions = actions or records.get("actions")
+                records = records.get("bars")
+        self.latency = latency  # seconds slept per request
+        frame = pd.DataFrame(records or [])
+        if "bar_ts" in frame.columns:
+            self.wide = records_to_wide(frame, on="bar_ts")
+        else:
+            self.wide = records_to_wide(frame.reindex(columns=STOCK_COLUMNS))
+        self.actions = actions or []
+
+    def _with_actions(self, wide):
+        wide = wide.copy()
+        for ticker in wide.columns.get_level_values(0).unique():
+            for field in ACTION_FIELDS:
+                wide[(ticker, field)] = 0.0
+        fields = {v: k for k, v in ACTION_FIELDS.items()}
+        for action in self.actions:
+            day = pd.Timestamp(action["action_date"])
+            key = (action["comp_ticker"], fields[action["action_type"]])
+            if key in wide.columns and day in wide.index:
+                wide.loc[day, key] = action["value"]
+        return wide.sort_index(axis=1)
+
+    def download(self, tickers, start, end, interval="1d", actions=False):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        wide = self._with_actions(self.wide) if actions else self.wide
+        # end date is exclusive, like yfinance
+        lower, upper = pd.Timestamp(start), pd.Timestamp(end)
+        if getattr(wide.index, "tz", None) is not None:
+            lower, upper = utc(lower), utc(upper)
+        mask = (wide.index >= lower) & (wide.index < upper)
+        present = [t for t in tickers if t in wide.columns.get_level_values(0)]
+        return wide.loc[mask, present]
+
+
+class SimulatedProvider(PriceProvider):
+    """
+    Fake provider generating random walk bars for business days (or for the
+    sessions of trading days at an intraday interval), with a simulated
+    request latency and error rate, for throughput measurements.
+    """
+    name = "simulated"
+
+    def __init__(self, latency=0.2, error_rate=0.0, seed=0):
+        super().__init__()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.lock = threading.Lock()
+
+    def download(self, tickers, start, end, interval="1d", actions=False):
+        with self.lock:
+            self.calls += 1
+            call = self.calls  # read under the lock, concurrent downloads draw their own stream
+        time.sleep(self.latency)
+        rng = np.random.default_rng([self.seed, call])
+        if rng.random() < self.error_rate:
+            raise ConnectionError("simulated provider error")
+        if interval != "1d":
+            return synthetic_intraday(tickers, start, end, interval, rng)
+        wide = synthetic_wide(tickers, start, end, rng)
+        if actions and not wide.empty:
+            for ticker in tickers:
+                for field in ACTION_FIELDS:
+                    wide[(ticker, field)] = 0.0
+            wide = wide.sort_index(axis=1)
+        return wide
+
+
+class CachedProvider(PriceProvider):
+    """
+    Serves per-ticker bars from the response cache and downloads only the
+    tickers that are missing, in one request, through the wrapped provider.
+    """
+
+    def __init__(self, provider, cache):
+        super().__init__()
+        self.provider = provider
+        self.cache = cache
+        self.name = provider.name
+
+    def download(self, tickers, start, end, interval="1d", actions=False):
+        if actions:
+            # actions are what a refresh is looking for, never serve them from the cache
+            self.calls += 1
+            return self.provider.download(tickers, start, end, interval=interval, actions=True)
+        endpoint = f"history:{interval}"
+        frames, missing = {}, []
+        for ticker in tickers:
+            frame = self.cache.get(self.name, ticker, endpoint, start, end)
+            if frame is None:
+                missing.append(ticker)
+            else:
+                frames[ticker] = frame
+        if missing:
+            self.calls += 1
+            wide = self.provider.download(missing, start, end, interval=interval)
+            for ticker in missing:
+                if ticker in wide.columns.get_level_values(0):
+                    frame = wide[ticker].dropna(how="all")
+                    if not frame.empty:
+                        self.cache.put(self.name, ticker, endpoint, frame, start, end)
+                        frames[ticker] = frame
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+
+def default_provider():
+    """yfinance, behind the response cache unless it is disabled."""
+    provider = YFinanceProvider()
+    cache = get_cache()
+    return CachedProvider(provider, cache) if cache is not None else provider
+
+
+def records_to_wide(df, on="time_id"):
+    """Pivot snp.stocks-shaped rows (or intraday rows on="bar_ts") into the (ticker, field) layout."""
+    fields = {v: k for k, v in FIELD_COLUMNS.items()}
+    # append-only staging may hold a day twice, the later record wins
+    df = df.drop_duplicates([on, "comp_ticker"], keep="last")
+    df = df.rename(columns=fields)
+    df["Date"] = pd.to_datetime(df[on], utc=True) if on == "bar_ts" else pd.to_datetime(df[on])
+    wide = df.pivot(index="Date", columns="comp_ticker", values=list(fields.values()))
+    wide = wide.swaplevel(axis=1).sort_index(axis=1)
+    return wide
+
+
+def wide_to_frame(wide, currency_iso="USD"):
+    """Split a wide multi-ticker frame into rows of the snp.stocks shape."""
+    if wide.empty:
+        return pd.DataFrame(columns=STOCK_COLUMNS)
+    # all-NaN rows are dropped explicitly, pandas 3 keeps them when stacking
+    long = wide.stack(level=0).dropna(how="all")
+    long.index.names = ["time_id", "comp_ticker"]
+    long = long.rename(columns=FIELD_COLUMNS).reset_index()
+    # tickers without a bar on a date come back as NaN rows
+    long = long.dropna(subset=["close_price"])
+    long["currency_iso"] = currency_iso
+    long["time_id"] = pd.to_datetime(long["time_id"]).dt.strftime("%Y-%m-%d")
+    long[PRICE_COLUMNS] = long[PRICE_COLUMNS].round(4)
+    long["volume"] = long["volume"].fillna(0).astype("int64")
+    return long[STOCK_COLUMNS]
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def fetch_price_frames(tickers, start, end, provider=None, chunk_size=CHUNK_SIZE,
+                       interval="1d", fetcher=None):
+    """
+    Yield one snp.stocks-shaped frame per chunk of tickers, chunks are
+    requested concurrently under the fetcher's rate limit.
+    """
+    provider = provider or default_provider()
+    fetcher = fetcher or ConcurrentFetcher(stage="stocks")
+    metrics = get_metrics()
+    chunks = [tuple(chunk) for chunk in chunked(list(tickers), chunk_size)]
+
+    def download(chunk):
+        return provider.download(list(chunk), start, end, interval=interval)
+
+    for chunk, wide, error in fetcher.map(download, chunks):
+        if error is not None:
+            logging.error(f"Error for tickers {chunk[0]}..{chunk[-1]}: {error}")
+            continue
+        with metrics.timer("transform_seconds", stage="stocks"):
+            df = wide_to_frame(wide)
+        metrics.count("rows_transformed", len(df), stage="stocks")
+        for ticker, n in df["comp_ticker"].value_counts().items():
+            metrics.count_ticker(ticker, "rows_fetched", int(n))
+        yield df
+
+
+def fetch_prices(tickers, start, end, provider=None, chunk_size=CHUNK_SIZE,
+                 interval="1d", fetcher=None):
+    """
+    Download bars for all tickers in multi-symbol chunks.
+    Returns (records, tickers without data).
+    """
+    records = []
+    fetched = set()
+    for df in fetch_price_frames(tickers, start, end, provider, chunk_size, interval, fetcher):
+        fetched.update(df["comp_ticker"].unique())
+        records.extend(df.to_dict(orient="records"))
+    missing = [t for t in tickers if t not in fetched]
+    return records, missing
@@ -0,0 +1,163 @@
+# read API over snp.stocks: chunked, compact frames and an LRU cache checked against load watermarks
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from etl.conversion import BASE_CURRENCY, convert_frame, load_rates, PRICE_COLUMNS
+from etl.db import get_engine
+from etl.metrics import get_metrics
+
+CHUNK_ROWS = int(os.getenv("etl_read_chunk_rows", "50000"))
+CACHE_SIZE = int(os.getenv("etl_read_cache_size", "32"))  # cached queries
+
+# DECIMAL columns are cast on the server, psycopg2 would otherwise build a Decimal per value
+query_prices = """
+    SELECT
+        time_id, comp_ticker,
+        CAST(open_price AS DOUBLE PRECISION) AS open_price,
+        CAST(high_price AS DOUBLE PRECISION) AS high_price,
+        CAST(low_price AS DOUBLE PRECISION) AS low_price,
+        CAST(close_price AS DOUBLE PRECISION) AS close_price,
+        volume
+    FROM snp.stocks
+    WHERE comp_ticker IN :tickers
+        AND time_id >= :start AND time_id < :end
+    ORDER BY time_id, comp_ticker
+"""
+
+# what a cached result depends on: loaded days (backfilled and added ones too), reloaded
+# values once their rollups were refreshed, re-adjusted history and rates
+query_read_watermarks = """
+    SELECT 'stocks' AS source, comp_ticker AS key,
+        CAST(MIN(time_id) AS VARCHAR(30)) || ' ' || CAST(MAX(time_id) AS VARCHAR(30))
+            || ' ' || CAST(COUNT(*) AS VARCHAR(30)) AS mark
+    FROM snp.stocks
+    WHERE comp_ticker IN :tickers
+    GROUP BY comp_ticker
+    UNION ALL
+    SELECT 'rollups' AS source, comp_ticker AS key, CAST(MAX(refreshed_at) AS VARCHAR(30)) AS mark
+    FROM snp.daily_returns
+    WHERE comp_ticker IN :tickers
+    GROUP BY comp_ticker
+    UNION ALL
+    SELECT 'actions' AS source, comp_ticker AS key, CAST(MAX(applied_at) AS VARCHAR(30)) AS mark
+    FROM snp.corporate_actions
+    WHERE comp_ticker IN :tickers AND rows_adjusted > 0
+    GROUP BY comp_ticker
+    UNION ALL
+    SELECT 'currencies' AS source, currency_iso AS key, CAST(MAX(time_id) AS VARCHAR(30)) AS mark
+    FROM snp.currencies
+    WHERE currency_iso = :currency
+    GROUP BY currency_iso
+"""
+
+
+def _frame(rows, categories):
+    """Compact frame of fetched rows: date index, categorical tickers, float64 prices."""
+    columns = list(zip(*rows)) if rows else [()] * 7
+    frame = pd.DataFrame({
+        "comp_ticker": pd.Categorical([t.strip() for t in columns[1]], categories=categories),
+        **{col: np.asarray(values, dtype="float64") for col, values in zip(PRICE_COLUMNS, columns[2:6])},
+        "volume": np.asarray([v or 0 for v in columns[6]], dtype="int64"),
+    }, index=pd.DatetimeIndex(pd.to_datetime(list(columns[0])), name="time_id"))
+    return frame
+
+
+def iter_prices(tickers, start, end, currency=BASE_CURRENCY, chunk_rows=CHUNK_ROWS, engine=None):
+    """
+    Yield compact frames of at most chunk_rows bars for tickers in [start, end),
+    streamed from a server-side cursor so memory stays bounded by one chunk.
+    Prices in another currency are converted chunk by chunk with the last
+    rate at or before each day, the rates of the range are read once.
+    """
+    tickers = sorted(set(tickers))
+    stmt = text(query_prices).bindparams(bindparam("tickers", expanding=True))
+    params = {"tickers": tickers, "start": str(start), "end": str(end)}
+    metrics = get_metrics()
+    with (engine or get_engine()).connect() as conn:
+        factors = None if currency == BASE_CURRENCY else load_rates(conn, currency, start, end)
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunk_rows).execute(stmt, params)
+        for rows in result.partitions(chunk_rows):
+            metrics.count("rows_read", len(rows), stage="read")
+            frame = _frame(rows, tickers)
+            yield frame if factors is None else convert_frame(frame, factors)
+
+
+class PriceReader:
+    """
+    read_prices() with an LRU cache of recent results keyed by
+    (tickers, start, end, currency). Each hit costs one watermark query;
+    an entry is dropped when a load, a re-adjustment or new rates moved the
+    watermarks of its tickers since it was read.
+    """
+
+    def __init__(self, engine=None, max_entries=CACHE_SIZE, chunk_rows=CHUNK_ROWS):
+        self.engine = engine
+        self.max_entries = max_entries
+        self.chunk_rows = chunk_rows
+        self.entries = OrderedDict()  # key -> (watermarks, frame)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def watermarks(self, tickers, currency):
+        stmt = text(query_read_watermarks).bindparams(bindparam("tickers", expanding=True))
+        with (self.engine or get_engine()).connect() as conn:
+            rows = conn.execute(stmt, {"tickers": list(tickers), "currency": currency})
+            return frozenset((source, key.strip(), mark) for source, key, mark in rows)
+
+    def read(self, tickers, start, end, currency=BASE_CURRENCY):
+        key = (tuple(sorted(set(tickers))), str(start), str(end), currency)
+        marks = self.watermarks(key[0], currency)
+        metrics = get_metrics()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == marks:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                metrics.count("read_cache_hits", stage="read")
+                return entry[1].copy()
+            self.entries.pop(key, None)
+            self.misses += 1
+        metrics.count("read_cache_misses", stage="read")
+        frames = list(iter_prices(key[0], start, end, currency, self.chunk_rows, self.engine))
+        frame = pd.concat(frames) if len(frames) > 1 else frames[0] if frames else _frame([], list(key[0]))
+        with self.lock:
+            self.entries[key] = (marks, frame)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return frame.copy()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+_reader = None
+
+
+def get_reader():
+    """Reader shared by the process, on the shared engine."""
+    global _reader
+    if _reader is None:
+        _reader = PriceReader()
+    return _reader
+
+
+def read_prices(tickers, start, end, currency=BASE_CURRENCY, chunked=False, chunk_rows=CHUNK_ROWS):
+    """
+    Daily bars of tickers for days in [start, end) (end exclusive, like the
+    loaders) as one frame indexed by time_id, with prices in `currency`.
+    chunked=True returns a generator of frames instead, uncached, for
+    scans over years of data in bounded memory.
+    """
+    if chunked:
+        return iter_prices(tickers, start, end, currency, chunk_rows)
+    return get_reader().read(tickers, start, end, currency)
@@ -0,0 +1,231 @@
+# rollup tables over snp.stocks, recomputed only for the partitions touched by a load
+from datetime import timedelta
+
+import pandas as pd
+from sqlalchemy import text
+
+from etl.loader import _copy_rows, Target
+from etl.metrics import get_metrics
+from etl.watermarks import _to_date, load_watermarks
+
+# earliest touched day per ticker, with the bounds of its month and quarter
+TOUCHED = Target(
+    "stage_touched",
+    ["comp_ticker", "start_day", "month_start", "quarter_start"],
+    key=[],
+)
+TOUCHED_DDL = """
+    CREATE TEMPORARY TABLE stage_touched (
+        comp_ticker CHAR(5), start_day DATE, month_start DATE, quarter_start DATE, prev_day DATE
+    )
+"""
+
+# the return of the first touched day needs the close of the stored day before it
+query_prev_days = """
+    UPDATE stage_touched
+    SET prev_day = COALESCE((
+        SELECT MAX(p.time_id) FROM snp.stocks p
+        WHERE p.comp_ticker = stage_touched.comp_ticker AND p.time_id < stage_touched.start_day
+    ), start_day)
+"""
+
+query_rollup_marks = """
+    SELECT comp_ticker, MAX(time_id) AS loaded_to, MAX(refreshed_at) AS refreshed_at
+    FROM snp.daily_returns
+    GROUP BY comp_ticker
+"""
+
+# days stored before or inside the rolled range of a ticker (a backfill, a reload that
+# added days), which the watermark alone does not show
+query_unrolled = """
+    SELECT s.comp_ticker, MIN(s.time_id) AS first_day
+    FROM snp.stocks s
+    JOIN (
+        SELECT comp_ticker, MIN(time_id) AS rolled_from, MAX(time_id) AS rolled_to, COUNT(*) AS rolled_days
+        FROM snp.daily_returns
+        GROUP BY comp_ticker
+    ) r ON r.comp_ticker = s.comp_ticker AND s.time_id <= r.rolled_to
+    GROUP BY s.comp_ticker, r.rolled_from, r.rolled_days
+    HAVING MIN(s.time_id) < r.rolled_from OR COUNT(*) <> r.rolled_days
+"""
+
+query_readjusted = """
+    SELECT DISTINCT comp_ticker
+    FROM snp.corporate_actions
+    WHERE rows_adjusted > 0 AND applied_at >= :refreshed_at
+"""
+
+delete_returns = """
+    DELETE FROM snp.daily_returns AS r
+    WHERE EXISTS (
+        SELECT 1 FROM stage_touched t
+        WHERE t.comp_ticker = r.comp_ticker AND r.time_id >= t.start_day
+    )
+"""
+
+insert_returns = """
+    INSERT INTO snp.daily_returns (comp_ticker, time_id, close_price, prev_close, daily_return, refreshed_at)
+    SELECT
+        w.comp_ticker, w.time_id, w.close_price, w.prev_close,
+        CASE WHEN w.prev_close > 0
+            THEN CAST(w.close_price AS DOUBLE PRECISION) / CAST(w.prev_close AS DOUBLE PRECISION) - 1
+        END,
+        :refreshed_at
+    FROM (
+        SELECT
+            s.comp_ticker, s.time_id, s.close_price, t.start_day,
+            LAG(s.close_price) OVER (PARTITION BY s.comp_ticker ORDER BY s.time_id) AS prev_close
+        FROM snp.stocks s
+        JOIN stage_touched t ON t.comp_ticker = s.comp_ticker
+        WHERE s.time_id >= t.prev_day
+    ) w
+    WHERE w.time_id >= w.start_day
+"""
+
+# a period row is touched when it ends on or after the start of the touched period
+delete_period = """
+    DELETE FROM snp.{table} AS m
+    WHERE EXISTS (
+        SELECT 1 FROM stage_touched t
+        WHERE t.comp_ticker = m.comp_ticker AND m.last_day >= t.{period}_start
+    )
+"""
+
+insert_period = """
+    INSERT INTO snp.{table} (
+        comp_ticker, year, {period}, first_day, last_day,
+        open_price, high_price, low_price, close_price, volume, trading_days
+    )
+    SELECT
+        g.comp_ticker, g.year, g.{period}, g.first_day, g.last_day,
+        o.open_price, g.high_price, g.low_price, c.close_price, g.volume, g.trading_days
+    FROM (
+        SELECT
+            s.comp_ticker, d.year, d.{period},
+            MIN(s.time_id) AS first_day, MAX(s.time_id) AS last_day,
+            MAX(s.high_price) AS high_price, MIN(s.low_price) AS low_price,
+            SUM(s.volume) AS volume, COUNT(*) AS trading_days
+        FROM snp.stocks s
+        JOIN snp.times d ON d.time_id = s.time_id
+        JOIN stage_touched t ON t.comp_ticker = s.comp_ticker
+        WHERE s.time_id >= t.{period}_start
+        GROUP BY s.comp_ticker, d.year, d.{period}
+    ) g
+    JOIN snp.stocks o ON o.comp_ticker = g.comp_ticker AND o.time_id = g.first_day
+    JOIN snp.stocks c ON c.comp_ticker = g.comp_ticker AND c.time_id = g.last_day
+"""
+
+# sector days from the earliest touched day of any of their tickers
+stage_sectors = """
+    CREATE TEMPORARY TABLE stage_sectors AS
+    SELECT c.sector, MIN(t.start_day) AS start_day
+    FROM stage_touched t
+    JOIN snp.companies c ON c.comp_ticker = t.comp_ticker
+    GROUP BY c.sector
+"""
+
+delete_sectors = """
+    DELETE FROM snp.sector_daily AS d
+    WHERE EXISTS (
+        SELECT 1 FROM stage_sectors g
+        WHERE g.sector = d.sector AND d.time_id >= g.start_day
+    )
+"""
+
+insert_sectors = """
+    INSERT INTO snp.sector_daily (sector, time_id, companies, volume, turnover, avg_return)
+    SELECT
+        c.sector, s.time_id, COUNT(*), SUM(s.volume),
+        SUM(s.close_price * s.volume), AVG(r.daily_return)
+    FROM snp.stocks s
+    JOIN snp.companies c ON c.comp_ticker = s.comp_ticker
+    JOIN stage_sectors g ON g.sector = c.sector AND s.time_id >= g.start_day
+    LEFT JOIN snp.daily_returns r ON r.comp_ticker = s.comp_ticker AND r.time_id = s.time_id
+    GROUP BY c.sector, s.time_id
+"""
+
+ROLLUPS = ["daily_returns", "monthly_ohlcv", "quarterly_ohlcv", "sector_daily"]
+
+
+def touched_days(conn, since=None):
+    """
+    {ticker: earliest day to recompute}: days after the rollup watermark of
+    each ticker, the whole history of tickers with days stored before or
+    inside their rolled range (a backfill) or re-adjusted since the last
+    refresh, and every ticker from `since` (reloaded values of days already
+    rolled up cannot be told apart, backfills and ranged runs pass it).
+    """
+    watermarks = load_watermarks(conn)["stocks"]
+    if not watermarks:
+        return {}
+    history_start = _to_date(conn.execute(text("SELECT MIN(time_id) FROM snp.stocks")).scalar())
+    rolled, refreshed_at = {}, None
+    for ticker, loaded_to, refreshed in conn.execute(text(query_rollup_marks)):
+        rolled[ticker.strip()] = _to_date(loaded_to)
+        refreshed_at = max(refreshed_at, refreshed) if refreshed_at else refreshed
+
+    touched = {}
+    for ticker, loaded_to in watermarks.items():
+        if ticker not in rolled:
+            touched[ticker] = history_start
+        elif loaded_to > rolled[ticker]:
+            touched[ticker] = rolled[ticker] + timedelta(days=1)
+    for ticker, first_day in conn.execute(text(query_unrolled)):
+        touched[ticker.strip()] = _to_date(first_day)
+    if refreshed_at is not None:
+        for ticker, in conn.execute(text(query_readjusted), {"refreshed_at": refreshed_at}):
+            touched[ticker.strip()] = history_start
+    if since is not None:
+        since = _to_date(since)
+        for ticker in watermarks:
+            touched[ticker] = min(touched.get(ticker, since), since)
+    return touched
+
+
+def _touched_frame(touched):
+    days = pd.to_datetime(pd.Series(touched, dtype=object))
+    return pd.DataFrame({
+        "comp_ticker": days.index,
+        "start_day": days.dt.strftime("%Y-%m-%d").to_numpy(),
+        "month_start": days.dt.to_period("M").dt.start_time.dt.strftime("%Y-%m-%d").to_numpy(),
+        "quarter_start": days.dt.to_period("Q").dt.start_time.dt.strftime("%Y-%m-%d").to_numpy(),
+    })
+
+
+def refresh_rollups(conn, refreshed_at, since=None):
+    """
+    Recompute the rollup partitions touched since the last refresh:
+    (ticker, day) returns, (ticker, month) and (ticker, quarter) OHLCV and
+    (sector, day) aggregates, each with one delete and one insert ... select.
+    Returns ({rollup: rows written}, number of touched tickers).
+    """
+    touched = touched_days(conn, since)
+    if not touched:
+        return dict.fromkeys(ROLLUPS, 0), 0
+    conn.execute(text("DROP TABLE IF EXISTS stage_touched"))
+    conn.execute(text(TOUCHED_DDL))
+    _copy_rows(conn, TOUCHED, _touched_frame(touched), table=TOUCHED.table)
+    conn.execute(text(query_prev_days))
+    # temporary tables get no statistics from autovacuum, the planner needs them to pick index scans
+    conn.execute(text("ANALYZE stage_touched"))
+
+    metrics = get_metrics()
+    rows = {}
+    with metrics.timer("rollup_seconds", stage="daily_returns"):
+        conn.execute(text(delete_returns))
+        rows["daily_returns"] = conn.execute(text(insert_returns), {"refreshed_at": refreshed_at}).rowcount
+    for table, period in (("monthly_ohlcv", "month"), ("quarterly_ohlcv", "quarter")):
+        with metrics.timer("rollup_seconds", stage=table):
+            conn.execute(text(delete_period.format(table=table, period=period)))
+            rows[table] = conn.execute(text(insert_period.format(table=table, period=period))).rowcount
+    with metrics.timer("rollup_seconds", stage="sector_daily"):
+        conn.execute(text("DROP TABLE IF EXISTS stage_sectors"))
+        conn.execute(text(stage_sectors))
+        conn.execute(text("ANALYZE stage_sectors"))
+        conn.execute(text(delete_sectors))
+        rows["sector_daily"] = conn.execute(text(insert_sectors)).rowcount
+    conn.execute(text("DROP TABLE stage_sectors"))
+    conn.execute(text("DROP TABLE stage_touched"))
+    for table, n in rows.items():
+        metrics.count("rows_rolled_up", n, stage=table)
+    return rows, len(touched)
@@ -0,0 +1,285 @@
+# stages of the daily ETL and their dependencies, run by etl.pipeline
+import logging
+from contextlib import closing
+from datetime import datetime
+
+from etl.actions import refresh_actions
+from etl.buffer import ColumnBuffer
+from etl.cache import get_cache
+from etl.companies import fetch_profiles, refresh_companies
+from etl.config import read_tickers, TICKERS_FILE
+from etl.constituents import sync_constituents
+from etl.conversion import hot_currencies, refresh_converted
+from etl.currencies import currency_pairs, fetch_currency_records
+from etl.db import bulk_session, get_engine
+from etl.journal import FAILED, FETCHED, LOADED, PENDING
+from etl.loader import CURRENCIES, STOCKS
+from etl.partitions import ensure_partitions
+from etl.pipeline import Pipeline, Stage
+from etl.prices import fetch_price_frames, FixtureProvider
+from etl.rollups import refresh_rollups
+from etl.staging import StagingStore
+from etl.trading_calendar import refresh_times, trading_days
+from etl.validation import validated_upsert, Validator
+from etl.watermarks import load_watermarks, plan_ranges, record_attempts
+
+DEFAULT_STAGES = ["calendar", "fx", "prices", "actions", "rollups"]
+
+
+class Cancelled(Exception):
+    """Raised inside a stage when its attempt timed out."""
+
+
+class RunContext:
+    """
+    What one run loads: days before `end` (exclusive), from each key's
+    watermark or from a forced `start`. The journal is keyed by run date.
+    """
+
+    def __init__(self, end, journal, start=None, resume=False, html=None, tickers_file=TICKERS_FILE,
+                 actions_fixture=None):
+        self.end = end
+        self.start = start
+        self.journal = journal
+        self.resume = resume
+        self.html = html
+        self.tickers_file = tickers_file
+        self.actions_fixture = actions_fixture
+
+    def keys(self, source):
+        keys = read_tickers(self.tickers_file) if source == "stocks" else list(currency_pairs())
+        if self.resume:
+            keys = self.journal.pending(source, keys)
+        return keys
+
+    def ranges(self, source, keys=None):
+        """[(start, end, [keys])] still to load for "stocks" or "currencies"."""
+        keys = self.keys(source) if keys is None else keys
+        if self.start is not None:
+            return [(self.start, self.end, keys)] if keys and trading_days(self.start, self.end) else []
+        with get_engine().connect() as conn:
+            watermarks = load_watermarks(conn, attempts=True)
+        return plan_ranges(keys, watermarks[source], self.end)
+
+
+def _check(cancel):
+    if cancel.is_set():
+        raise Cancelled("attempt timed out")
+
+
+def calendar_stage(ctx, cancel):
+    # insert data about time for every day of the gap, trading days and early closes
+    # come from the offline exchange calendar
+    starts = [start for start, _, _ in ctx.ranges("stocks") + ctx.ranges("currencies")]
+    if not starts:
+        print(f"Warehouse is up to date, no trading day to load before {ctx.end}")
+        return 0
+    start_date = min(starts)
+    try:
+        with bulk_session() as conn:
+            # stored days outside the gap get their flags corrected too
+            days = refresh_times(conn, start_date, ctx.end)
+            # partitions of snp.stocks for the gap and the next period, before prices are loaded
+            ensure_partitions(conn, start_date, ctx.end)
+            _check(cancel)  # a timed out attempt rolls back
+    except Exception as e:
+        ctx.journal.record("times", start_date, FAILED, e)
+        raise
+    ctx.journal.record("times", start_date, LOADED)
+    print(f"times inserted from {start_date}")
+    return days
+
+
+def fx_stage(ctx, cancel):
+    # load data about all configured currencies in one request from the oldest watermark
+    currency_ranges = ctx.ranges("currencies")
+    if not currency_ranges:
+        return 0
+    journal = ctx.journal
+    start_date = currency_ranges[0][0]
+    currency_units = [iso for _, _, group in currency_ranges for iso in group]
+    try:
+        currency_data = fetch_currency_records(start_date, ctx.end)
+    except Exception as e:
+        logging.error(f"Error fetching currencies from {start_date}: {e}")
+        journal.record_many("currencies", currency_units, FAILED, e)
+        raise
+    print(f"Fetched {len(currency_data)} currency records from {start_date}")
+    fetched = sorted({record["currency_iso"] for record in currency_data})
+    journal.record_many("currencies", [iso for iso in currency_units if iso in fetched], FETCHED)
+    no_data = [iso for iso in currency_units if iso not in fetched]
+    journal.record_many("currencies", no_data, FAILED, f"no data from {start_date}")
+    if no_data:
+        # planned from ctx.end next time instead of from the history start
+        with bulk_session() as conn:
+            record_attempts(conn, "currencies", no_data, ctx.end)
+    if not currency_data:
+        return 0
+    _check(cancel)
+
+    # insert data about currency in one staged merge, rows with unknown days are quarantined
+    try:
+        with bulk_session() as conn:
+            yrec, rejected = validated_upsert(conn, CURRENCIES, currency_data, Validator.load(conn))
+            _check(cancel)
+    except Exception as e:
+        logging.error(f"Error loading currencies for {start_date}: {e}")
+        journal.record_many("currencies", fetched, FAILED, e)
+        raise
+    failed = {}
+    for key, reason in rejected:
+        logging.error(f"Error for currency {key['currency_iso']} on {key['time_id']}: {reason}")
+        failed[key["currency_iso"]] = reason
+    for iso, reason in failed.items():
+        journal.record("currencies", iso, FAILED, reason)
+    if failed:
+        with bulk_session() as conn:
+            record_attempts(conn, "currencies", failed, ctx.end)
+    journal.record_many("currencies", [iso for iso in fetched if iso not in failed], LOADED)
+    print(f"currencies added successfully: {yrec}\n not added records: {len(rejected)}")
+    return yrec
+
+
+def prices_stage(ctx, cancel):
+    # Load stocks data, one batched request per group of tickers sharing a watermark,
+    # each group is loaded and journaled before the next one is fetched
+    journal = ctx.journal
+    total, errors = 0, []
+    # known tickers and days are loaded once, after the calendar stage added the new days
+    with get_engine().connect() as conn:
+        validator = Validator.load(conn)
+    for range_start, range_end, group in ctx.ranges("stocks"):
+        _check(cancel)
+        journal.record_many("stocks", group, PENDING)
+        fetched, failed, totals = set(), {}, {"loaded": 0, "rejected": 0}
+
+        # insert data about stocks in one staged merge per flush of the columnar buffer,
+        # memory stays within the buffer budget however long the gap is
+        def load_stocks(frame):
+            with bulk_session() as conn:
+                yrec, rejected = validated_upsert(conn, STOCKS, frame, validator)
+                _check(cancel)
+            totals["loaded"] += yrec
+            totals["rejected"] += len(rejected)
+            for key, reason in rejected:
+                logging.error(f"Error for ticker {key['comp_ticker']}, time {key['time_id']}: {reason}")
+                failed[key["comp_ticker"]] = reason
+
+        try:
+            # closing the generator on Cancelled drops the queued downloads of the group
+            with ColumnBuffer(sink=load_stocks) as buffer, \
+                    closing(fetch_price_frames(group, range_start, range_end)) as frames:
+                for frame in frames:
+                    _check(cancel)
+                    fetched.update(frame["comp_ticker"].unique())
+                    buffer.append(frame)
+        except Cancelled:
+            raise
+        except Exception as e:
+            logging.error(f"Error loading stocks from {range_start}: {e}")
+            journal.record_many("stocks", [t for t in group if t in fetched], FAILED, e)
+            errors.append(e)
+            continue
+        no_data = [ticker for ticker in group if ticker not in fetched]
+        print(f"Fetched stock records for {len(fetched)} tickers from {range_start}")
+        if no_data:
+            print(f"No data for {len(no_data)} tickers from {range_start}")
+            journal.record_many("stocks", no_data, FAILED, f"no data from {range_start}")
+        fetched = [ticker for ticker in group if ticker in fetched]
+        journal.record_many("stocks", fetched, FETCHED)
+        for ticker, reason in failed.items():
+            journal.record("stocks", ticker, FAILED, reason)
+        if no_data or failed:
+            # tickers left without a stored row are planned from range_end next time,
+            # the attempt is ignored for the ones that have rows
+            with bulk_session() as conn:
+                record_attempts(conn, "stocks", no_data + list(failed), range_end)
+        journal.record_many("stocks", [t for t in fetched if t not in failed], LOADED)
+        if fetched:
+            print(f"stocks added successfully: {totals['loaded']}\n not added records: {totals['rejected']}")
+        total += totals["loaded"]
+    if errors:
+        # a retry re-plans from the watermarks, so only the failed groups are fetched again
+        raise RuntimeError(f"{len(errors)} ticker groups failed to load, first error: {errors[0]}")
+    return total
+
+
+def companies_stage(ctx, cancel):
+    # refetch profiles (served from the response cache while fresh) and merge only changes
+    tickers = read_tickers(ctx.tickers_file)
+    profiles, failed = fetch_profiles(tickers, get_cache())
+    _check(cancel)
+    if failed:
+        print(f"No profile for {len(failed)} companies: {sorted(failed)}")
+    store = StagingStore()
+    snapshot = {company["symbol"]: company for company in store.read_latest("companies")}
+    snapshot.update({profile["symbol"]: profile for profile in profiles})
+    store.append("companies", list(snapshot.values()), partition=ctx.end, replace=True)
+    with bulk_session() as conn:
+        new, changed, loaded, rejected = refresh_companies(conn, profiles)
+        _check(cancel)
+    print(f"New companies: {len(new)}, changed: {len(changed)}, skipped: {len(rejected)}")
+    return loaded
+
+
+def constituents_stage(ctx, cancel):
+    # added tickers get no watermark, so the prices stage backfills their history
+    listed, removed = sync_constituents(ctx.end, ctx.html, cache=get_cache(), tickers_file=ctx.tickers_file,
+                                        check=lambda: _check(cancel))
+    return len(listed) + len(removed)
+
+
+def actions_stage(ctx, cancel):
+    # new splits and dividends re-adjust the stored history of their tickers only
+    provider = FixtureProvider(path=ctx.actions_fixture) if ctx.actions_fixture else None
+    with bulk_session() as conn:
+        actions, rows = refresh_actions(conn, read_tickers(ctx.tickers_file), ctx.end, provider=provider)
+        _check(cancel)
+    for action in actions.itertuples():
+        print(f"{action.action_type} of {action.comp_ticker} on {action.action_date} ({action.value}): "
+              f"{action.rows_adjusted} rows re-adjusted")
+    print(f"New corporate actions: {len(actions)}, rows re-adjusted: {rows}")
+    return rows
+
+
+def convert_stage(ctx, cancel):
+    # keep the as-of converted prices of hot currencies in step with loads, rates and re-adjustments
+    total = 0
+    converted_at = datetime.now().isoformat(timespec="seconds")
+    for currency in hot_currencies():
+        _check(cancel)
+        with bulk_session() as conn:
+            rows = refresh_converted(conn, currency, ctx.end, converted_at, since=ctx.start)
+            _check(cancel)
+        print(f"prices converted to {currency}: {rows}")
+        total += rows
+    return total
+
+
+def rollups_stage(ctx, cancel):
+    # recompute only the rollup partitions touched by this run's loads and re-adjustments
+    with bulk_session() as conn:
+        rows, tickers = refresh_rollups(conn, datetime.now().isoformat(timespec="seconds"), since=ctx.start)
+        _check(cancel)
+    print(f"rollups refreshed for {tickers} tickers: {rows}")
+    return sum(rows.values())
+
+
+def build_pipeline():
+    """
+    calendar before fx and prices (snp.times is referenced by both), fx and
+    prices side by side; constituents and companies, when selected, run
+    first so new tickers are backfilled in the same run. actions runs after
+    prices so the bars it re-adjusts are already loaded, rollups after it,
+    convert after it and fx.
+    """
+    return Pipeline([
+        Stage("constituents", constituents_stage, retries=1, timeout=600),
+        Stage("companies", companies_stage, deps=["constituents"], retries=1, timeout=1800),
+        Stage("calendar", calendar_stage, deps=["constituents"], retries=2, timeout=120),
+        Stage("fx", fx_stage, deps=["calendar"], retries=2, timeout=600),
+        Stage("prices", prices_stage, deps=["calendar", "companies"], retries=1, timeout=3 * 3600),
+        Stage("actions", actions_stage, deps=["prices"], retries=1, timeout=1800),
+        Stage("rollups", rollups_stage, deps=["actions"], retries=1, timeout=1800),
+        Stage("convert", convert_stage, deps=["fx", "actions"], retries=1, timeout=1800),
+    ])
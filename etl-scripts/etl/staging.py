@@ -0,0 +1,86 @@
+# append-only staging store: JSON Lines files partitioned by month of trading date
+import json
+import os
+from itertools import islice
+
+from etl.config import DATA_DIR
+
+STAGING_DIR = os.path.join(DATA_DIR, "staging")
+CHUNK_SIZE = 50000  # records per chunk handed to the uploader
+
+
+class StagingStore:
+    """
+    Datasets are directories of <partition>.jsonl files. Records keyed by
+    time_id go to a monthly partition (YYYY-MM) and are appended, so a daily
+    run only touches the current month's file. Snapshot datasets such as
+    company profiles pass an explicit partition (the fetch date).
+    """
+
+    def __init__(self, root=STAGING_DIR):
+        self.root = root
+
+    def _dir(self, dataset):
+        return os.path.join(self.root, dataset)
+
+    def _path(self, dataset, partition):
+        return os.path.join(self._dir(dataset), f"{partition}.jsonl")
+
+    def partitions(self, dataset, start=None, end=None):
+        """Sorted partition names, optionally limited to [start, end] months."""
+        if not os.path.isdir(self._dir(dataset)):
+            return []
+        names = sorted(f[:-len(".jsonl")] for f in os.listdir(self._dir(dataset)) if f.endswith(".jsonl"))
+        if start:
+            names = [n for n in names if n >= start[:len(n)]]
+        if end:
+            names = [n for n in names if n <= end[:len(n)]]
+        return names
+
+    def append(self, dataset, records, partition=None, replace=False):
+        """
+        Append records to their partitions. replace=True rewrites only the
+        partitions present in `records`, for sources that re-deliver whole periods.
+        Returns the number of records written.
+        """
+        grouped = {}
+        for record in records:
+            key = partition or str(record["time_id"])[:7]
+            grouped.setdefault(key, []).append(record)
+        os.makedirs(self._dir(dataset), exist_ok=True)
+        for key, rows in grouped.items():
+            with open(self._path(dataset, key), "w" if replace else "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        return sum(len(rows) for rows in grouped.values())
+
+    def iter_records(self, dataset, start=None, end=None, partitions=None):
+        """Stream records line by line, filtered to start <= time_id <= end."""
+        for name in partitions or self.partitions(dataset, start, end):
+            with open(self._path(dataset, name), "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    time_id = record.get("time_id")
+                    if start and time_id and time_id < start:
+                        continue
+                    if end and time_id and time_id > end:
+                        continue
+                    yield record
+
+    def read(self, dataset, start=None, end=None, chunk_size=CHUNK_SIZE):
+        """Yield lists of at most chunk_size records, memory stays bounded."""
+        records = self.iter_records(dataset, start, end)
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def read_latest(self, dataset):
+        """All records of the newest partition, e.g. the last company snapshot."""
+        names = self.partitions(dataset)
+        if not names:
+            return []
+        return list(self.iter_records(dataset, partitions=names[-1:]))
@@ -0,0 +1,131 @@
+# the in-memory SQLite stand-in of the warehouse and the synthetic data shared by the
+# benchmarks and the tests, so neither depends on the other
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from etl.db import bulk_session, get_engine, reset_engine
+from etl.prices import chunked, wide_to_frame
+from etl.rollups import ROLLUPS
+from etl.synthetic import SYNTHETIC_START, synthetic_wide
+
+# snp schema for the SQLite stand-in, types loosened where SQLite has no equivalent
+SQLITE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS snp.companies (
+        comp_ticker VARCHAR(5) PRIMARY KEY, comp_name VARCHAR(100) NOT NULL UNIQUE,
+        sector VARCHAR(50) NOT NULL, industry VARCHAR(100) NOT NULL, exchange_code VARCHAR(4),
+        comp_city VARCHAR(50), comp_state VARCHAR(3), website VARCHAR(100), country VARCHAR(30),
+        comp_employees INTEGER, index_added DATE, index_removed DATE)""",
+    """CREATE TABLE IF NOT EXISTS snp.times (
+        time_id DATE PRIMARY KEY, is_trading_day BOOLEAN NOT NULL DEFAULT 1,
+        is_early_close BOOLEAN NOT NULL DEFAULT 0,
+        year SMALLINT GENERATED ALWAYS AS (CAST(strftime('%Y', time_id) AS INTEGER)) VIRTUAL,
+        quarter SMALLINT GENERATED ALWAYS AS ((CAST(strftime('%m', time_id) AS INTEGER) + 2) / 3) VIRTUAL,
+        month SMALLINT GENERATED ALWAYS AS (CAST(strftime('%m', time_id) AS INTEGER)) VIRTUAL)""",
+    """CREATE TABLE IF NOT EXISTS snp.currencies (
+        currency_iso CHAR(3), exchange_rate DECIMAL(10,4) NOT NULL, time_id DATE NOT NULL,
+        PRIMARY KEY (currency_iso, time_id))""",
+    """CREATE TABLE IF NOT EXISTS snp.stocks (
+        time_id DATE, comp_ticker CHAR(5) NOT NULL, currency_iso CHAR(3) DEFAULT 'USD',
+        open_price DECIMAL(10,4) NOT NULL, high_price DECIMAL(10,4) NOT NULL,
+        low_price DECIMAL(10,4) NOT NULL, close_price DECIMAL(10,4) NOT NULL, volume BIGINT,
+        PRIMARY KEY (time_id, comp_ticker))""",
+    """CREATE TABLE IF NOT EXISTS snp.load_rejects (
+        reject_id INTEGER PRIMARY KEY AUTOINCREMENT, rejected_at TIMESTAMP NOT NULL,
+        target_table VARCHAR(30) NOT NULL, row_key TEXT NOT NULL, reason VARCHAR(100) NOT NULL,
+        payload TEXT)""",
+    """CREATE TABLE IF NOT EXISTS snp.load_attempts (
+        source VARCHAR(10) NOT NULL, load_key VARCHAR(5) NOT NULL, attempted_to DATE NOT NULL,
+        PRIMARY KEY (source, load_key))""",
+    """CREATE TABLE IF NOT EXISTS snp.corporate_actions (
+        comp_ticker CHAR(5) NOT NULL, action_date DATE NOT NULL, action_type VARCHAR(8) NOT NULL,
+        value DECIMAL(14,6) NOT NULL, price_factor DECIMAL(20,12) NOT NULL,
+        volume_factor DECIMAL(20,12) NOT NULL, rows_adjusted INTEGER NOT NULL DEFAULT 0,
+        applied_at TIMESTAMP NOT NULL, PRIMARY KEY (comp_ticker, action_date, action_type))""",
+    """CREATE TABLE IF NOT EXISTS snp.stocks_fx (
+        currency_iso CHAR(3) NOT NULL, time_id DATE NOT NULL, comp_ticker CHAR(5) NOT NULL,
+        rate_day DATE NOT NULL, exchange_rate DECIMAL(10,4) NOT NULL,
+        open_price DECIMAL(14,4) NOT NULL, high_price DECIMAL(14,4) NOT NULL,
+        low_price DECIMAL(14,4) NOT NULL, close_price DECIMAL(14,4) NOT NULL, volume BIGINT,
+        converted_at TIMESTAMP NOT NULL, PRIMARY KEY (currency_iso, comp_ticker, time_id))""",
+    """CREATE TABLE IF NOT EXISTS snp.daily_returns (
+        comp_ticker CHAR(5) NOT NULL, time_id DATE NOT NULL, close_price DECIMAL(10,4) NOT NULL,
+        prev_close DECIMAL(10,4), daily_return DOUBLE PRECISION, refreshed_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (comp_ticker, time_id))""",
+    *(f"""CREATE TABLE IF NOT EXISTS snp.{period}ly_ohlcv (
+        comp_ticker CHAR(5) NOT NULL, year SMALLINT NOT NULL, {period} SMALLINT NOT NULL,
+        first_day DATE NOT NULL, last_day DATE NOT NULL, open_price DECIMAL(10,4) NOT NULL,
+        high_price DECIMAL(10,4) NOT NULL, low_price DECIMAL(10,4) NOT NULL,
+        close_price DECIMAL(10,4) NOT NULL, volume BIGINT, trading_days SMALLINT NOT NULL,
+        PRIMARY KEY (comp_ticker, year, {period}))""" for period in ("month", "quarter")),
+    """CREATE TABLE IF NOT EXISTS snp.sector_daily (
+        sector VARCHAR(50) NOT NULL, time_id DATE NOT NULL, companies SMALLINT NOT NULL, volume BIGINT,
+        turnover DECIMAL(24,4), avg_return DOUBLE PRECISION, PRIMARY KEY (sector, time_id))""",
+    """CREATE TABLE IF NOT EXISTS snp.stocks_intraday (
+        bar_interval VARCHAR(3) NOT NULL, comp_ticker CHAR(5) NOT NULL, bar_ts TIMESTAMP NOT NULL,
+        time_id DATE NOT NULL, currency_iso CHAR(3) DEFAULT 'USD', open_price DECIMAL(10,4) NOT NULL,
+        high_price DECIMAL(10,4) NOT NULL, low_price DECIMAL(10,4) NOT NULL,
+        close_price DECIMAL(10,4) NOT NULL, volume BIGINT, PRIMARY KEY (bar_interval, comp_ticker, bar_ts))""",
+]
+
+# key columns of each rollup, the order snapshots are compared in
+ROLLUP_KEYS = {
+    "daily_returns": ["comp_ticker", "time_id"],
+    "monthly_ohlcv": ["comp_ticker", "year", "month"],
+    "quarterly_ohlcv": ["comp_ticker", "year", "quarter"],
+    "sector_daily": ["sector", "time_id"],
+}
+
+
+def sqlite_warehouse(url="sqlite://"):
+    """
+    Point the shared engine at a fresh SQLite copy of the snp schema, in memory
+    by default; a file URL is shared by the connections of other threads.
+    """
+    engine = reset_engine(url)
+    with bulk_session() as conn:
+        for ddl in SQLITE_SCHEMA:
+            conn.execute(text(ddl))
+    return engine
+
+
+def synthetic_frames(tickers, years, chunk_size=100):
+    """snp.stocks frames in yearly windows of chunk_size tickers, the way fetch_price_frames hands them over."""
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp(SYNTHETIC_START)
+    for year in range(years):
+        window_start = (start + pd.DateOffset(years=year)).strftime("%Y-%m-%d")
+        window_end = (start + pd.DateOffset(years=year + 1)).strftime("%Y-%m-%d")
+        for chunk in chunked(tickers, chunk_size):
+            yield wide_to_frame(synthetic_wide(chunk, window_start, window_end, rng))
+
+
+def rollup_snapshot(start, end):
+    """{rollup: rows of days in [start, end)} without refresh stamps, sorted by key."""
+    frames = {}
+    with get_engine().connect() as conn:
+        for table in ROLLUPS:
+            day = "time_id" if "time_id" in ROLLUP_KEYS[table] else "last_day"
+            frame = pd.read_sql(text(
+                f"SELECT * FROM snp.{table} WHERE {day} >= :start AND {day} < :end"
+            ), conn, params={"start": start, "end": end})
+            frame = frame.drop(columns=["refreshed_at"], errors="ignore")
+            for column in frame.columns:
+                if frame[column].dtype == object:
+                    frame[column] = frame[column].map(lambda v: v.strip() if isinstance(v, str) else v)
+            frames[table] = frame.sort_values(ROLLUP_KEYS[table]).reset_index(drop=True)
+    return frames
+
+
+def same_rows(left, right):
+    """Whether two snapshot frames hold the same rows, floats compared with a tolerance."""
+    if left.shape != right.shape:
+        return False
+    for column in left.columns:
+        a, b = left[column], right[column]
+        if pd.api.types.is_float_dtype(a) or column in ("daily_return", "avg_return"):
+            if not np.allclose(a.astype(float), b.astype(float), equal_nan=True):
+                return False
+        elif not (a.astype(str) == b.astype(str)).all():
+            return False
+    return True
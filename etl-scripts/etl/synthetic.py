@@ -0,0 +1,108 @@
+# synthetic S&P 500-shaped data for benchmarks: OHLCV bars, FX rates and dimension rows
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from etl.loader import bulk_upsert, COMPANIES
+from etl.partitions import drop_empty_partitions, ensure_partitions
+from etl.trading_calendar import session_bars
+
+# far away from real history, so synthetic rows can be deleted safely
+SYNTHETIC_START = "1900-01-01"
+
+
+def synthetic_tickers(n):
+    return [f"Z{i:04d}" for i in range(n)]
+
+
+def synthetic_days(start, end):
+    """Business days in [start, end)."""
+    return pd.bdate_range(start, pd.Timestamp(end) - pd.Timedelta(days=1), name="Date")
+
+
+def synthetic_wide(tickers, start, end, rng=None):
+    """Random walk bars in the (ticker, field) layout returned by yf.download."""
+    rng = rng or np.random.default_rng(0)
+    dates = synthetic_days(start, end)
+    if not len(tickers) or not len(dates):
+        return pd.DataFrame()
+    frames = {}
+    for ticker in tickers:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+        frames[ticker] = pd.DataFrame({
+            "Open": close * (1 + rng.normal(0, 0.002, len(dates))),
+            "High": close * 1.01,
+            "Low": close * 0.99,
+            "Close": close,
+            "Volume": rng.integers(100000, 10000000, len(dates)),
+        }, index=dates)
+    return pd.concat(frames, axis=1)
+
+
+def utc(value):
+    """Timestamp in UTC, naive values are taken as UTC."""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
+
+
+def synthetic_intraday(tickers, start, end, interval="1m", rng=None):
+    """
+    Random walk bars of the regular sessions with a start in [start, end),
+    in the layout of an intraday yf.download: indexed by exchange-time bar start.
+    """
+    rng = rng or np.random.default_rng(0)
+    start, end = utc(start), utc(end)
+    stamps = session_bars(start.date(), end.date() + pd.Timedelta(days=1), interval)
+    stamps = stamps[(stamps >= start) & (stamps < end)].rename("Datetime")
+    if not len(tickers) or not len(stamps):
+        return pd.DataFrame()
+    shape = (len(stamps), len(tickers))
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, shape), axis=0))
+    fields = {
+        "Open": close * (1 + rng.normal(0, 0.0005, shape)),
+        "High": close * 1.002,
+        "Low": close * 0.998,
+        "Close": close,
+        "Volume": rng.integers(1000, 100000, shape).astype("float64"),
+    }
+    # ticker-major (ticker, field) columns, as group_by="ticker" returns them
+    values = np.stack(list(fields.values()), axis=2).reshape(len(stamps), -1)
+    columns = pd.MultiIndex.from_product([list(tickers), list(fields)])
+    return pd.DataFrame(values, index=stamps, columns=columns)
+
+
+def synthetic_fx(start, end, currencies=("EUR", "PLN"), rng=None):
+    """Date x currency close frame, the input of currencies.closes_to_frame()."""
+    rng = rng or np.random.default_rng(0)
+    dates = synthetic_days(start, end)
+    return pd.DataFrame({
+        iso: (1 + i) * np.exp(np.cumsum(rng.normal(0, 0.003, len(dates))))
+        for i, iso in enumerate(currencies)
+    }, index=dates)
+
+
+def seed_dimensions(conn, tickers, start, end, sectors=("Synthetic",)):
+    """Companies, spread round-robin over sectors, and calendar days the synthetic facts reference."""
+    companies = [
+        {"comp_ticker": t, "comp_name": f"Synthetic {t}", "sector": sectors[i % len(sectors)], "industry": "Synthetic"}
+        for i, t in enumerate(tickers)
+    ]
+    bulk_upsert(conn, COMPANIES, companies)
+    days = pd.date_range(start, end, inclusive="left").strftime("%Y-%m-%d")
+    conn.execute(
+        text("INSERT INTO snp.times (time_id) VALUES (:time_id) ON CONFLICT DO NOTHING"),
+        [{"time_id": d} for d in days]
+    )
+    ensure_partitions(conn, start, end, ahead=0)
+
+
+def clear_synthetic(conn, tickers, start, end):
+    """Delete synthetic facts and dimension rows again."""
+    params = {f"t{i}": t for i, t in enumerate(tickers)}
+    in_tickers = ", ".join(f":{k}" for k in params)
+    bounds = {"start": start, "end": end}
+    conn.execute(text(f"DELETE FROM snp.stocks WHERE comp_ticker IN ({in_tickers})"), params)
+    conn.execute(text("DELETE FROM snp.currencies WHERE time_id >= :start AND time_id < :end"), bounds)
+    conn.execute(text(f"DELETE FROM snp.companies WHERE comp_ticker IN ({in_tickers})"), params)
+    conn.execute(text("DELETE FROM snp.times WHERE time_id >= :start AND time_id < :end"), bounds)
+    drop_empty_partitions(conn, start, end)
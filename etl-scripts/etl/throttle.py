@@ -0,0 +1,159 @@
+# rate limited concurrent fetching for market data providers
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from etl.metrics import get_metrics
+
+# Defaults, conservative for yfinance
+RATE = 2.0  # requests per second
+BURST = 4  # requests allowed back to back
+MAX_IN_FLIGHT = 4  # concurrent requests
+MAX_RETRIES = 3
+BASE_DELAY = 2  # Base delay in seconds
+MAX_JITTER = 1  # Random jitter to add to delay
+MAX_DELAY = 60
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens/s up to `burst`. The rate is
+    halved on provider errors and recovers additively on success (AIMD).
+    """
+
+    def __init__(self, rate=RATE, burst=BURST, min_rate=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 8
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def slow_down(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class Backoff:
+    """Exponential backoff with jitter shared by all workers of a fetcher."""
+
+    def __init__(self, base_delay=BASE_DELAY, max_jitter=MAX_JITTER, max_delay=MAX_DELAY):
+        self.base_delay = base_delay
+        self.max_jitter = max_jitter
+        self.max_delay = max_delay
+        self.errors = 0  # consecutive errors
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    def failed(self):
+        with self.lock:
+            delay = min(self.max_delay, self.base_delay * (2 ** self.errors))
+            self.errors += 1
+            delay += random.uniform(0, self.max_jitter)
+            self.resume_at = max(self.resume_at, time.monotonic() + delay)
+            return delay
+
+    def succeeded(self):
+        with self.lock:
+            self.errors = 0
+
+    def wait(self):
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _label(item):
+    # ticker chunks print as first..last, backfill units as start..first..last
+    if isinstance(item, (list, tuple)) and len(item) > 1:
+        return f"{_label(item[0])}..{_label(item[-1])}"
+    return str(item)
+
+
+class ConcurrentFetcher:
+    """
+    Runs fetch calls on a thread pool, each call gated by a shared token
+    bucket and retried with shared backoff when the provider errors.
+    """
+
+    def __init__(self, rate=RATE, burst=BURST, max_in_flight=MAX_IN_FLIGHT,
+                 max_retries=MAX_RETRIES, base_delay=BASE_DELAY, max_jitter=MAX_JITTER,
+                 stage="fetch"):
+        self.stage = stage  # label of the provider metrics
+        self.bucket = TokenBucket(rate, burst)
+        self.backoff = Backoff(base_delay, max_jitter)
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.calls = 0
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    def call(self, fn, item):
+        for attempt in range(self.max_retries + 1):
+            self.backoff.wait()
+            self.bucket.acquire()
+            with self.lock:
+                self.calls += 1
+            metrics = get_metrics()
+            metrics.count("provider_requests", stage=self.stage)
+            start = time.perf_counter()
+            try:
+                result = fn(item)
+            except Exception:
+                metrics.observe("provider_latency_seconds", time.perf_counter() - start, stage=self.stage)
+                metrics.count("provider_errors", stage=self.stage)
+                self.bucket.slow_down()
+                delay = self.backoff.failed()
+                if attempt == self.max_retries:
+                    raise
+                with self.lock:
+                    self.retries += 1
+                metrics.count("provider_retries", stage=self.stage)
+                logging.warning(f"Error fetching {_label(item)}, retrying in {delay:.2f}s... "
+                                f"(Attempt {attempt + 1}/{self.max_retries})")
+                continue
+            metrics.observe("provider_latency_seconds", time.perf_counter() - start, stage=self.stage)
+            self.backoff.succeeded()
+            self.bucket.recover()
+            return result
+
+    def map(self, fn, items):
+        """
+        Yield (item, result, error) in completion order. A consumer that stops
+        early (break, an exception, close()) cancels the calls not started yet
+        and only waits for the ones in flight.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        try:
+            futures = {executor.submit(self.call, fn, item): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    yield item, None, e
+                else:
+                    yield item, result, None
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
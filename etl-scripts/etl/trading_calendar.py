@@ -0,0 +1,187 @@
+# NYSE trading calendar computed offline from the exchange holiday rules
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+import pandas as pd
+from sqlalchemy import text
+
+from etl.loader import bulk_upsert, stage_rows, Target
+
+TIMES = Target(
+    "snp.times",
+    ["time_id", "is_trading_day", "is_early_close"],
+    key=["time_id"],
+)
+
+# stored days whose flags differ from the staged calendar
+update_flags = """
+    UPDATE snp.times AS t
+    SET is_trading_day = s.is_trading_day, is_early_close = s.is_early_close
+    FROM stage_times s
+    WHERE t.time_id = s.time_id
+        AND (t.is_trading_day <> s.is_trading_day OR t.is_early_close <> s.is_early_close)
+"""
+
+EXCHANGE_TZ = "America/New_York"
+SESSION_OPEN = time(9, 30)
+SESSION_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+BAR_FREQ = {"1m": "1min", "1h": "1h"}  # intraday bar intervals, as pandas frequencies
+
+# full-day closures outside the regular rules
+SPECIAL_CLOSURES = {
+    date(2001, 9, 11): "September 11",
+    date(2001, 9, 12): "September 11",
+    date(2001, 9, 13): "September 11",
+    date(2001, 9, 14): "September 11",
+    date(2004, 6, 11): "Reagan National Day of Mourning",
+    date(2007, 1, 2): "Ford National Day of Mourning",
+    date(2012, 10, 29): "Hurricane Sandy",
+    date(2012, 10, 30): "Hurricane Sandy",
+    date(2018, 12, 5): "Bush National Day of Mourning",
+    date(2025, 1, 9): "Carter National Day of Mourning",
+}
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th given weekday (Mon=0) of a month, n=-1 for the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    # anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(day):
+    """Saturday holidays move to Friday, Sunday holidays to Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=None)
+def holidays(year):
+    """{date: name} of NYSE full-day holidays in a year."""
+    days = {}
+    new_year = date(year, 1, 1)
+    # a Saturday New Year's Day is not moved back into the old year
+    if new_year.weekday() != 5:
+        days[_observed(new_year)] = "New Year's Day"
+    if year >= 1998:
+        days[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr. Day"
+    days[_nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    days[_easter(year) - timedelta(days=2)] = "Good Friday"
+    days[_nth_weekday(year, 5, 0, -1)] = "Memorial Day"
+    if year >= 2022:
+        days[_observed(date(year, 6, 19))] = "Juneteenth"
+    days[_observed(date(year, 7, 4))] = "Independence Day"
+    days[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    days[_nth_weekday(year, 11, 3, 4)] = "Thanksgiving Day"
+    days[_observed(date(year, 12, 25))] = "Christmas Day"
+    for day, name in SPECIAL_CLOSURES.items():
+        if day.year == year:
+            days[day] = name
+    return days
+
+
+def is_trading_day(day):
+    day = _as_date(day)
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+
+def is_early_close(day):
+    """13:00 close: July 3rd, the day after Thanksgiving and Christmas Eve."""
+    day = _as_date(day)
+    if not is_trading_day(day):
+        return False
+    return (
+        (day.month, day.day) in ((7, 3), (12, 24))
+        or day == _nth_weekday(day.year, 11, 3, 4) + timedelta(days=1)
+    )
+
+
+def trading_days(start, end):
+    """Trading days in [start, end)."""
+    start, end = _as_date(start), _as_date(end)
+    return [
+        start + timedelta(days=i)
+        for i in range((end - start).days)
+        if is_trading_day(start + timedelta(days=i))
+    ]
+
+
+def previous_trading_day(day):
+    day = _as_date(day) - timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def session_bars(start, end, interval):
+    """Bar start times (exchange time zone) of the regular sessions of trading days in [start, end)."""
+    bars = [
+        pd.date_range(
+            pd.Timestamp.combine(day, SESSION_OPEN),
+            pd.Timestamp.combine(day, EARLY_CLOSE if is_early_close(day) else SESSION_CLOSE),
+            freq=BAR_FREQ[interval], inclusive="left", tz=EXCHANGE_TZ,
+        )
+        for day in trading_days(start, end)
+    ]
+    return bars[0].append(bars[1:]) if bars else pd.DatetimeIndex([], tz=EXCHANGE_TZ)
+
+
+def calendar_frame(start, end):
+    """One row per calendar day in [start, end) with the snp.times attributes."""
+    days = pd.date_range(_as_date(start), _as_date(end), inclusive="left")
+    return pd.DataFrame({
+        "time_id": days.strftime("%Y-%m-%d"),
+        "is_trading_day": [is_trading_day(d) for d in days],
+        "is_early_close": [is_early_close(d) for d in days],
+    })
+
+
+def populate_times(conn, start, end):
+    """Insert or refresh snp.times for [start, end) with one staged merge."""
+    records = calendar_frame(start, end).to_dict(orient="records")
+    loaded, _ = bulk_upsert(conn, TIMES, records)
+    return loaded
+
+
+def refresh_times(conn, start, end):
+    """
+    populate_times() for [start, end), then the flags of every other stored
+    day recomputed with one UPDATE of the days that differ: rows stored
+    before the calendar attributes existed hold the column defaults and the
+    seed only flags weekends. Returns the number of days written.
+    """
+    days = populate_times(conn, start, end)
+    first, last = conn.execute(text("SELECT MIN(time_id), MAX(time_id) FROM snp.times")).one()
+    stage_rows(conn, TIMES, calendar_frame(first, _as_date(last) + timedelta(days=1)))
+    fixed = conn.execute(text(update_flags)).rowcount
+    conn.execute(text(f"DROP TABLE {TIMES.stage}"))
+    return days + fixed
@@ -0,0 +1,109 @@
+# in-memory foreign-key pre-validation and quarantine of rejected rows
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from etl.loader import bulk_insert, bulk_upsert, Target
+from etl.metrics import get_metrics
+
+LOAD_REJECTS = Target(
+    "snp.load_rejects",
+    ["rejected_at", "target_table", "row_key", "reason", "payload"],
+    key=[],
+)
+
+# referenced table -> its key column
+REFERENCED_KEYS = {
+    "snp.companies": "comp_ticker",
+    "snp.times": "time_id",
+}
+
+
+def _normalize(values):
+    # CHAR columns come back padded and DATE columns as dates
+    return values.astype(str).str.strip()
+
+
+class Validator:
+    """
+    Key sets of the referenced dimension tables, loaded once and checked
+    against whole batches with vectorized lookups instead of one failing
+    statement per row.
+    """
+
+    def __init__(self, keys):
+        self.keys = keys  # {referenced table: set of keys}
+
+    @classmethod
+    def load(cls, conn, tables=REFERENCED_KEYS):
+        keys = {}
+        for table, column in tables.items():
+            rows = conn.execute(text(f"SELECT {column} FROM {table}")).scalars()
+            keys[table] = set(_normalize(pd.Series(list(rows), dtype=object)))
+        return cls(keys)
+
+    @staticmethod
+    def _known(values, keys):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # look up each category once, code -1 (missing) maps to the trailing False
+            known = _normalize(pd.Series(values.cat.categories)).isin(keys).to_numpy()
+            return pd.Series(np.append(known, False)[values.cat.codes.to_numpy()], index=values.index)
+        return _normalize(values).isin(keys) & values.notna()
+
+    def split(self, target, records):
+        """
+        Split records (dicts or a DataFrame) into (clean frame, rejected frame);
+        rejected rows carry a `reason` column with the first failed check.
+        """
+        frame = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+        frame = frame.reindex(columns=target.columns)
+        reason = pd.Series(None, index=frame.index, dtype=object)
+        for column in target.required:
+            reason = reason.where(reason.notna() | frame[column].notna(), f"missing {column}")
+        for column, table in target.references.items():
+            known = self._known(frame[column], self.keys[table])
+            reason = reason.where(reason.notna() | known, f"missing {table} reference")
+        bad = reason.notna()
+        rejected = frame[bad].assign(reason=reason[bad])
+        return frame[~bad], rejected
+
+
+def quarantine(conn, target, rejected):
+    """Write rejected rows to snp.load_rejects in one bulk insert."""
+    if rejected.empty:
+        return 0
+    rows = rejected[target.columns].astype(object).where(rejected[target.columns].notna(), None)
+    payload = rows.to_json(orient="records", lines=True, date_format="iso").splitlines()
+    row_key = rows[target.key].to_json(orient="records", lines=True, date_format="iso").splitlines()
+    quarantined = pd.DataFrame({
+        "rejected_at": datetime.now().isoformat(timespec="seconds"),
+        "target_table": target.table,
+        "row_key": row_key,
+        "reason": rejected["reason"].to_numpy(),
+        "payload": payload,
+    })
+    return bulk_insert(conn, LOAD_REJECTS, quarantined)
+
+
+def validated_upsert(conn, target, records, validator):
+    """
+    bulk_upsert() after in-memory validation: rejected rows are quarantined
+    and the clean set is merged in one statement without per-row checks.
+    Returns (number of rows merged, [(key dict, reason), ...] of rejected rows).
+    """
+    clean, rejected = validator.split(target, records)
+    quarantine(conn, target, rejected)
+    loaded, _ = bulk_upsert(conn, target, clean, checked=True)
+    metrics = get_metrics()
+    metrics.count("rows_rejected", len(rejected), stage=target.table.split(".")[-1])
+    if "comp_ticker" in rejected.columns:
+        for ticker, n in Counter(rejected["comp_ticker"]).items():
+            metrics.count_ticker(str(ticker).strip(), "rows_rejected", n)
+    keys = rejected[target.key].astype(object).to_dict(orient="records")
+    return loaded, [
+        ({k: v.strip() if isinstance(v, str) else v for k, v in key.items()}, reason)
+        for key, reason in zip(keys, rejected["reason"])
+    ]
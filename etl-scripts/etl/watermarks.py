@@ -0,0 +1,85 @@
+# load watermarks: latest loaded time_id per ticker and per currency
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+from etl.loader import bulk_upsert, Target
+from etl.trading_calendar import trading_days
+
+HISTORY_START = "2020-05-14"  # first day kept in the warehouse
+
+ATTEMPTS = Target(
+    "snp.load_attempts",
+    ["source", "load_key", "attempted_to"],
+    key=["source", "load_key"],
+)
+
+query_watermarks = """
+    SELECT 'stocks' AS source, comp_ticker AS key, MAX(time_id) AS loaded_to
+    FROM snp.stocks
+    GROUP BY comp_ticker
+    UNION ALL
+    SELECT 'currencies' AS source, currency_iso AS key, MAX(time_id) AS loaded_to
+    FROM snp.currencies
+    GROUP BY currency_iso
+"""
+
+query_attempts = """
+    SELECT source, load_key, attempted_to
+    FROM snp.load_attempts
+"""
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def load_watermarks(conn, attempts=False):
+    """
+    Return {"stocks": {ticker: date}, "currencies": {iso: date}} in one query.
+    attempts=True adds the last day fetched of keys without a stored row,
+    for planning loads (see record_attempts).
+    """
+    watermarks = {"stocks": {}, "currencies": {}}
+    for source, key, loaded_to in conn.execute(text(query_watermarks)):
+        watermarks[source][key.strip()] = _to_date(loaded_to)
+    if attempts:
+        for source, key, attempted_to in conn.execute(text(query_attempts)):
+            watermarks[source].setdefault(key.strip(), _to_date(attempted_to))
+    return watermarks
+
+
+def record_attempts(conn, source, keys, end):
+    """
+    Remember that keys were fetched up to `end` (exclusive) without storing
+    a row, so a key that still has none is planned from there next time
+    instead of from the history start. Keys with stored rows ignore it.
+    """
+    attempted_to = (_to_date(end) - timedelta(days=1)).isoformat()
+    bulk_upsert(conn, ATTEMPTS, [
+        {"source": source, "load_key": key, "attempted_to": attempted_to} for key in keys
+    ])
+
+
+def plan_ranges(keys, watermarks, end, history_start=HISTORY_START):
+    """
+    Group keys by the first missing day and return [(start, end, [keys]), ...]
+    with ISO dates and an exclusive end. Keys already loaded up to the day
+    before `end`, or whose gap holds no trading day, are left out.
+    """
+    end = _to_date(end)
+    groups = {}
+    for key in keys:
+        loaded_to = watermarks.get(key)
+        start = loaded_to + timedelta(days=1) if loaded_to else _to_date(history_start)
+        if start >= end or not trading_days(start, end):
+            continue
+        groups.setdefault(start, []).append(key)
+    return [
+        (start.isoformat(), end.isoformat(), group)
+        for start, group in sorted(groups.items())
+    ]
@@ -1,109 +1,68 @@
-import yfinance as yf
+import argparse
 import pandas as pd
 import json
-import time
-import random
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from etl.cache import get_cache
+from etl.companies import empty_profile, fetch_profile
+from etl.staging import StagingStore
+from etl.throttle import ConcurrentFetcher
 
-# Load all S&P 500 tickers
-tickers = pd.read_csv('sp500_tickers.txt', header=None)[0].tolist()
+parser = argparse.ArgumentParser(description="Fetch S&P 500 company profiles")
+parser.add_argument("tickers", nargs="*",
+                    help="refetch only these tickers and merge them into the latest snapshot")
+args = parser.parse_args()
 
-# Retry configuration
-MAX_RETRIES = 3
-BASE_DELAY = 2  # Base delay in seconds
-MAX_JITTER = 1  # Random jitter to add to delay
+# Load all S&P 500 tickers
+tickers = args.tickers or pd.read_csv('sp500_tickers.txt', header=None)[0].tolist()
 
-def fetch_company_data(ticker, retry_count=0):
-    try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        
-        return {
-            ticker: {
-                'symbol': ticker,
-                'name': info.get('shortName', info.get('longName', 'N/A')),
-                'sector': info.get('sector', 'N/A'),
-                'industry': info.get('industry', 'N/A'),
-                'exchange': info.get('exchange', 'N/A'),
-                'city': info.get('city', 'N/A'),
-                'state': info.get('state', 'N/A'), 
-                'full_time_employees': info.get('fullTimeEmployees', -1),
-                'website': info.get('website', 'N/A'),
-                'country': info.get('country', 'N/A')
-            }
-        }
-    except Exception as e:
-        if retry_count < MAX_RETRIES:
-            # Exponential backoff with jitter
-            delay = BASE_DELAY * (2 ** retry_count) + random.uniform(0, MAX_JITTER)
-            print(f"Error fetching {ticker}, retrying in {delay:.2f}s... (Attempt {retry_count + 1}/{MAX_RETRIES})")
-            time.sleep(delay)
-            return fetch_company_data(ticker, retry_count + 1)
-        else:
-            print(f"Failed to fetch {ticker} after {MAX_RETRIES} attempts: {str(e)}")
-            return {
-                ticker: {
-                    'symbol': ticker,
-                    'name': 'N/A',
-                    'sector': 'N/A',
-                    'industry': 'N/A',
-                    'exchange': 'N/A',
-                    'city': 'N/A',
-                    'state': 'N/A',
-                    'full_time_employees': -1,
-                    'website': 'N/A',
-                    'country': 'N/A'
-                }
-            }
+cache = get_cache()
 
 # Track success and failure counts
 success_count = 0
 failure_count = 0
-retry_count = 0
 
-# Process all tickers with threading
+# Process all tickers concurrently under a token-bucket rate limit
 company_data = {}
-max_workers = 8  # Conservative threading for rate limits
+fetcher = ConcurrentFetcher(rate=4, burst=8, max_in_flight=8, stage="companies")
 
-print(f"Starting to fetch data for {len(tickers)} companies with {max_workers} workers")
+print(f"Starting to fetch data for {len(tickers)} companies with {fetcher.max_in_flight} workers")
 
-with ThreadPoolExecutor(max_workers=max_workers) as executor:
-    futures = {executor.submit(fetch_company_data, ticker): ticker for ticker in tickers}
+for i, (ticker, result, error) in enumerate(fetcher.map(lambda t: {t: fetch_profile(t, cache)}, tickers)):
+    if error is not None:
+        print(f"Failed to fetch {ticker} after {fetcher.max_retries} retries: {str(error)}")
+        result = {ticker: empty_profile(ticker)}
+    ticker_data = result.get(ticker, {})
     
-    for i, future in enumerate(as_completed(futures)):
-        ticker = futures[future]
-        try:
-            result = future.result()
-            ticker_data = result.get(ticker, {})
-            
-            # Check if we got meaningful data
-            if ticker_data.get('name') != 'N/A':
-                success_count += 1
-            else:
-                failure_count += 1
-                
-            company_data.update(result)
-            
-            # Progress tracking and rate limiting
-            if (i+1) % 25 == 0:
-                print(f"Processed {i+1}/{len(tickers)} companies (Success: {success_count}, Failed: {failure_count})")
-                time.sleep(3)  # Increased delay to avoid rate limits
-                
-        except Exception as e:
-            print(f"Unexpected error processing result for {ticker}: {str(e)}")
-            failure_count += 1
+    # Check if we got meaningful data
+    if ticker_data.get('name') != 'N/A':
+        success_count += 1
+    else:
+        failure_count += 1
+        
+    company_data.update(result)
+    
+    # Progress tracking
+    if (i+1) % 25 == 0:
+        print(f"Processed {i+1}/{len(tickers)} companies (Success: {success_count}, Failed: {failure_count})")
+
+# Save complete dataset as today's snapshot in the staging store, a partial
+# refresh keeps the other companies of the latest snapshot
+store = StagingStore()
+if args.tickers:
+    previous = {company['symbol']: company for company in store.read_latest("companies")}
+    company_data = {**previous, **company_data}
 
 # Convert to list format for SQL compatibility
 output_data = list(company_data.values())
-
-# Save complete dataset
-with open('sp500_company_details.json', 'w', encoding='utf-8') as f:
-    json.dump(output_data, f, indent=2, ensure_ascii=False)
+store.append("companies", output_data, partition=date.today().isoformat(), replace=True)
 
 print(f"\nCompletion summary:")
 print(f"- Successfully retrieved data: {success_count} companies")
 print(f"- Failed to retrieve data: {failure_count} companies")
 print(f"- Total processed: {len(output_data)} companies")
+print(f"- Requests sent: {fetcher.calls} (retries: {fetcher.retries})")
+if cache:
+    print(f"- Cache: {cache.stats()}")
 
 if output_data:
     print("\nSample record:")
@@ -3,19 +3,23 @@ import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 
-def scrape_sp500_tickers():
-    """
-    Scrapes S&P 500 constituents from Wikipedia and returns a DataFrame.
-    Saves data to 'sp500_companies.csv' by default.
-    """
+URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+
+
+def fetch_sp500_html():
     # Fetch Wikipedia page
-    url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
     headers = {'User-Agent': 'Mozilla/5.0'}
-    response = requests.get(url, headers=headers)
+    response = requests.get(URL, headers=headers)
     response.raise_for_status()  # Check for HTTP errors
-    
-    # Parse HTML
-    soup = BeautifulSoup(response.text, 'html.parser')
+    return response.text
+
+
+def parse_sp500_table(html):
+    """
+    Parses the S&P 500 constituents table of the Wikipedia page into a DataFrame
+    with Symbol, Company, Sector and Founded columns.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
     
     # Find the first table (S&P 500 constituents)
     table = soup.find('table', {'class': 'wikitable'})
@@ -38,8 +42,16 @@ def scrape_sp500_tickers():
             })
     
     # Create DataFrame
-    df = pd.DataFrame(data)
-    
+    return pd.DataFrame(data, columns=['Symbol', 'Company', 'Sector', 'Founded'])
+
+
+def scrape_sp500_tickers(html=None):
+    """
+    Scrapes S&P 500 constituents from Wikipedia, or from the saved page `html`,
+    and returns a DataFrame. Saves data to 'sp500_companies.csv' by default.
+    """
+    df = parse_sp500_table(html if html is not None else fetch_sp500_html())
+
     # Save to CSV
     df.to_csv('sp500_companies.csv', index=False)
     print(f"Successfully saved {len(df)} companies to 'sp500_companies.csv'")
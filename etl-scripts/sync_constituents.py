@@ -0,0 +1,58 @@
+# sync S&P 500 constituents: profile and backfill new tickers, end-date removed ones
+# usage: python etl-scripts/sync_constituents.py [--html saved_page.html] [--dry-run]
+import argparse
+from datetime import date
+
+from dotenv import load_dotenv
+from etl.cache import get_cache
+from etl.constituents import sync_constituents
+from etl.db import bulk_session, get_engine
+from etl.loader import STOCKS
+from etl.metrics import write_run_summary
+from etl.partitions import ensure_partitions
+from etl.prices import fetch_prices
+from etl.trading_calendar import populate_times
+from etl.validation import validated_upsert, Validator
+from etl.watermarks import load_watermarks, plan_ranges, record_attempts
+
+load_dotenv()
+
+parser = argparse.ArgumentParser(description="Sync S&P 500 constituents with the warehouse")
+parser.add_argument("--html", help="parse a saved Wikipedia page instead of scraping it")
+parser.add_argument("--dry-run", action="store_true", help="only print the delta")
+args = parser.parse_args()
+
+today = date.today().isoformat()
+html = None
+if args.html:
+    with open(args.html, encoding="utf-8") as f:
+        html = f.read()
+
+# scrape the index, list new companies and end-date removed ones
+listed_now, removed = sync_constituents(today, html, dry_run=args.dry_run, cache=get_cache())
+if args.dry_run or not listed_now:
+    raise SystemExit(0)
+
+# backfill history of the new tickers from their own watermark
+with get_engine().connect() as conn:
+    watermarks = load_watermarks(conn, attempts=True)
+stock_ranges = plan_ranges(listed_now, watermarks["stocks"], today)
+if stock_ranges:
+    with bulk_session() as conn:
+        populate_times(conn, stock_ranges[0][0], today)
+        ensure_partitions(conn, stock_ranges[0][0], today)
+with get_engine().connect() as conn:
+    validator = Validator.load(conn)
+for range_start, range_end, group in stock_ranges:
+    stocks, no_data = fetch_prices(group, range_start, range_end)
+    if no_data:
+        print(f"No history for {len(no_data)} tickers from {range_start}: {no_data}")
+        with bulk_session() as conn:
+            record_attempts(conn, "stocks", no_data, range_end)
+    if not stocks:
+        continue
+    with bulk_session() as conn:
+        loaded, rejected = validated_upsert(conn, STOCKS, stocks, validator)
+    print(f"Backfilled {loaded} stock records from {range_start}, not added records: {len(rejected)}")
+
+print(f"Run metrics saved to {write_run_summary()}")
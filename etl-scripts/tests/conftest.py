@@ -0,0 +1,17 @@
+# shared fixtures: the ETL package on the path and an in-memory SQLite warehouse
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from etl.db import reset_engine  # noqa: E402
+from etl.standin import sqlite_warehouse  # noqa: E402
+
+
+@pytest.fixture
+def sqlite_db():
+    """The shared engine pointed at a fresh in-memory SQLite copy of the snp schema."""
+    yield sqlite_warehouse()
+    reset_engine()
@@ -0,0 +1,88 @@
+# re-adjustment of the stored history after corporate actions on the SQLite stand-in
+import pandas as pd
+from sqlalchemy import text
+
+from etl.actions import apply_actions, wide_to_actions
+from etl.db import bulk_session, get_engine
+from etl.loader import bulk_upsert, STOCKS
+from etl.synthetic import seed_dimensions
+
+DAYS = ["2024-06-03", "2024-06-04", "2024-06-05", "2024-06-06", "2024-06-07"]
+SPLIT_DAY = "2024-06-05"
+
+
+def bars(ticker, close):
+    return [
+        {"time_id": day, "comp_ticker": ticker, "currency_iso": "USD", "open_price": close,
+         "high_price": close, "low_price": close, "close_price": close, "volume": 100}
+        for day in DAYS
+    ]
+
+
+def split(ticker):
+    return pd.DataFrame([{"comp_ticker": ticker, "action_date": SPLIT_DAY, "action_type": "split", "value": 2.0}])
+
+
+def provider_closes(ticker):
+    # the provider's closes are adjusted for the split already
+    return pd.DataFrame([
+        {"comp_ticker": ticker, "time_id": day, "close_price": 50.0 if day < SPLIT_DAY else 100.0}
+        for day in DAYS
+    ])
+
+
+def stored(ticker):
+    with get_engine().connect() as conn:
+        rows = conn.execute(text(
+            "SELECT time_id, close_price, volume FROM snp.stocks WHERE comp_ticker = :t ORDER BY time_id"
+        ), {"t": ticker}).all()
+    return {str(day)[:10]: (float(close), int(volume)) for day, close, volume in rows}
+
+
+def load(records):
+    with bulk_session() as conn:
+        seed_dimensions(conn, ["AAA", "BBB"], DAYS[0], "2024-06-08")
+        bulk_upsert(conn, STOCKS, records)
+
+
+def test_split_adjusts_only_the_history_before_its_day_once(sqlite_db):
+    load(bars("AAA", 100.0))
+    with bulk_session() as conn:
+        actions, rows = apply_actions(conn, split("AAA"), provider_closes("AAA"))
+    assert rows == 2
+    assert actions["rows_adjusted"].tolist() == [2]
+    assert stored("AAA") == {
+        day: (50.0, 200) if day < SPLIT_DAY else (100.0, 100) for day in DAYS
+    }
+
+    with bulk_session() as conn:
+        actions, rows = apply_actions(conn, split("AAA"), provider_closes("AAA"))
+    assert actions.empty and rows == 0
+    assert stored("AAA")["2024-06-03"] == (50.0, 200)
+    with get_engine().connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM snp.corporate_actions")).scalar() == 1
+
+
+def test_history_loaded_after_the_split_is_recorded_but_not_adjusted(sqlite_db):
+    load([
+        {**bar, "close_price": 50.0 if bar["time_id"] < SPLIT_DAY else 100.0}
+        for bar in bars("BBB", 100.0)
+    ])
+    with bulk_session() as conn:
+        actions, rows = apply_actions(conn, split("BBB"), provider_closes("BBB"))
+    assert rows == 0
+    assert actions["rows_adjusted"].tolist() == [0]
+    assert stored("BBB")["2024-06-03"] == (50.0, 100)
+
+
+def test_wide_to_actions_keeps_non_zero_actions():
+    index = pd.to_datetime(DAYS[:2])
+    wide = pd.DataFrame({
+        ("AAA", "Close"): [50.0, 100.0], ("AAA", "Dividends"): [0.0, 0.0], ("AAA", "Stock Splits"): [0.0, 2.0],
+        ("BBB", "Close"): [None, 10.0], ("BBB", "Dividends"): [None, 0.5], ("BBB", "Stock Splits"): [None, 0.0],
+    }, index=index)
+    actions = wide_to_actions(wide).sort_values("comp_ticker")
+    assert actions.to_dict(orient="records") == [
+        {"comp_ticker": "AAA", "action_date": "2024-06-04", "action_type": "split", "value": 2.0},
+        {"comp_ticker": "BBB", "action_date": "2024-06-04", "action_type": "dividend", "value": 0.5},
+    ]
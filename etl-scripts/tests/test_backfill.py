@@ -0,0 +1,89 @@
+# resumable backfill of date windows x ticker chunks on a SQLite file stand-in
+from functools import partial
+
+import pytest
+from sqlalchemy import text
+
+import etl.backfill
+from etl.backfill import backfill, plan_units
+from etl.db import bulk_session, get_engine, reset_engine
+from etl.journal import LOADED, RunJournal
+from etl.prices import SimulatedProvider
+from etl.standin import sqlite_warehouse
+from etl.synthetic import seed_dimensions, synthetic_tickers
+from etl.throttle import ConcurrentFetcher
+
+TICKERS = synthetic_tickers(3)
+START, END = "1900-01-01", "1900-04-01"
+
+
+class RecordingProvider(SimulatedProvider):
+    """Simulated provider remembering the windows requested, failing the ones starting on `fail`."""
+
+    def __init__(self, fail=None):
+        super().__init__(latency=0)
+        self.fail = fail
+        self.windows = []
+
+    def download(self, tickers, start, end, interval="1d", actions=False):
+        with self.lock:
+            self.windows.append((start, tuple(tickers)))
+        if start == self.fail:
+            raise ConnectionError("provider unavailable")
+        return super().download(tickers, start, end, interval, actions)
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    # a failed window fails its units at once instead of after the backoff
+    monkeypatch.setattr(etl.backfill, "ConcurrentFetcher", partial(ConcurrentFetcher, max_retries=0))
+    # loads run on pooled threads, which share a file database but not an in-memory one
+    sqlite_warehouse(f"sqlite:///{tmp_path / 'warehouse.db'}")
+    with bulk_session() as conn:
+        seed_dimensions(conn, TICKERS, START, END)
+    yield RunJournal("backfill", root=str(tmp_path / "journal"))
+    reset_engine()
+
+
+def run(journal, provider, resume):
+    return backfill(TICKERS, START, END, provider=provider, rate=1000, processes=0, chunk_size=2,
+                    window="month", journal=journal, resume=resume)
+
+
+def stored_months():
+    with get_engine().connect() as conn:
+        rows = conn.execute(text("SELECT DISTINCT substr(time_id, 1, 7) FROM snp.stocks ORDER BY 1")).scalars()
+        return list(rows)
+
+
+def test_units_follow_the_windows_and_chunks():
+    units = plan_units(TICKERS, "1900-01-15", END, chunk_size=2, window="month")
+    assert [(start, end) for start, end, _ in units[::2]] == [
+        ("1900-01-15", "1900-02-01"), ("1900-02-01", "1900-03-01"), ("1900-03-01", "1900-04-01"),
+    ]
+    assert [tickers for _, _, tickers in units[:2]] == [tuple(TICKERS[:2]), tuple(TICKERS[2:])]
+
+
+def test_resume_skips_the_units_already_loaded(warehouse):
+    first = run(warehouse, RecordingProvider(fail="1900-02-01"), resume=False)
+    assert (first["units"], first["loaded"], first["failed"]) == (6, 4, 2)
+    assert stored_months() == ["1900-01", "1900-03"]
+
+    provider = RecordingProvider()
+    resumed = run(warehouse, provider, resume=True)
+    assert (resumed["units"], resumed["loaded"], resumed["failed"]) == (2, 2, 0)
+    assert sorted(provider.windows) == [("1900-02-01", tuple(TICKERS[:2])), ("1900-02-01", tuple(TICKERS[2:]))]
+    assert stored_months() == ["1900-01", "1900-02", "1900-03"]
+    assert set(warehouse.state("backfill").values()) == {LOADED}
+    assert len(warehouse.state("backfill")) == len(plan_units(TICKERS, START, END, 2, "month"))
+
+    provider = RecordingProvider()
+    assert run(warehouse, provider, resume=True)["units"] == 0
+    assert provider.windows == []
+
+
+def test_without_resume_every_unit_is_fetched_again(warehouse):
+    run(warehouse, RecordingProvider(), resume=False)
+    provider = RecordingProvider()
+    assert run(warehouse, provider, resume=False)["loaded"] == 6
+    assert len(provider.windows) == 6
@@ -0,0 +1,42 @@
+# memory ceiling of the columnar buffer across flushes
+import tracemalloc
+
+from etl.buffer import ColumnBuffer
+from etl.standin import synthetic_frames
+from etl.synthetic import synthetic_tickers
+
+MAX_ROWS = 20000
+CEILING_MB = 16  # traced peak, buffered rows plus the chunk being produced
+
+
+def traced_peak(years, max_rows=MAX_ROWS, max_bytes=64 * 2**20):
+    """(traced peak in MB, flushed batch sizes) of streaming `years` of 200 tickers through a buffer."""
+    flushed = []
+    tracemalloc.start()
+    try:
+        with ColumnBuffer(sink=lambda frame: flushed.append(len(frame)), max_rows=max_rows,
+                          max_bytes=max_bytes) as buffer:
+            for frame in synthetic_frames(synthetic_tickers(200), years):
+                buffer.append(frame)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2**20, flushed
+
+
+def test_peak_stays_under_the_ceiling_across_flushes():
+    peak, flushed = traced_peak(3)
+    assert len(flushed) >= 5
+    assert sum(flushed) == 200 * 783  # business days of 1900-1902
+    assert peak <= CEILING_MB
+
+
+def test_peak_does_not_grow_with_rows():
+    small, _ = traced_peak(1)
+    large, _ = traced_peak(3)
+    assert large <= small * 1.25
+
+
+def test_byte_budget_bounds_each_batch():
+    _, flushed = traced_peak(1, max_rows=10**9, max_bytes=2**20)
+    assert len(flushed) >= 2
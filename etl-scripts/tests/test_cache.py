@@ -0,0 +1,39 @@
+# response cache TTLs and the cached provider
+import pandas as pd
+
+from etl import cache as cache_module
+from etl.cache import DEFAULT_TTL, ResponseCache, TTLS
+from etl.prices import CachedProvider, SimulatedProvider
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_interval_endpoints_use_the_ttl_of_their_family():
+    cache = ResponseCache(path=":memory:")
+    assert cache.ttl("history:1d") == TTLS["history"]
+    assert cache.ttl("history:1m") == TTLS["history"]
+    assert cache.ttl("info") == TTLS["info"]
+    assert cache.ttl("unknown") == DEFAULT_TTL
+    assert ResponseCache(path=":memory:", ttls={"history:1m": 60}).ttl("history:1m") == 60
+
+
+def test_daily_history_is_served_after_two_hours(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    cache = ResponseCache(path=":memory:")
+    provider = CachedProvider(SimulatedProvider(latency=0.0), cache)
+    first = provider.download(["AAA"], "2024-01-02", "2024-01-06", interval="1d")
+    clock.now += 2 * 3600
+    again = provider.download(["AAA"], "2024-01-02", "2024-01-06", interval="1d")
+    assert provider.provider.calls == 1
+    pd.testing.assert_frame_equal(first, again)
+
+    clock.now += TTLS["history"]
+    provider.download(["AAA"], "2024-01-02", "2024-01-06", interval="1d")
+    assert provider.provider.calls == 2
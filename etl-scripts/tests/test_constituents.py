@@ -0,0 +1,57 @@
+# constituent parsing and diff against the saved Wikipedia page, without network
+import os
+
+import pytest
+
+from etl.config import DATA_DIR
+from etl.constituents import diff_constituents, index_tickers
+from snp500acr import parse_sp500_table
+
+FIXTURE = os.path.join(DATA_DIR, "fixtures", "sp500_wikipedia.html")
+
+
+@pytest.fixture(scope="module")
+def table():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return parse_sp500_table(f.read())
+
+
+@pytest.fixture(scope="module")
+def index(table):
+    return index_tickers(table)
+
+
+def test_parse_reads_every_listed_share_class(table):
+    assert len(table) == 503
+    assert {"Symbol", "Company"} <= set(table.columns)
+
+
+def test_index_keeps_one_share_class_per_company(index):
+    assert len(index) == 500
+    assert len(set(index)) == 500
+    for kept, dropped in (("GOOGL", "GOOG"), ("FOXA", "FOX"), ("NWSA", "NWS")):
+        assert kept in index
+        assert dropped not in index
+
+
+def test_diff_in_sync_is_empty(index):
+    listed = {ticker: None for ticker in index}
+    assert diff_constituents(index, list(index), listed) == ([], [])
+
+
+def test_diff_reports_added_and_removed(index):
+    newcomer, leaver = index[10], "OLDCO"
+    tickers = [t for t in index if t != newcomer] + [leaver]
+    listed = {ticker: None for ticker in tickers}
+    added, removed = diff_constituents(index, tickers, listed)
+    assert added == [newcomer]
+    assert removed == [leaver]
+
+
+def test_diff_relists_an_end_dated_company(index):
+    returning = index[0]
+    listed = {ticker: None for ticker in index}
+    listed[returning] = "2024-01-02"
+    added, removed = diff_constituents(index, list(index), listed)
+    assert added == [returning]
+    assert removed == []
@@ -0,0 +1,78 @@
+# intraday micro-batch loading of the saved hourly bars on the SQLite stand-in
+import faulthandler
+import os
+import time
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import etl.intraday as intraday
+from etl.db import bulk_session, get_engine
+from etl.intraday import load_intraday
+from etl.prices import FixtureProvider
+from etl.synthetic import seed_dimensions
+from etl.throttle import ConcurrentFetcher
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "..", "data_integration", "fixtures", "intraday_bars.jsonl")
+TICKERS = ["AAPL", "MSFT", "NVDA"]
+SESSION_BARS = 7  # hourly bars of a regular session, 9:30 to 15:30 New York
+
+
+@pytest.fixture
+def companies(sqlite_db):
+    with bulk_session() as conn:
+        seed_dimensions(conn, TICKERS, "2024-06-03", "2024-06-06")
+    return sqlite_db
+
+
+def load(end, **kwargs):
+    fetcher = ConcurrentFetcher(rate=1000, burst=10, max_in_flight=2, max_retries=0)
+    return load_intraday(TICKERS, "1h", end=end, provider=FixtureProvider(path=FIXTURE), fetcher=fetcher,
+                         chunk_size=1, **kwargs)
+
+
+def stored_bars():
+    with get_engine().connect() as conn:
+        return pd.read_sql(text("SELECT comp_ticker, bar_ts, time_id FROM snp.stocks_intraday"), conn)
+
+
+def test_bars_are_loaded_on_their_new_york_day(companies):
+    stats = load("2024-06-05", since="2024-06-03", batch_rows=10)
+    assert stats["failed"] == 0 and stats["rejected"] == 0
+    assert stats["bars"] == 2 * SESSION_BARS * len(TICKERS)
+    assert stats["batches"] >= 3  # flushed once 10 rows are buffered, so under 20 rows each
+
+    bars = stored_bars()
+    assert len(bars) == stats["bars"]
+    new_york = pd.to_datetime(bars["bar_ts"]).dt.tz_localize("UTC").dt.tz_convert("America/New_York")
+    assert (bars["time_id"].astype(str) == new_york.dt.strftime("%Y-%m-%d")).all()
+    assert sorted(bars["time_id"].astype(str).unique()) == ["2024-06-03", "2024-06-04"]
+
+
+def test_second_run_loads_only_the_new_session(companies):
+    load("2024-06-05", since="2024-06-03")
+    stats = load("2024-06-06")
+    # the last stored bar of each ticker is fetched again, in case it was still forming
+    assert stats["bars"] == (SESSION_BARS + 1) * len(TICKERS)
+    bars = stored_bars()
+    assert len(bars) == 3 * SESSION_BARS * len(TICKERS)
+    assert (bars.groupby("time_id").size() == SESSION_BARS * len(TICKERS)).all()
+
+
+def test_failed_batch_stops_the_run(companies, monkeypatch):
+    def failing_upsert(conn, target, frame, validator):
+        time.sleep(0.2)  # both workers are waiting for a download slot by now
+        raise RuntimeError("merge failed")
+
+    monkeypatch.setattr(intraday, "validated_upsert", failing_upsert)
+    provider = FixtureProvider(path=FIXTURE)
+    fetcher = ConcurrentFetcher(rate=1000, burst=10, max_in_flight=2, max_retries=0)
+    faulthandler.dump_traceback_later(30, exit=True)  # a hang fails the run instead of blocking it
+    try:
+        with pytest.raises(RuntimeError, match="merge failed"):
+            load_intraday(TICKERS * 3, "1h", end="2024-06-06", since="2024-06-03", provider=provider,
+                          fetcher=fetcher, chunk_size=1, batch_rows=5)
+    finally:
+        faulthandler.cancel_dump_traceback_later()
+    assert provider.calls < len(TICKERS) * 3
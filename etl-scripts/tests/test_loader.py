@@ -0,0 +1,64 @@
+# staged set-based merges of etl.loader on the SQLite stand-in
+import pandas as pd
+from sqlalchemy import text
+
+from etl.db import bulk_session, get_engine
+from etl.loader import bulk_upsert, merge_sql, STOCKS
+from etl.synthetic import seed_dimensions
+
+
+def bar(ticker, day, close):
+    return {"time_id": day, "comp_ticker": ticker, "currency_iso": "USD", "open_price": close,
+            "high_price": close, "low_price": close, "close_price": close, "volume": 100}
+
+
+def closes():
+    with get_engine().connect() as conn:
+        rows = conn.execute(text("SELECT comp_ticker, time_id, close_price FROM snp.stocks")).all()
+    return {(ticker.strip(), str(day)[:10]): float(close) for ticker, day, close in rows}
+
+
+def seed():
+    with bulk_session() as conn:
+        seed_dimensions(conn, ["AAA", "BBB"], "2024-06-03", "2024-06-05")
+
+
+def test_merge_sql_updates_every_column_but_the_key():
+    sql = merge_sql(STOCKS)
+    assert "ON CONFLICT (time_id, comp_ticker) DO UPDATE" in sql
+    assert "close_price = EXCLUDED.close_price" in sql
+    assert "comp_ticker = EXCLUDED" not in sql and "time_id = EXCLUDED" not in sql
+    assert "WHERE TRUE" in merge_sql(STOCKS, checked=True)
+
+
+def test_duplicates_in_a_batch_keep_the_last_row(sqlite_db):
+    seed()
+    with bulk_session() as conn:
+        loaded, rejected = bulk_upsert(conn, STOCKS, [
+            bar("AAA", "2024-06-03", 10.0), bar("AAA", "2024-06-03", 11.0), bar("BBB", "2024-06-03", 20.0),
+        ])
+    assert (loaded, rejected) == (2, [])
+    assert closes() == {("AAA", "2024-06-03"): 11.0, ("BBB", "2024-06-03"): 20.0}
+
+    frame = pd.DataFrame([bar("BBB", "2024-06-04", 21.0), bar("BBB", "2024-06-04", 22.0)])
+    with bulk_session() as conn:
+        assert bulk_upsert(conn, STOCKS, frame) == (1, [])
+    assert closes()[("BBB", "2024-06-04")] == 22.0
+
+
+def test_stored_rows_are_updated_and_new_ones_inserted(sqlite_db):
+    seed()
+    with bulk_session() as conn:
+        bulk_upsert(conn, STOCKS, [bar("AAA", "2024-06-03", 10.0)])
+    with bulk_session() as conn:
+        bulk_upsert(conn, STOCKS, [bar("AAA", "2024-06-03", 12.5), bar("AAA", "2024-06-04", 13.0)])
+    assert closes() == {("AAA", "2024-06-03"): 12.5, ("AAA", "2024-06-04"): 13.0}
+
+
+def test_unchecked_rows_breaking_a_rule_are_rejected_not_merged(sqlite_db):
+    seed()
+    with bulk_session() as conn:
+        loaded, rejected = bulk_upsert(conn, STOCKS, [bar("AAA", "2024-06-03", 10.0), bar("ZZZ", "2024-06-03", 1.0)])
+    assert loaded == 1
+    assert rejected == [({"time_id": "2024-06-03", "comp_ticker": "ZZZ"}, "missing snp.companies reference")]
+    assert list(closes()) == [("AAA", "2024-06-03")]
@@ -0,0 +1,45 @@
+# partition planning of snp.stocks by year and by month
+from datetime import date
+
+from etl.db import bulk_session
+from etl.partitions import ensure_partitions, missing_partitions, next_start, partition_bounds
+
+
+def names(partitions):
+    return [name for name, _, _ in partitions]
+
+
+def test_bounds_cover_the_range_by_year_and_by_month():
+    assert partition_bounds("2023-06-15", "2025-01-01", "year") == [
+        ("stocks_y2023", date(2023, 1, 1), date(2024, 1, 1)),
+        ("stocks_y2024", date(2024, 1, 1), date(2025, 1, 1)),
+    ]
+    assert names(partition_bounds("2024-11-30", "2025-01-02", "month")) == [
+        "stocks_m2024_11", "stocks_m2024_12", "stocks_m2025_01",
+    ]
+    assert next_start(date(2024, 12, 1), "month") == date(2025, 1, 1)
+
+
+def test_the_next_partition_is_planned_past_the_end():
+    assert names(missing_partitions("2024-03-01", "2024-12-31", {}, "year")) == ["stocks_y2024", "stocks_y2025"]
+    # `end` is exclusive but its partition is still created, with the next one
+    assert names(missing_partitions("2024-12-20", "2025-01-01", {}, "month")) == [
+        "stocks_m2024_12", "stocks_m2025_01", "stocks_m2025_02",
+    ]
+    assert names(missing_partitions("2024-12-20", "2025-01-01", {}, "month", ahead=0)) == [
+        "stocks_m2024_12", "stocks_m2025_01",
+    ]
+
+
+def test_existing_partitions_of_any_grain_are_left_out():
+    existing = {"stocks_y2024": (date(2024, 1, 1), date(2025, 1, 1))}
+    assert names(missing_partitions("2024-05-01", "2024-12-15", existing, "month")) == ["stocks_m2025_01"]
+    existing = {"stocks_m2025_01": (date(2025, 1, 1), date(2025, 2, 1))}
+    assert missing_partitions("2024-12-01", "2024-12-15", existing, "year") == [
+        ("stocks_y2024", date(2024, 1, 1), date(2025, 1, 1)),
+    ]
+
+
+def test_plain_stocks_table_is_left_alone(sqlite_db):
+    with bulk_session() as conn:
+        assert ensure_partitions(conn, "2024-01-01", "2024-12-31") == []
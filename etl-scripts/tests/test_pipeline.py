@@ -0,0 +1,56 @@
+# stage timeouts of the pipeline runner and early stops of the concurrent fetcher
+import threading
+import time
+
+from etl.pipeline import FAILED, Pipeline, Stage, SUCCEEDED
+from etl.prices import SimulatedProvider
+from etl.stages import Cancelled
+from etl.throttle import ConcurrentFetcher
+
+
+def test_retry_waits_for_the_timed_out_attempt():
+    spans = []
+
+    def slow_then_fast(ctx, cancel):
+        began = time.monotonic()
+        if not spans:
+            cancel.wait()
+            time.sleep(0.3)  # finishing the batch in progress before noticing the cancel
+            spans.append((began, time.monotonic()))
+            raise Cancelled("attempt timed out")
+        spans.append((began, time.monotonic()))
+        return "done"
+
+    stage = Stage("slow", slow_then_fast, retries=1, timeout=0.2, retry_delay=0, cancel_grace=5)
+    result = Pipeline([stage]).run(None)["slow"]
+    assert result.status == SUCCEEDED and result.attempts == 2 and result.value == "done"
+    (_, first_end), (second_start, _) = spans
+    assert second_start >= first_end
+
+
+def test_attempt_ignoring_cancel_fails_without_retry():
+    calls, release = [], threading.Event()
+
+    def stuck(ctx, cancel):
+        calls.append(time.monotonic())
+        release.wait(5)
+
+    stage = Stage("stuck", stuck, retries=2, timeout=0.1, retry_delay=0, cancel_grace=0.2)
+    try:
+        result = Pipeline([stage]).run(None)["stuck"]
+    finally:
+        release.set()
+    assert result.status == FAILED and result.attempts == 1
+    assert isinstance(result.error, TimeoutError)
+    assert len(calls) == 1
+
+
+def test_early_stop_cancels_queued_calls():
+    provider = SimulatedProvider(latency=0.05)
+    fetcher = ConcurrentFetcher(rate=1000, burst=50, max_in_flight=2, max_retries=0)
+    for item, wide, error in fetcher.map(
+            lambda ticker: provider.download([ticker], "2024-01-02", "2024-01-03"),
+            [f"T{i:03d}" for i in range(50)]):
+        break
+    # the first result, the other call in flight and at most one started meanwhile
+    assert provider.calls <= 4
@@ -0,0 +1,86 @@
+# offline price downloads: fixture provider, ticker chunks and the wide to long reshape
+import pandas as pd
+import pytest
+
+from etl.prices import (chunked, fetch_prices, FixtureProvider, PriceProvider, records_to_wide, STOCK_COLUMNS,
+                        wide_to_frame)
+from etl.throttle import ConcurrentFetcher
+
+RECORDS = [
+    {"time_id": day, "comp_ticker": ticker, "currency_iso": "USD", "open_price": price,
+     "high_price": price + 1, "low_price": price - 1, "close_price": price + 0.5, "volume": 1000}
+    for ticker, base in (("AAA", 10.0), ("BBB", 20.0), ("CCC", 30.0))
+    for i, day in enumerate(("2024-01-02", "2024-01-03", "2024-01-04"))
+    for price in (base + i,)
+]
+
+
+def fetcher():
+    return ConcurrentFetcher(rate=1000, burst=10, max_in_flight=2, max_retries=0, base_delay=0, max_jitter=0)
+
+
+class FailingProvider(FixtureProvider):
+    """Fixture provider whose requests containing `ticker` fail."""
+
+    def __init__(self, ticker, **kwargs):
+        super().__init__(**kwargs)
+        self.ticker = ticker
+
+    def download(self, tickers, start, end, interval="1d", actions=False):
+        if self.ticker in tickers:
+            raise ConnectionError("simulated outage")
+        return super().download(tickers, start, end, interval, actions)
+
+
+def test_chunked_splits_in_order():
+    assert list(chunked(["A", "B", "C", "D", "E"], 2)) == [["A", "B"], ["C", "D"], ["E"]]
+    assert list(chunked([], 2)) == []
+
+
+def test_provider_without_download_cannot_be_created():
+    class Incomplete(PriceProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_fixture_provider_serves_exclusive_end_and_known_tickers():
+    provider = FixtureProvider(records=RECORDS)
+    wide = provider.download(["AAA", "ZZZ"], "2024-01-02", "2024-01-04")
+    assert list(wide.columns.get_level_values(0).unique()) == ["AAA"]
+    assert list(wide.index.strftime("%Y-%m-%d")) == ["2024-01-02", "2024-01-03"]
+    assert provider.calls == 1
+
+
+def test_wide_to_frame_round_trips_records():
+    frame = wide_to_frame(records_to_wide(pd.DataFrame(RECORDS)))
+    assert list(frame.columns) == STOCK_COLUMNS
+    expected = pd.DataFrame(RECORDS)[STOCK_COLUMNS].sort_values(["time_id", "comp_ticker"], ignore_index=True)
+    pd.testing.assert_frame_equal(
+        frame.sort_values(["time_id", "comp_ticker"], ignore_index=True), expected, check_dtype=False)
+
+
+def test_wide_to_frame_drops_missing_bars():
+    wide = records_to_wide(pd.DataFrame(RECORDS[1:]))  # AAA has no bar on the first day
+    frame = wide_to_frame(wide)
+    assert len(frame) == len(RECORDS) - 1
+    assert frame["volume"].dtype == "int64"
+    assert wide_to_frame(pd.DataFrame()).empty
+
+
+def test_fetch_prices_requests_one_chunk_per_group():
+    provider = FixtureProvider(records=RECORDS)
+    records, missing = fetch_prices(["AAA", "BBB", "CCC", "ZZZ"], "2024-01-02", "2024-01-05",
+                                    provider=provider, chunk_size=2, fetcher=fetcher())
+    assert provider.calls == 2
+    assert len(records) == 9
+    assert missing == ["ZZZ"]
+
+
+def test_fetch_prices_reports_tickers_of_a_failed_chunk():
+    provider = FailingProvider("CCC", records=RECORDS)
+    records, missing = fetch_prices(["AAA", "BBB", "CCC"], "2024-01-02", "2024-01-05",
+                                    provider=provider, chunk_size=2, fetcher=fetcher())
+    assert {r["comp_ticker"] for r in records} == {"AAA", "BBB"}
+    assert missing == ["CCC"]
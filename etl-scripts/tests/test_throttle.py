@@ -0,0 +1,87 @@
+# token bucket limits of the concurrent fetcher against a simulated provider
+import logging
+import threading
+import time
+
+from etl.prices import SimulatedProvider
+from etl.throttle import ConcurrentFetcher, TokenBucket
+
+RATE = 20.0
+BURST = 4
+
+
+def timed_requests(n, rate=RATE, burst=BURST, max_in_flight=8):
+    provider = SimulatedProvider(latency=0.0)
+    fetcher = ConcurrentFetcher(rate=rate, burst=burst, max_in_flight=max_in_flight, max_retries=0)
+    stamps = []
+    lock = threading.Lock()
+
+    def download(ticker):
+        with lock:
+            stamps.append(time.monotonic())
+        return provider.download([ticker], "2024-01-02", "2024-01-03")
+
+    results = list(fetcher.map(download, [f"T{i:03d}" for i in range(n)]))
+    assert all(error is None for _, _, error in results)
+    return sorted(stamps)
+
+
+def test_throughput_approaches_the_configured_rate():
+    stamps = timed_requests(60)
+    # the first `burst` requests go out at once, the rest at `rate`
+    measured = (len(stamps) - BURST) / (stamps[-1] - stamps[0])
+    assert RATE * 0.85 <= measured <= RATE * 1.05
+
+
+def test_no_window_exceeds_the_burst():
+    stamps = timed_requests(40)
+    slack = 0.01  # scheduling jitter, seconds
+    for i in range(len(stamps)):
+        for j in range(i, len(stamps)):
+            allowed = BURST + RATE * (stamps[j] - stamps[i] + slack)
+            assert j - i + 1 <= allowed
+
+
+def test_slow_down_halves_and_recover_restores_the_rate():
+    bucket = TokenBucket(rate=8, burst=2)
+    bucket.slow_down()
+    assert bucket.rate == 4
+    for _ in range(20):
+        bucket.recover()
+    assert bucket.rate == 8
+
+
+def test_retries_are_logged_as_warnings(caplog):
+    fetcher = ConcurrentFetcher(rate=1000, burst=10, max_in_flight=2, max_retries=2, base_delay=0, max_jitter=0)
+    attempts = []
+
+    def flaky(ticker):
+        attempts.append(ticker)
+        if len(attempts) < 3:
+            raise ConnectionError("provider unavailable")
+        return ticker
+
+    with caplog.at_level(logging.WARNING):
+        assert fetcher.call(flaky, "AAA") == "AAA"
+    assert fetcher.retries == 2
+    assert [r.levelname for r in caplog.records] == ["WARNING", "WARNING"]
+    assert "Error fetching AAA, retrying" in caplog.records[0].getMessage()
+
+
+def test_concurrent_simulated_downloads_draw_distinct_streams():
+    provider = SimulatedProvider(latency=0.01, seed=7)
+    closes = []
+    lock = threading.Lock()
+
+    def download():
+        wide = provider.download(["AAA"], "2024-01-02", "2024-01-03")
+        with lock:
+            closes.append(float(wide[("AAA", "Close")].iloc[0]))
+
+    threads = [threading.Thread(target=download) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert provider.calls == 8
+    assert len(set(closes)) == 8
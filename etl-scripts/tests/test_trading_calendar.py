@@ -0,0 +1,59 @@
+# NYSE holiday, observed holiday and early close rules, and the refresh of stored days
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import text
+
+from etl.db import bulk_session, get_engine
+from etl.trading_calendar import holidays, is_early_close, is_trading_day, refresh_times, trading_days
+
+
+def test_holidays_of_a_year():
+    assert sorted(holidays(2024)) == [
+        date(2024, 1, 1), date(2024, 1, 15), date(2024, 2, 19), date(2024, 3, 29), date(2024, 5, 27),
+        date(2024, 6, 19), date(2024, 7, 4), date(2024, 9, 2), date(2024, 11, 28), date(2024, 12, 25),
+    ]
+    assert len(trading_days("2024-01-01", "2025-01-01")) == 252
+
+
+def test_weekend_holidays_are_observed_on_the_nearest_weekday():
+    assert not is_trading_day("2020-07-03")  # Independence Day on a Saturday
+    assert not is_trading_day("2021-07-05")  # on a Sunday
+    assert not is_trading_day("2022-06-20")  # Juneteenth on a Sunday
+    assert not is_trading_day("2022-12-26")  # Christmas on a Sunday
+    # a Saturday New Year's Day is not observed on the last day of the old year
+    assert is_trading_day("2021-12-31")
+
+
+def test_rules_by_year():
+    assert is_trading_day("2021-06-18")  # Juneteenth is closed from 2022 on
+    assert not is_trading_day("2023-06-19")
+    assert not is_trading_day("2025-01-09")  # special closure
+    assert not is_trading_day("2024-06-08")  # a Saturday
+
+
+def test_early_closes():
+    assert is_early_close("2024-07-03")
+    assert is_early_close("2024-11-29")  # the day after Thanksgiving
+    assert is_early_close("2024-12-24")
+    assert not is_early_close("2024-07-05")
+    assert not is_early_close("2020-07-03")  # the observed holiday, closed all day
+    assert not is_early_close("2022-12-24")  # a Saturday
+
+
+def test_refresh_corrects_the_flags_of_stored_days(sqlite_db):
+    with bulk_session() as conn:
+        # rows from before the calendar attributes: every day a trading day
+        conn.execute(text("INSERT INTO snp.times (time_id) VALUES (:day)"),
+                     [{"day": d} for d in pd.date_range("2024-12-20", "2025-01-01").strftime("%Y-%m-%d")])
+        refresh_times(conn, "2025-01-02", "2025-01-04")
+    with get_engine().connect() as conn:
+        rows = conn.execute(text("SELECT time_id, is_trading_day, is_early_close FROM snp.times")).all()
+    flags = {str(day)[:10]: (bool(trading), bool(early)) for day, trading, early in rows}
+    assert len(flags) == 15
+    assert flags["2024-12-24"] == (True, True)
+    assert flags["2024-12-25"] == (False, False)
+    assert flags["2024-12-28"] == (False, False)  # a Saturday
+    assert flags["2025-01-01"] == (False, False)
+    assert flags["2025-01-02"] == (True, False)
+    assert sum(trading for trading, _ in flags.values()) == len(trading_days("2024-12-20", "2025-01-04"))
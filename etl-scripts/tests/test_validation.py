@@ -0,0 +1,49 @@
+# in-memory validation and quarantine of rejected rows on the SQLite stand-in
+import json
+
+import pandas as pd
+from sqlalchemy import text
+
+from etl.db import bulk_session, get_engine
+from etl.loader import STOCKS
+from etl.synthetic import seed_dimensions
+from etl.validation import validated_upsert, Validator
+
+TICKERS = ["AAA", "BBB"]
+
+
+def row(ticker, day, close=10.0):
+    return {"time_id": day, "comp_ticker": ticker, "currency_iso": "USD", "open_price": close,
+            "high_price": close, "low_price": close, "close_price": close, "volume": 100}
+
+
+def read(query):
+    with get_engine().connect() as conn:
+        return pd.read_sql(text(query), conn)
+
+
+def test_rejected_rows_are_quarantined_and_clean_rows_load(sqlite_db):
+    with bulk_session() as conn:
+        seed_dimensions(conn, TICKERS, "2024-06-03", "2024-06-05")
+    records = [
+        row("AAA", "2024-06-03"),
+        row("BBB", "2024-06-04"),
+        row("ZZZ", "2024-06-03"),  # unknown company
+        row("AAA", "2030-01-01"),  # day missing from snp.times
+        {**row("BBB", "2024-06-03"), "close_price": None},
+    ]
+    with bulk_session() as conn:
+        loaded, rejected = validated_upsert(conn, STOCKS, records, Validator.load(conn))
+
+    assert loaded == 2
+    assert sorted(key["comp_ticker"] for key, _ in rejected) == ["AAA", "BBB", "ZZZ"]
+    stored = read("SELECT comp_ticker, time_id FROM snp.stocks ORDER BY comp_ticker")
+    assert [t.strip() for t in stored["comp_ticker"]] == ["AAA", "BBB"]
+
+    rejects = read("SELECT target_table, row_key, reason, payload FROM snp.load_rejects ORDER BY reject_id")
+    assert (rejects["target_table"] == "snp.stocks").all()
+    assert list(rejects["reason"]) == [
+        "missing snp.companies reference", "missing snp.times reference", "missing close_price",
+    ]
+    assert json.loads(rejects["row_key"][0]) == {"time_id": "2024-06-03", "comp_ticker": "ZZZ"}
+    assert json.loads(rejects["payload"][1])["time_id"] == "2030-01-01"
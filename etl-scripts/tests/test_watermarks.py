@@ -0,0 +1,66 @@
+# load planning from the watermarks and the recorded attempts on the SQLite stand-in
+from datetime import date
+
+import etl.stages as stages
+from etl.db import bulk_session, get_engine
+from etl.journal import RunJournal
+from etl.loader import bulk_upsert, STOCKS
+from etl.stages import prices_stage, RunContext
+from etl.synthetic import seed_dimensions
+from etl.watermarks import load_watermarks, plan_ranges, record_attempts
+
+TICKERS = ["AAA", "BBB"]
+START, END = "2024-06-03", "2024-06-08"
+
+
+class Cancel:
+    def is_set(self):
+        return False
+
+
+def context(tmp_path, tickers):
+    tickers_file = tmp_path / "tickers.txt"
+    tickers_file.write_text("\n".join(tickers) + "\n")
+    return RunContext(END, RunJournal("2024-06-08", root=str(tmp_path / "journal")), tickers_file=str(tickers_file))
+
+
+def seed():
+    with bulk_session() as conn:
+        seed_dimensions(conn, TICKERS, START, END)
+
+
+def no_frames(tickers, start, end):
+    # the provider returned nothing for any ticker
+    yield from ()
+
+
+def test_plan_groups_keys_by_their_first_missing_day():
+    watermarks = {"AAA": date(2024, 6, 4)}
+    assert plan_ranges(["AAA", "BBB"], watermarks, END, history_start=START) == [
+        ("2024-06-03", END, ["BBB"]),
+        ("2024-06-05", END, ["AAA"]),
+    ]
+    assert plan_ranges(["AAA"], {"AAA": date(2024, 6, 7)}, END) == []
+
+
+def test_attempts_only_count_for_keys_without_rows(sqlite_db):
+    seed()
+    with bulk_session() as conn:
+        bulk_upsert(conn, STOCKS, [{"comp_ticker": "AAA", "time_id": "2024-06-03", "open_price": 1.0,
+                                    "close_price": 1.0, "high_price": 1.0, "low_price": 1.0,
+                                    "volume": 1, "currency_iso": "USD"}])
+        record_attempts(conn, "stocks", TICKERS, END)
+    with get_engine().connect() as conn:
+        assert "BBB" not in load_watermarks(conn)["stocks"]
+        watermarks = load_watermarks(conn, attempts=True)["stocks"]
+    assert str(watermarks["AAA"]) == "2024-06-03"
+    assert str(watermarks["BBB"]) == "2024-06-07"
+
+
+def test_empty_fetch_is_not_planned_again(sqlite_db, tmp_path, monkeypatch):
+    seed()
+    ctx = context(tmp_path, TICKERS)
+    assert ctx.ranges("stocks")[0][2] == TICKERS
+    monkeypatch.setattr(stages, "fetch_price_frames", no_frames)
+    assert prices_stage(ctx, Cancel()) == 0
+    assert ctx.ranges("stocks") == []
@@ -1,65 +1,28 @@
-import os
-import json
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import IntegrityError
+from collections import Counter
 from dotenv import load_dotenv
+from etl.db import bulk_session, get_engine
+from etl.loader import STOCKS
+from etl.metrics import write_run_summary
+from etl.partitions import ensure_partitions
+from etl.staging import StagingStore
+from etl.validation import validated_upsert, Validator
 
 load_dotenv()
 
-# Load environment variables
-db_user = os.getenv("db_user_aws")
-db_password = os.getenv("db_password_aws")
-db_host = os.getenv("db_host_aws")
-db_port = os.getenv("db_port")
-db_name = os.getenv("db_name_aws")
-db_engine = os.getenv("db_engine_aws")
+# Stream stocks data from the staging store in bounded chunks
+store = StagingStore()
+total, loaded, skipped = 0, 0, 0
+reasons = Counter()  # rejected keys per ticker end up in the run metrics
 
-# create string for connection to db
-db_string = (
-    f"{db_engine}://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-)
-db = create_engine(db_string)
+# known tickers and days, loaded once and checked in memory for every chunk
+with get_engine().connect() as conn:
+    validator = Validator.load(conn)
 
-# Load stocks data from JSON
-with open("data_integration/sp500_stocks.json", "r") as f:
-    stocks = json.load(f)
-
-print(f"Loaded {len(stocks)} stock records")
-
-query = """
-    INSERT INTO snp.stocks (
-        time_id,
-        comp_ticker,
-        currency_iso,
-        open_price,
-        high_price,
-        low_price,
-        close_price,
-        volume
-    ) VALUES (
-        :time_id,
-        :comp_ticker,
-        :currency_iso,
-        :open_price,
-        :high_price,
-        :low_price,
-        :close_price,
-        :volume
-    )
-    ON CONFLICT (time_id, comp_ticker) DO UPDATE
-    SET
-        currency_iso = EXCLUDED.currency_iso,
-        open_price = EXCLUDED.open_price,
-        high_price = EXCLUDED.high_price,
-        low_price = EXCLUDED.low_price,
-        close_price = EXCLUDED.close_price,
-        volume = EXCLUDED.volume;
-"""
-
-# Insert data with transaction
-with db.begin() as conn:
-    for record in stocks:
-        params = {
+for stocks in store.read("stocks"):
+    total += len(stocks)
+    # map records onto snp.stocks columns
+    params = [
+        {
             "time_id": record["time_id"],
             "comp_ticker": record["comp_ticker"],
             "currency_iso": record.get("currency_iso", "USD"),  # default 'USD' if missing
@@ -69,16 +32,20 @@ with db.begin() as conn:
             "close_price": record["close_price"],
             "volume": record.get("volume", 0)  # default 0 if missing
         }
-        try:
-            conn.execute(text(query), params)
-            print(f"{record['comp_ticker']} on {record['time_id']} uploaded successfully")
-        except IntegrityError as e:
-            # If an IntegrityError occurs (likely due to foreign key violation)
-            # Check error message to confirm it's a FK constraint violation related to comp_ticker
-            if "foreign key constraint" in str(e).lower() or "fk_stocks_companies" in str(e).lower():
-                # Print a message and skip inserting this record
-                print(f"Skipping {record['comp_ticker']} on {record['time_id']} due to missing company reference")
-                continue
-            else:
-                # If error is not FK violation, re-raise exception to not silently ignore other errors
-                raise
+        for record in stocks
+    ]
+
+    # Insert each chunk with one staged merge, rows with unknown references are quarantined
+    with bulk_session() as conn:
+        days = [record["time_id"] for record in params]
+        ensure_partitions(conn, min(days), max(days))
+        chunk_loaded, rejected = validated_upsert(conn, STOCKS, params, validator)
+    loaded += chunk_loaded
+    skipped += len(rejected)
+    reasons.update(reason for _, reason in rejected)
+    print(f"Loaded {total} stock records so far")
+
+print(f"Uploaded {loaded} stock records, skipped {skipped} (see snp.load_rejects)")
+for reason, n in reasons.items():
+    print(f"- skipped {n} records due to {reason}")
+print(f"Run metrics saved to {write_run_summary()}")
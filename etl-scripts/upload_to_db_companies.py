@@ -1,84 +1,34 @@
-import os
-import json
-from sqlalchemy import create_engine, text
+from collections import Counter
+
 from dotenv import load_dotenv
+from etl.companies import refresh_companies
+from etl.db import bulk_session
+from etl.metrics import write_run_summary
+from etl.staging import StagingStore
 
 load_dotenv()
 
-# Load environment variables
-db_user = os.getenv("db_user_aws")
-db_password = os.getenv("db_password_aws")
-db_host = os.getenv("db_host_aws")
-db_port = os.getenv("db_port")
-db_name = os.getenv("db_name_aws")
-db_engine = os.getenv("db_engine_aws")
-
-# create string for connection to db
-db_string = (
-    f"{db_engine}://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-)
-db = create_engine(db_string)
+# retrieve the latest snapshot of company profiles
+store = StagingStore()
+companies = store.read_latest("companies")
 
-
-# retrieve info about companies
-with open("data_integration/sp500_company_details.json", "r") as f:
-    companies = json.load(f)
-    
 print(f"Loaded {len(companies)} companies")
 
-query = """
-    INSERT INTO snp.companies (
-        comp_ticker,
-        comp_name,
-        sector,
-        industry,
-        exchange_code,
-        comp_city,
-        comp_state,
-        comp_employees,
-        website,
-        country
-    ) VALUES (
-        :comp_ticker,
-        :name,
-        :sector,
-        :industry,
-        :exchange,
-        :city,
-        :state,
-        :full_time_employees,
-        :website,
-        :country
-    )
-    ON CONFLICT (comp_ticker) DO UPDATE
-    SET
-        comp_name = EXCLUDED.comp_name,
-        sector = EXCLUDED.sector,
-        industry = EXCLUDED.industry,
-        exchange_code = EXCLUDED.exchange_code,
-        comp_city = EXCLUDED.comp_city,
-        comp_state = EXCLUDED.comp_state,
-        comp_employees = EXCLUDED.comp_employees,
-        website = EXCLUDED.website,
-        country = EXCLUDED.country;
-"""
+# compare with the warehouse and merge only new or changed companies
+with bulk_session() as conn:  # ensures commit when success
+    new, changed, loaded, rejected = refresh_companies(conn, companies)
+
+unchanged = len({company["symbol"] for company in companies}) - len(new) - len(changed)
+print(f"New companies: {len(new)}, changed: {len(changed)}, unchanged: {unchanged}")
+for row in new:
+    print(f"- new {row['comp_ticker']}: {row['comp_name']}")
+for ticker, fields in sorted(changed.items()):
+    print(f"- changed {ticker}: " + ", ".join(f"{field} {old!r} -> {value!r}" for field, old, value in fields))
+field_counts = Counter(field for fields in changed.values() for field, _, _ in fields)
+if field_counts:
+    print(f"Changed fields: {dict(field_counts.most_common())}")
 
-# Insert data with transaction
-with db.begin() as conn:  # ensures commit when success by db.begin()
-    for company in companies:
-        params = {
-            "comp_ticker": company["symbol"],
-            "name": company["name"],
-            "sector": company["sector"],
-            "industry": company["industry"],
-            "exchange": company["exchange"],
-            "city": company["city"],
-            "state": company["state"],
-            "full_time_employees": (
-                None if company.get("full_time_employees") == -1 else company.get("full_time_employees", 0)
-            ),
-            "website": company["website"],
-            "country": company["country"]
-        }
-        conn.execute(text(query), params)
-        print(f"{company['symbol']} uploaded successfully")
\ No newline at end of file
+print(f"Uploaded {loaded} companies, skipped {len(rejected)}")
+for key, reason in rejected:
+    print(f"- skipped {key['comp_ticker']} due to {reason}")
+print(f"Run metrics saved to {write_run_summary()}")
@@ -1,53 +1,33 @@
-import os
-import json
-from sqlalchemy import create_engine, text
+from collections import Counter
 from dotenv import load_dotenv
+from etl.db import bulk_session, get_engine
+from etl.loader import CURRENCIES
+from etl.metrics import write_run_summary
+from etl.staging import StagingStore
+from etl.validation import validated_upsert, Validator
 
 load_dotenv()
 
-# Load environment variables
-db_user = os.getenv("db_user_aws")
-db_password = os.getenv("db_password_aws")
-db_host = os.getenv("db_host_aws")
-db_port = os.getenv("db_port")
-db_name = os.getenv("db_name_aws")
-db_engine = os.getenv("db_engine_aws")
+# stream info about currencies from the staging store
+store = StagingStore()
+total, loaded, skipped = 0, 0, 0
+reasons = Counter()
 
-# create string for connection to db
-db_string = (
-    f"{db_engine}://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-)
-db = create_engine(db_string)
+# known days, loaded once and checked in memory for every chunk
+with get_engine().connect() as conn:
+    validator = Validator.load(conn)
 
+for currencies in store.read("currencies"):
+    total += len(currencies)
+    # Insert each chunk with one staged merge
+    with bulk_session() as conn:  # ensures commit when success
+        chunk_loaded, rejected = validated_upsert(conn, CURRENCIES, currencies, validator)
+    loaded += chunk_loaded
+    skipped += len(rejected)
+    reasons.update(reason for _, reason in rejected)
 
-# retrieve info about currencies
-with open("data_integration/currencies.json", "r") as f:
-    currencies = json.load(f)
-    
-print(f"Loaded {len(currencies)} currencies")
-
-query = """
-    INSERT INTO snp.currencies (
-        currency_iso,
-        exchange_rate,
-        time_id
-    ) VALUES (
-        :currency_iso,
-        :exchange_rate,
-        :time_id
-    )
-    ON CONFLICT (currency_iso, time_id) DO UPDATE
-    SET
-        exchange_rate = EXCLUDED.exchange_rate
-"""
-
-# Insert data with transaction
-with db.begin() as conn:  # ensures commit when success by db.begin()
-    for curr in currencies:
-        params = {
-            "currency_iso": curr["currency_iso"],
-            "exchange_rate": curr["exchange_rate"],
-            "time_id": curr["time_id"]
-        }
-        conn.execute(text(query), params)
-        print(f"{curr['currency_iso']} uploaded successfully")
\ No newline at end of file
+print(f"Loaded {total} currencies")
+print(f"Uploaded {loaded} currency records, skipped {skipped} (see snp.load_rejects)")
+for reason, n in reasons.items():
+    print(f"- skipped {n} records due to {reason}")
+print(f"Run metrics saved to {write_run_summary()}")
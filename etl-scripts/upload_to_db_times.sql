@@ -1,14 +1,7 @@
-DO $$
-DECLARE
-    curr_date DATE := '2020-05-14';
-    end_date DATE := CURRENT_DATE;
-BEGIN
-    WHILE curr_date <= end_date LOOP
-        INSERT INTO snp.times (time_id)
-        VALUES (curr_date)
-        ON CONFLICT (time_id) DO NOTHING;
-
-        curr_date := curr_date + INTERVAL '1 day';
-    END LOOP;
-END;
-$$;
+-- fill snp.times from 2020-05-14 until today in one set-based insert
+-- weekends are flagged here, exchange holidays and early closes of every stored
+-- day are set by etl/trading_calendar.py (refresh_times) in the calendar stage
+INSERT INTO snp.times (time_id, is_trading_day)
+SELECT d::date, EXTRACT(ISODOW FROM d) < 6
+FROM generate_series(DATE '2020-05-14', CURRENT_DATE, INTERVAL '1 day') AS d
+ON CONFLICT (time_id) DO NOTHING;